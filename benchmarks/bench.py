@@ -0,0 +1,294 @@
+"""
+Headless benchmarks of the NanoList and tool hot paths.
+
+    python -m benchmarks.bench                      # run, print, compare with benchmarks/baseline.json
+    python -m benchmarks.bench --output run.json    # also write the results
+    python -m benchmarks.bench --save-baseline      # make this run the new baseline
+    python -m benchmarks.bench --check              # exit with 1 when something got slower than --threshold
+
+Every benchmark runs on layouts scaled from the default shape (scale 1) to thousands of panels,
+once per storage engine. Times are seconds per call, the best of several repeats.
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from nanogui.nanolist import NanoList
+from nanogui.framebuffer import format_hex
+from nanogui.tools import TOOLS
+from nanogui.oplog import OpLog, replay
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+class StubCanvas:
+    """
+    Stands in for tk.Canvas, counting the item updates a real canvas would draw
+    """
+    def __init__(self) -> None:
+        self.configured = 0
+
+    def itemconfig(self, item, **kwargs) -> None:
+        self.configured += 1
+
+
+def scaled_shape(scale: int) -> List[int]:
+    """
+    Default layout (rows 13 to 23 wide and back to 17) with every row scale times wider and about scale times as many rows
+    """
+    widths = list(range(13 * scale, 23 * scale + 1, 2)) + list(range(23 * scale, 17 * scale - 1, -2))
+    return [1] + widths
+
+
+def measure(fn: Callable, number: int = 0, repeat: int = 5, budget: float = 0.02) -> float:
+    """
+    Seconds per call of fn, best of repeat runs. number defaults to as many calls as fit in budget seconds.
+    The garbage collector is off while timing, like timeit, so collections of earlier garbage are not counted
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _measure(fn, number, repeat, budget)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _measure(fn: Callable, number: int, repeat: int, budget: float) -> float:
+    if not number:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - start >= budget or number >= 1 << 20:
+                break
+            number *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def random_grid(nanolist: NanoList, rng: random.Random) -> None:
+    for pos in range(1, len(nanolist.flat)):
+        nanolist.flat[pos] = format_hex(rng.randrange(256), rng.randrange(256), rng.randrange(256))
+
+
+def checkerboard(nanolist: NanoList) -> None:
+    """
+    Upright and upside down panels in different colours, so no panel has a similar neighbour
+    """
+    for pos, coord in enumerate(nanolist.coords[1:], start=1):
+        nanolist.flat[pos] = "#FFFFFF" if nanolist._is_rightsideup(coord) else "#000000"
+
+
+def stroke_log(nanolist: NanoList, rng: random.Random, strokes: int = 20, length: int = 30) -> OpLog:
+    """
+    Recorded-looking workload: brush strokes walking between neighbouring panels, with a few bucket fills
+    """
+    log = OpLog(nanolist.shape, nanolist.flat.engine)
+    colours = ["#FF1493", "#FFD700", "#7CFC00", "#00BFFF", "#0000EE", "#A020F0"]
+    for _ in range(strokes):
+        tool = rng.choice(["pencil", "marker", "spray", "blend"])
+        options = {"radius": rng.randrange(1, 4), "strength": 0.5, "tolerance": 20, "fill_all": False, "colour1": rng.choice(colours)}
+        pos = rng.randrange(nanolist.offsets[1], len(nanolist.flat))
+        for _ in range(length):
+            pos = rng.choice(nanolist.adjacency()[pos] or (pos,))
+            pts = nanolist.neighbours(pos, options["radius"])
+            seed = rng.getrandbits(32) if tool == "spray" else None
+            log.record(tool, nanolist.coords[pos], pts=pts, seed=seed, **options)
+        log.record("bucket", nanolist.coords[pos], **options)
+    return log
+
+
+def bench_layout(shape: List[int], engine: str, quick: bool = False) -> Dict[str, float]:
+    """
+    Seconds per call of every hot path on one layout
+    """
+    rng = random.Random(0)
+    results: Dict[str, float] = {}
+    repeat = 2 if quick else 5
+    budget = 0.005 if quick else 0.02
+
+    def run(name: str, fn: Callable, number: int = 0) -> None:
+        results[name] = measure(fn, number, repeat, budget)
+
+    canvas = StubCanvas()
+    nanolist = NanoList(canvas, shape=shape, engine=engine)
+    random_grid(nanolist, rng)
+    nanolist.update_undo()
+    panels = range(nanolist.offsets[1], len(nanolist.flat))
+    centre = nanolist.coords[(nanolist.offsets[1] + len(nanolist.flat)) // 2]
+    cells = [nanolist.coords[rng.choice(panels)] for _ in range(1000)]
+    colours = [format_hex(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(1000)]
+
+    def get_items() -> None:
+        for cell in cells:
+            nanolist[cell]
+
+    def set_items() -> None:
+        for cell, colour in zip(cells, colours):
+            nanolist[cell] = colour
+
+    run("getitem", get_items)
+    results["getitem"] /= len(cells)
+    run("setitem", set_items)
+    results["setitem"] /= len(cells)
+
+    for radius in range(5):
+        run(f"knn_build_r{radius}", lambda: nanolist._build_stencil(radius))
+        run(f"knn_r{radius}", lambda: nanolist.knn(centre, radius))
+
+    nanolist.fill(panels, "#808080")
+    run("similar_neighbour_uniform", lambda: nanolist.similar_neighbour(centre, 10, nanolist[centre], []))
+    checkerboard(nanolist)
+    run("similar_neighbour_checkerboard", lambda: nanolist.similar_neighbour(centre, 10, nanolist[centre], []))
+
+    run("colour_mixer", lambda: nanolist.colour_mixer("#123456", 0.5, ["#FF0000", "#00FF00", "#0000FF"]))
+
+    def update_full() -> None:
+        nanolist.update(full=True)
+
+    def update_stroke() -> None:
+        nanolist.dirty.update(nanolist.neighbours(nanolist._pos(centre), 3))
+        nanolist.update()
+
+    run("update_full", update_full)
+    run("update_stroke", update_stroke)
+
+    # One radius 3 stroke per committed step
+    random_grid(nanolist, rng)
+    nanolist.update_undo()
+    pts = nanolist.neighbours(nanolist._pos(centre), 3)
+    toggle = [False]
+
+    def update_undo() -> None:
+        toggle[0] = not toggle[0]
+        nanolist.fill(pts, "#FFFFFF" if toggle[0] else "#000000")
+        nanolist.update_undo()
+
+    def undo_redo() -> None:
+        nanolist.undo()
+        nanolist.redo()
+
+    run("update_undo", update_undo)
+    run("undo_redo", undo_redo)
+    results["undo_redo"] /= 2
+
+    for name, tool in TOOLS.items():
+        random_grid(nanolist, rng)
+        options = {"radius": 2, "strength": 0.5, "tolerance": 20, "fill_all": False, "colour1": "#FF1493", "seed": 1}
+        run(f"tool_{name}", lambda: tool(nanolist, centre, **options))
+
+    log = stroke_log(nanolist, rng)
+    random_grid(nanolist, rng)
+    start_frame = nanolist.frame()
+    for fast in (False, True):
+        def replay_log() -> None:
+            nanolist.load_frame(start_frame)
+            replay(nanolist, log, fast=fast)
+        run("replay_fast" if fast else "replay", replay_log, number=1)
+    return results
+
+
+def run_all(scales: List[int], engines: List[str], quick: bool = False) -> dict:
+    results = {}
+    layouts = {}
+    for scale in scales:
+        shape = scaled_shape(scale)
+        layouts[f"scale{scale}"] = {"shape": shape, "panels": sum(shape[1:])}
+        for engine in engines:
+            for name, seconds in bench_layout(shape, engine, quick).items():
+                results[f"{engine}/scale{scale}/{name}"] = seconds
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "layouts": layouts,
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[dict]:
+    """
+    Ratio of every result to its baseline, slowest first. regression is set where the ratio is above threshold
+    """
+    rows = []
+    for name, seconds in results["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        ratio = seconds / base
+        rows.append({"name": name, "seconds": seconds, "baseline": base, "ratio": ratio, "regression": ratio > threshold})
+    rows.sort(key=lambda row: row["ratio"], reverse=True)
+    return rows
+
+
+def rerun_regressions(results: dict, baseline: dict, threshold: float, retries: int, quick: bool = False) -> None:
+    """
+    Run the layouts with regressions again, up to retries times, keeping the best time of every benchmark.
+    On a shared machine a whole run can be slow for a while, a real regression is slow every time
+    """
+    for _ in range(retries):
+        flagged = {tuple(row["name"].split("/")[:2]) for row in compare(results, baseline, threshold) if row["regression"]}
+        if not flagged:
+            return
+        for engine, layout in sorted(flagged):
+            for name, seconds in bench_layout(results["layouts"][layout]["shape"], engine, quick).items():
+                key = f"{engine}/{layout}/{name}"
+                results["results"][key] = min(results["results"].get(key, seconds), seconds)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark NanoList and tool hot paths")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 2, 4, 6], help="layout scales, 6 is about 6000 panels")
+    parser.add_argument("--engines", nargs="+", default=["rgb", "hex"], choices=["rgb", "hex"])
+    parser.add_argument("--quick", action="store_true", help="fewer and shorter repeats")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--threshold", type=float, default=2.0, help="ratio to the baseline counted as a regression")
+    parser.add_argument("--check", action="store_true", help="exit with 1 on regressions")
+    parser.add_argument("--baseline-runs", type=int, default=3, help="runs whose median time is saved by --save-baseline")
+    parser.add_argument("--retries", type=int, default=2, help="times layouts with regressions are run again before they count")
+    args = parser.parse_args(argv)
+
+    results = run_all(args.scales, args.engines, args.quick)
+    if args.save_baseline: # A typical time rather than one run's, which may have been unusually fast or slow
+        runs = [results] + [run_all(args.scales, args.engines, args.quick) for _ in range(args.baseline_runs - 1)]
+        results["results"] = {name: statistics.median(run["results"][name] for run in runs) for name in results["results"]}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rerun_regressions(results, baseline, args.threshold, args.retries, args.quick)
+        results["comparison"] = compare(results, baseline, args.threshold)
+
+    for name, seconds in results["results"].items():
+        print(f"{name:55s} {seconds * 1e6:12.2f} us")
+    regressions = [row for row in results.get("comparison", []) if row["regression"]]
+    for row in regressions:
+        print(f"REGRESSION {row['name']}: {row['ratio']:.2f}x baseline")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=1)
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Export designs and effects to images without opening the editor (no tkinter needed).
+
+    python export.py --image photo.jpg out.png
+    python export.py --image clip.gif out.gif
+    python export.py --effect plasma --seconds 5 --fps 30 out.mp4
+    python export.py --effect rainbow --seconds 2 frames/
+    python export.py --project design.nano out.gif
+
+The output format follows the extension: .png, .gif, .mp4 (needs ffmpeg), anything else is a directory of PNG frames.
+"""
+from typing import Iterator
+import argparse
+import os
+import numpy as np
+from nanogui.nanolist import NanoList
+from nanogui.geometry import TriangleGeometry
+from nanogui.effects import EFFECTS, evaluate
+from nanogui.imaging import sample_frames, TriangleSampler
+from nanogui.project import Project
+from nanogui.render import Renderer, export_png, export_gif, export_frames, export_mp4
+
+
+def effect_frames(nanolist: NanoList, name: str, seconds: float, fps: float, **params) -> Iterator[bytes]:
+    xy = np.array(TriangleGeometry(nanolist.shape[1:]).centroids())
+    positions = TriangleSampler(nanolist.shape).positions
+    for i in range(max(1, int(seconds * fps))):
+        nanolist.write(positions, evaluate(name, xy, i / fps, **params))
+        yield nanolist.frame()
+
+
+def image_frames(nanolist: NanoList, path: str) -> Iterator[bytes]:
+    positions = TriangleSampler(nanolist.shape).positions
+    for packed in sample_frames(path, nanolist.shape):
+        nanolist.write(positions, packed)
+        yield nanolist.frame()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render NanoGUI designs and effects to files")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--image", help="image, animated image, directory or glob of frames to paint")
+    source.add_argument("--effect", choices=sorted(EFFECTS), help="procedural effect to render")
+    source.add_argument("--project", help="saved .nano project, every frame is exported")
+    parser.add_argument("--seconds", type=float, default=3.0, help="length of an effect")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--size", default="600x600", help="output size as WIDTHxHEIGHT")
+    parser.add_argument("--background", default="#000000", help="colour around the panels")
+    parser.add_argument("output", help="file.png, file.gif, file.mp4 or a directory")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    nanolist = NanoList(None)
+    nanolist[0, 0] = args.background
+    renderer = Renderer(nanolist.shape, width, height)
+
+    if args.project:
+        project = Project(args.project)
+        nanolist.shape = project.shape
+        renderer = Renderer(project.shape, width, height)
+        frames = (project.frame(i) for i in range(len(project)))
+    elif args.effect:
+        frames = effect_frames(nanolist, args.effect, args.seconds, args.fps)
+    else:
+        frames = image_frames(nanolist, args.image)
+
+    extension = os.path.splitext(args.output)[1].lower()
+    if extension == ".png":
+        export_png(renderer, next(frames), args.output)
+    elif extension == ".gif":
+        export_gif(renderer, frames, args.output, args.fps)
+    elif extension == ".mp4":
+        export_mp4(renderer, frames, args.output, args.fps)
+    else:
+        count = export_frames(renderer, frames, args.output)
+        print(f"Wrote {count} frames to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,42 @@
+from nanogui.startup import startup # First, so the startup time includes the imports
+import argparse
 from nanogui.app import App
+from nanogui.remote import DEFAULT_PORT
+from nanogui.fanout import FanOut, load_manifest
+from nanogui.stream import EXT_CONTROL_PORT, PanelStream, enable_ext_control, panel_ids
 
 def main() -> None:
     """
     Main function to start application
     """
-    app = App()
+    parser = argparse.ArgumentParser(description="UofC Nanoleaf Editor")
+    parser.add_argument("--remote", type=int, nargs="?", const=DEFAULT_PORT, default=None, metavar="PORT",
+                        help=f"accept remote control on localhost (default port {DEFAULT_PORT}), see nanogui/remote.py")
+    parser.add_argument("--backend", choices=["polygon", "raster"], default="polygon",
+                        help="draw panels as canvas polygons, or as one image for very large layouts")
+    parser.add_argument("--stream", metavar="HOST[:PORT]",
+                        help=f"stream the panels to a Nanoleaf controller over UDP (default port {EXT_CONTROL_PORT})")
+    parser.add_argument("--panels", metavar="FILE", help="JSON [[row, col, panel id], ...] for --stream, by default panels are numbered in order")
+    parser.add_argument("--token", help="controller auth token, switches it to external control before --stream")
+    parser.add_argument("--manifest", metavar="FILE",
+                        help="layout manifest with the panel shape and the controllers it is split across, see nanogui/fanout.py")
+    args = parser.parse_args()
+    shape, controllers = load_manifest(args.manifest) if args.manifest else (None, [])
+    app = App(remote_port=args.remote, backend=args.backend, shape=shape)
+
+    nanolist = app.canvas_frame.nanolist
+    streams = []
+    if args.stream:
+        host, _, port = args.stream.partition(":")
+        if args.token:
+            enable_ext_control(host, args.token)
+        streams.append(PanelStream(nanolist, panel_ids(nanolist, args.panels), host, int(port or EXT_CONTROL_PORT)))
+    if controllers:
+        streams.append(FanOut(nanolist, controllers))
+    nanolist.outputs += streams
+
     app.mainloop()
+    for stream in streams:
+        stream.close()
 
 main()
\ No newline at end of file
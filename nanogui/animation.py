@@ -0,0 +1,204 @@
+from typing import Dict, List, Optional, Tuple, Union
+from collections import OrderedDict
+import bisect
+import threading
+import numpy as np
+from nanogui.profiling import profiler
+
+EASINGS = {
+    "linear": lambda t: t,
+    "ease-in": lambda t: t * t,
+    "ease-out": lambda t: t * (2 - t),
+    "ease-in-out": lambda t: t * t * (3 - 2 * t),
+    "step": lambda t: np.floor(t),
+}
+
+
+class Timeline:
+    """
+    Animation made of keyframes, each a full set of panel colours.
+    Frames between keyframes are interpolated per RGB channel using the easing of the earlier keyframe.
+    Rendered frames are kept in an LRU cache of cache_frames entries.
+    """
+    def __init__(self, size: int, length: int, fps: float = 30, cache_frames: int = 512) -> None:
+        self.size = size # Number of flat positions (NanoList cells)
+        self.length = length
+        self.fps = fps
+        self.cache_frames = cache_frames
+        self.keyframes: Dict[int, Tuple[np.ndarray, str]] = {}
+        self._keys: List[int] = [] # Keyframe indices in order
+        self._key_array: Optional[np.ndarray] = None # self._keys for searchsorted, rebuilt after edits
+        self._cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_keyframe(self, frame: int, colours: Union[bytes, np.ndarray], easing: str = "linear") -> None:
+        """
+        colours is packed RGB (NanoList.frame()) or an (N, 3) uint8 array
+        """
+        if easing not in EASINGS:
+            raise ValueError(f"Unknown easing: {easing}")
+        if isinstance(colours, (bytes, bytearray, memoryview)):
+            colours = np.frombuffer(colours, dtype=np.uint8)
+        colours = np.array(colours, dtype=np.uint8).reshape(self.size, 3)
+        if frame not in self.keyframes:
+            bisect.insort(self._keys, frame)
+            self._key_array = None
+        self.keyframes[frame] = (colours, easing)
+        self.invalidate()
+
+    def remove_keyframe(self, frame: int) -> None:
+        del self.keyframes[frame]
+        self._keys.remove(frame)
+        self._key_array = None
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def frame(self, index: int) -> np.ndarray:
+        """
+        (N, 3) uint8 colours of one frame
+        """
+        with self._lock:
+            cached = self._cache.get(index)
+            if cached is not None:
+                self._cache.move_to_end(index)
+                return cached
+        return self.render(index, index + 1)[0]
+
+    def is_cached(self, index: int) -> bool:
+        with self._lock:
+            return index in self._cache
+
+    def render(self, start: int, stop: int) -> np.ndarray:
+        """
+        (stop - start, N, 3) uint8 colours of frames start to stop, computed one keyframe segment at a time
+        and stored in the cache. Only the segments the frames fall in are looked at, found by binary search
+        """
+        if not self.keyframes:
+            raise ValueError("Timeline has no keyframes")
+        indices = np.arange(start, stop)
+        frames = np.empty((len(indices), self.size, 3), dtype=np.uint8)
+        keys = self._key_array
+        if keys is None:
+            keys = self._key_array = np.array(self._keys)
+
+        segments = np.searchsorted(keys, indices, side="right") # keys[s - 1] <= index < keys[s]
+        frames[segments == 0] = self.keyframes[int(keys[0])][0]
+        frames[segments == len(keys)] = self.keyframes[int(keys[-1])][0]
+        for s in np.unique(segments).tolist():
+            if s == 0 or s == len(keys):
+                continue
+            a, b = int(keys[s - 1]), int(keys[s])
+            inside = segments == s
+            colours_a, easing = self.keyframes[a]
+            colours_b = self.keyframes[b][0]
+            t = EASINGS[easing]((indices[inside] - a) / (b - a))
+            delta = colours_b.astype(np.float32) - colours_a
+            frames[inside] = colours_a + t[:, None, None].astype(np.float32) * delta + 0.5
+
+        with self._lock:
+            for index, colours in zip(indices.tolist(), frames):
+                self._cache[index] = colours.copy() # Do not keep the whole batch alive
+                self._cache.move_to_end(index)
+            while len(self._cache) > self.cache_frames:
+                self._cache.popitem(last=False)
+        return frames
+
+
+class Player:
+    """
+    Plays a Timeline into a NanoList at the timeline's fps using widget.after.
+    A background thread renders frames ahead of the playhead so the Tk thread usually only copies a cached frame.
+    """
+    def __init__(self, widget, nanolist, timeline: Timeline, loop: bool = True, lookahead: Optional[int] = None) -> None:
+        self.widget = widget
+        self.nanolist = nanolist
+        self.timeline = timeline
+        self.loop = loop
+        self.layer = nanolist.layer # Frames go to the layer active when the player was made
+        self.lookahead = lookahead or max(1, min(timeline.cache_frames // 2, int(timeline.fps)))
+        self.playhead = 0
+        self.playing = False
+        self._after_id = None
+        self._wake = threading.Condition()
+        self._running = True
+        self._requested = False # Playhead moved since the producer last looked
+        self._thread = threading.Thread(target=self._produce, name="Player", daemon=True)
+        self._thread.start()
+
+    def play(self) -> None:
+        if not self.playing:
+            self.playing = True
+            self._tick()
+
+    def pause(self) -> None:
+        self.playing = False
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def seek(self, index: int) -> None:
+        """
+        Show frame index straight away
+        """
+        self.playhead = index % self.timeline.length
+        self._show()
+
+    def close(self) -> None:
+        self.pause()
+        with self._wake:
+            self._running = False
+            self._wake.notify()
+        self._thread.join()
+
+    def _tick(self) -> None:
+        self._after_id = self.widget.after(int(1000 / self.timeline.fps), self._tick)
+        self._show()
+        if profiler.enabled:
+            self.widget.after_idle(profiler.painted)
+        if self.playhead + 1 < self.timeline.length:
+            self.playhead += 1
+        elif self.loop:
+            self.playhead = 0
+        else:
+            self.pause()
+
+    def _show(self) -> None:
+        self.nanolist.load_frame(self.timeline.frame(self.playhead).tobytes(), layer=self.layer)
+        self.nanolist.update()
+        with self._wake:
+            self._requested = True
+            self._wake.notify()
+
+    def _produce(self) -> None:
+        """
+        Keep the next lookahead frames after the playhead rendered
+        """
+        while True:
+            with self._wake:
+                while self._running and not self._requested:
+                    self._wake.wait()
+                if not self._running:
+                    return
+                self._requested = False
+            start = self.playhead
+            ahead = [(start + i) % self.timeline.length for i in range(1, self.lookahead + 1)]
+            missing = [index for index in ahead if not self.timeline.is_cached(index)]
+            if missing:
+                for a, b in _runs(missing):
+                    self.timeline.render(a, b)
+
+
+def _runs(indices: List[int]) -> List[Tuple[int, int]]:
+    """
+    Consecutive indices grouped as [(start, stop), ...]
+    """
+    runs = []
+    for index in indices:
+        if runs and runs[-1][1] == index:
+            runs[-1][1] = index + 1
+        else:
+            runs.append([index, index + 1])
+    return [tuple(run) for run in runs]
@@ -1,12 +1,20 @@
+from typing import List, Optional
 import tkinter as tk
+from nanogui.startup import startup
 from nanogui.toolbar import ToolSideBar
 from nanogui.painting import Painting
+from nanogui.remote import RemoteServer
 
 class App(tk.Tk):
     """
     Main window for UofC Nanoleaf Editor
     """
-    def __init__(self) -> None:
+    def __init__(self, remote_port: Optional[int] = None, backend: str = "polygon", shape: Optional[List[int]] = None) -> None:
+        """
+        remote_port starts a remote.RemoteServer on localhost, backend is the Painting canvas backend.
+        shape is the panel layout (NanoList.shape), the UofC wall by default
+        """
+        startup.mark("imports")
         super().__init__()
         self.title("UofC Nanoleaf Editor")
 
@@ -15,9 +23,14 @@ class App(tk.Tk):
 
         self.toolbar = ToolSideBar(self)
         self.toolbar.pack(fill='y', side='left', expand=False)
+        startup.mark("toolbar")
 
-        self.canvas_frame = Painting(self)
+        self.canvas_frame = Painting(self, backend=backend, shape=shape)
         self.canvas_frame.pack(fill="both", side="right", expand=True)
+        startup.mark("canvas")
+        self.after(0, lambda: self.after_idle(startup.first_paint)) # After the first NanoList.update and its redraw
+
+        self.remote = RemoteServer(self.canvas_frame, port=remote_port) if remote_port is not None else None
 
     def center_window(self, width: int, height: int) -> str:
         sw, sh = self.winfo_screenwidth(), self.winfo_screenheight()
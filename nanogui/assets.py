@@ -0,0 +1,61 @@
+"""
+Icons resized once and cached as PNG files, keyed by the source image's content hash and the target size.
+Tk reads the cached PNGs itself, so Pillow is only imported when a source image is new or has changed.
+"""
+from typing import Optional, Tuple
+import hashlib
+import os
+import tkinter as tk
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "nanogui", "icons")
+
+
+def cached_icon(path: str, size: Tuple[int, int], flip: bool = False, cache_dir: Optional[str] = None) -> str:
+    """
+    Path of a PNG of the image at path resized to size (and mirrored left to right with flip), made if needed
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(path))[0]
+    variant = f"{name}-{size[0]}x{size[1]}{'-flip' if flip else ''}"
+    cached = os.path.join(cache_dir, f"{variant}-{digest}.png")
+    if os.path.exists(cached):
+        return cached
+
+    from PIL import Image # Only needed when the cache is out of date
+    image = Image.open(path).resize(size)
+    if flip:
+        image = image.transpose(Image.FLIP_LEFT_RIGHT)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for old in os.listdir(cache_dir): # Versions of this variant for older source images
+            if old.startswith(variant + "-") and len(old) == len(variant) + 21:
+                os.remove(os.path.join(cache_dir, old))
+        temp = cached + ".tmp"
+        image.save(temp, format="PNG")
+        os.replace(temp, cached)
+    except OSError: # Read only cache, e.g. a locked down kiosk account: keep the image in memory instead
+        return _memory_png(image)
+    return cached
+
+
+def _memory_png(image) -> str:
+    """
+    Base64 PNG data, accepted by load_icon in place of a file
+    """
+    import base64
+    import io
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return "data:" + base64.b64encode(buffer.getvalue()).decode()
+
+
+def load_icon(path: str, size: Tuple[int, int], flip: bool = False, cache_dir: Optional[str] = None) -> tk.PhotoImage:
+    """
+    tk.PhotoImage of a cached icon, see cached_icon
+    """
+    cached = cached_icon(path, size, flip, cache_dir)
+    if cached.startswith("data:"):
+        return tk.PhotoImage(data=cached[5:], format="png")
+    return tk.PhotoImage(file=cached, format="png")
@@ -0,0 +1,235 @@
+"""
+Procedural effects. Each effect is evaluated in one go over every panel:
+    effect(xy, t, **params) -> (N, 3) array of colours from 0 to 1
+xy is an (N, 2) array of triangle centres in triangle lengths from the centre of the grid, t is seconds.
+Colours in params are "#RRGGBB" strings.
+"""
+from typing import Callable, Dict, Tuple, Optional
+import inspect
+import time
+import traceback
+import numpy as np
+from nanogui.framebuffer import parse_hex
+from nanogui.profiling import profiler
+
+
+def hsv_to_rgb(h, s, v):
+    """
+    Vectorised HSV to RGB, every argument from 0 to 1. Returns (N, 3)
+    """
+    h = (h % 1.0) * 6
+    i = np.floor(h).astype(np.int64) % 6
+    f = h - np.floor(h)
+    p, q, r = v * (1 - s), v * (1 - s * f), v * (1 - s * (1 - f))
+    v = np.broadcast_to(v, h.shape)
+    channels = [(v, r, p), (q, v, p), (p, v, r), (p, q, v), (r, p, v), (v, p, q)]
+    rgb = np.empty(h.shape + (3,))
+    for k, (c0, c1, c2) in enumerate(channels):
+        mask = i == k
+        rgb[mask, 0] = np.broadcast_to(c0, h.shape)[mask]
+        rgb[mask, 1] = np.broadcast_to(c1, h.shape)[mask]
+        rgb[mask, 2] = np.broadcast_to(c2, h.shape)[mask]
+    return rgb
+
+
+def _rgb(colour: str) -> np.ndarray:
+    return np.array(parse_hex(colour)) / 255
+
+
+def gradient(xy, t, colour1="#FF0000", colour2="#0000FF", angle=0.0, speed=0.0, **_):
+    """
+    Linear blend from colour1 to colour2 across the grid, turning at speed revolutions per second
+    """
+    theta = np.radians(angle) + 2 * np.pi * speed * t
+    d = xy @ np.array([np.cos(theta), np.sin(theta)])
+    span = np.ptp(d) or 1.0
+    w = ((d - d.min()) / span)[:, None]
+    return _rgb(colour1) * (1 - w) + _rgb(colour2) * w
+
+
+def plasma(xy, t, scale=0.5, speed=1.0, **_):
+    x, y = xy[:, 0] * scale, xy[:, 1] * scale
+    t = t * speed
+    v = np.sin(x + t) + np.sin((y + t) / 2) + np.sin((x + y + t) / 2) + np.sin(np.hypot(x, y) + t)
+    return hsv_to_rgb(v / 8 + 0.5, 1.0, 1.0)
+
+
+def rainbow(xy, t, speed=0.2, scale=0.05, angle=0.0, **_):
+    """
+    Hue sweep across the grid
+    """
+    theta = np.radians(angle)
+    d = xy @ np.array([np.cos(theta), np.sin(theta)])
+    return hsv_to_rgb(d * scale - speed * t, 1.0, 1.0)
+
+
+def _lattice(ix, iy, iz, seed):
+    """
+    Pseudo random value from 0 to 1 for every integer lattice point
+    """
+    h = (ix * 374761393 + iy * 668265263 + iz * 2147483647 + seed * 1274126177) & 0xFFFFFFFF
+    h = ((h ^ (h >> 13)) * 1274126177) & 0xFFFFFFFF
+    return (h ^ (h >> 16)) / 0xFFFFFFFF
+
+
+def noise(xy, t, scale=0.3, speed=0.5, seed=0, colour1="#000000", colour2="#FFFFFF", **_):
+    """
+    Smooth value noise drifting with time, shaded from colour1 to colour2
+    """
+    p = np.column_stack([xy * scale, np.full(len(xy), t * speed)])
+    cell = np.floor(p).astype(np.int64)
+    f = p - cell
+    f = f * f * (3 - 2 * f) # Smoothstep between lattice points
+    value = np.zeros(len(xy))
+    for dx in (0, 1):
+        for dy in (0, 1):
+            for dz in (0, 1):
+                weight = (f[:, 0] if dx else 1 - f[:, 0]) * (f[:, 1] if dy else 1 - f[:, 1]) * (f[:, 2] if dz else 1 - f[:, 2])
+                value += weight * _lattice(cell[:, 0] + dx, cell[:, 1] + dy, cell[:, 2] + dz, seed)
+    w = value[:, None]
+    return _rgb(colour1) * (1 - w) + _rgb(colour2) * w
+
+
+def ripple(xy, t, origin=(0.0, 0.0), colour1="#00BFFF", speed=4.0, wavelength=3.0, decay=0.3, **_):
+    """
+    Rings spreading out from origin (set by clicking a panel)
+    """
+    r = np.hypot(xy[:, 0] - origin[0], xy[:, 1] - origin[1])
+    phase = 2 * np.pi * (r - speed * t) / wavelength
+    amplitude = np.exp(-decay * np.maximum(speed * t - r, 0)) * (r <= speed * t)
+    w = (amplitude * (0.5 + 0.5 * np.cos(phase)))[:, None]
+    return _rgb(colour1) * w
+
+
+EFFECTS: Dict[str, Callable] = {
+    "gradient": gradient,
+    "plasma": plasma,
+    "rainbow": rainbow,
+    "noise": noise,
+    "ripple": ripple,
+}
+ORIGIN_EFFECTS = {"ripple"} # Effects which restart from the clicked panel
+
+
+def parameters(name: str) -> Dict[str, object]:
+    """
+    Parameters effect name takes, with their defaults (origin is set with EffectRunner.set_origin)
+    """
+    if name not in EFFECTS:
+        raise ValueError(f"Unknown effect: {name}")
+    return {p.name: p.default for p in inspect.signature(EFFECTS[name]).parameters.values()
+            if p.kind == p.POSITIONAL_OR_KEYWORD and p.name not in ("xy", "t", "origin")}
+
+
+def check_params(name: str, params: dict) -> None:
+    """
+    Raise ValueError unless params are arguments of effect name, colours given as "#RRGGBB" and numbers as numbers
+    """
+    defaults = parameters(name)
+    for key, value in params.items():
+        if key not in defaults:
+            raise ValueError(f"Unknown parameter for {name}: {key}")
+        if isinstance(defaults[key], str):
+            if not isinstance(value, str) or len(value) != 7 or not value.startswith("#"):
+                raise ValueError(f"{key} is a colour \"#RRGGBB\", got {value!r}")
+            parse_hex(value)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{key} is a number, got {value!r}")
+
+
+def evaluate(name: str, xy: np.ndarray, t: float, **params) -> bytes:
+    """
+    Packed RGB of every panel for effect name at time t
+    """
+    if name not in EFFECTS:
+        raise ValueError(f"Unknown effect: {name}")
+    colours = EFFECTS[name](xy, t, **params)
+    return (np.clip(colours, 0, 1) * 255 + 0.5).astype(np.uint8).tobytes()
+
+
+class EffectRunner:
+    """
+    Evaluates one effect per frame on the panel centres and writes the result straight into the NanoList.
+    Frames are scheduled with widget.after at fps.
+    With workers (a workers.WorkerPool) frames are rendered in the background, frames the pool falls behind on are dropped
+    """
+    def __init__(self, widget, nanolist, geometry, fps: float = 60, workers=None) -> None:
+        self.widget = widget
+        self.workers = workers
+        self.nanolist = nanolist
+        self.xy = np.array(geometry.centroids())
+        self.positions = list(range(nanolist.offsets[1], len(nanolist.flat))) # Every panel, no background
+        self.interval = max(1, int(1000 / fps))
+        self.name: Optional[str] = None
+        self.layer = None # Layer the effect paints, the active one when it started
+        self.params = {}
+        self.origin: Tuple[float, float] = (0.0, 0.0)
+        self._start = 0.0
+        self._after_id = None
+        self._job = None # Frame being rendered by the workers
+
+    def start(self, name: str, **params) -> None:
+        check_params(name, params)
+        self.stop()
+        self.name = name
+        self.params = params
+        self.layer = self.nanolist.layer
+        self._start = time.perf_counter()
+        self._tick()
+
+    def stop(self) -> None:
+        if self._job is not None:
+            self.workers.cancel(self._job)
+            self._job = None
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+            self.nanolist.update_undo()
+        self.name = None
+
+    def set_origin(self, coord: Tuple[int, int]) -> None:
+        """
+        Centre of the NanoList cell (row, col), used by effects with an origin.
+        Effects in ORIGIN_EFFECTS start again from there
+        """
+        pos = self.nanolist._pos(coord) - self.positions[0]
+        if 0 <= pos < len(self.xy):
+            self.origin = tuple(self.xy[pos])
+            if self.name in ORIGIN_EFFECTS:
+                self._start = time.perf_counter()
+
+    def render(self, t: float) -> bytes:
+        """
+        Packed RGB of every panel at time t
+        """
+        return evaluate(self.name, self.xy, t, origin=self.origin, **self.params)
+
+    def _failed(self, error: Exception) -> None:
+        """
+        A frame rendered by the workers raised: stop rather than fail again every frame
+        """
+        self.stop()
+        print("Effect stopped:", "".join(traceback.format_exception(type(error), error, error.__traceback__)))
+
+    def _tick(self) -> None:
+        """
+        Render one frame and schedule the next. An effect that fails to evaluate is stopped, the error raised
+        """
+        t = time.perf_counter() - self._start
+        if self.workers is not None:
+            layer = self.layer
+            self._job = self.workers.submit(evaluate, self.name, self.xy, t, origin=self.origin, **self.params, key=self,
+                                            on_done=lambda packed: self.nanolist.write(self.positions, packed, layer=layer),
+                                            on_error=self._failed)
+            self._after_id = self.widget.after(self.interval, self._tick)
+            return
+        try:
+            packed = self.render(t)
+        except Exception:
+            self.stop()
+            raise
+        self._after_id = self.widget.after(self.interval, self._tick)
+        self.nanolist.write(self.positions, packed, layer=self.layer)
+        self.nanolist.update()
+        if profiler.enabled:
+            self.widget.after_idle(profiler.painted)
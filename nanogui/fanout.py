@@ -0,0 +1,166 @@
+from typing import Tuple, List, Dict, Optional
+import asyncio
+import json
+import threading
+import time
+from nanogui.stream import EXT_CONTROL_PORT, changed_panels, encode_frame
+
+
+class Controller:
+    """
+    One Nanoleaf controller from a layout manifest and its send statistics.
+    panels maps NanoList (row, col) to the panel id on this controller.
+    protocol is "udp" (external control streaming) or "http" (static effect write, needs token)
+    """
+    def __init__(self, name: str, host: str, panels: Dict[Tuple[int, int], int], port: Optional[int] = None,
+                 protocol: str = "udp", token: str = "", max_fps: float = 30, queue_size: int = 2) -> None:
+        if protocol not in ("udp", "http"):
+            raise ValueError(f"Unknown controller protocol: {protocol}")
+        self.name = name
+        self.host = host
+        self.port = port or (EXT_CONTROL_PORT if protocol == "udp" else 16021)
+        self.protocol = protocol
+        self.token = token
+        self.panels = panels
+        self.min_interval = 1 / max_fps
+        self.queue_size = queue_size
+
+        self.frames_sent = 0
+        self.frames_dropped = 0 # Frames discarded because the queue was full
+        self.latencies: List[float] = [] # Seconds from submit to send, most recent last
+        self.positions: List[int] = []
+        self.ids: List[int] = list(panels.values())
+
+    def stats(self) -> Dict[str, float]:
+        latest = self.latencies[-100:]
+        return {
+            "sent": self.frames_sent,
+            "dropped": self.frames_dropped,
+            "latency_ms": 1000 * sum(latest) / len(latest) if latest else 0.0,
+            "latency_max_ms": 1000 * max(latest) if latest else 0.0,
+        }
+
+
+def load_manifest(path: str) -> Tuple[List[int], List[Controller]]:
+    """
+    Read a layout manifest:
+        {"shape": [1, 13, ...],
+         "controllers": [{"name": "left", "host": "10.0.0.5", "panels": [[row, col, panel id], ...], ...}]}
+    Any other controller keys are passed to Controller. Returns (shape, controllers)
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    controllers = []
+    for entry in manifest["controllers"]:
+        entry = dict(entry)
+        panels = {(row, col): panel_id for row, col, panel_id in entry.pop("panels")}
+        controllers.append(Controller(panels=panels, **entry))
+
+    owners = {}
+    for controller in controllers:
+        for coord in controller.panels:
+            if coord in owners:
+                raise ValueError(f"Panel {coord} is assigned to both {owners[coord]} and {controller.name}")
+            owners[coord] = controller.name
+    return manifest["shape"], controllers
+
+
+class FanOut:
+    """
+    Sends NanoList frames to several controllers, each with its own bounded asyncio queue.
+    The asyncio loop runs on a background thread. When a controller's queue is full the oldest
+    frame is dropped, so a slow controller only falls behind itself.
+    Can be added to NanoList.outputs like stream.PanelStream.
+    """
+    def __init__(self, nanolist, controllers: List[Controller]) -> None:
+        self.controllers = controllers
+        for controller in controllers:
+            controller.positions = [nanolist._pos(coord) for coord in controller.panels]
+
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="FanOut", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def submit(self, flat) -> None:
+        """
+        Queue the current colours of a NanoList store (NanoList.flat) for every controller
+        """
+        now = time.monotonic()
+        frames = [(controller, flat.pack(controller.positions)) for controller in self.controllers]
+        self._loop.call_soon_threadsafe(self._enqueue, frames, now)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {controller.name: controller.stats() for controller in self.controllers}
+
+    def close(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._queues = {controller.name: asyncio.Queue(controller.queue_size) for controller in self.controllers}
+        self._tasks = [self._loop.create_task(self._worker(controller)) for controller in self.controllers]
+        self._loop.call_soon(self._ready.set)
+        self._loop.run_forever()
+        for task in self._tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*self._tasks, return_exceptions=True))
+        self._loop.close()
+
+    def _enqueue(self, frames: List[Tuple[Controller, bytes]], submitted: float) -> None:
+        for controller, frame in frames:
+            queue = self._queues[controller.name]
+            if queue.full():
+                queue.get_nowait()
+                controller.frames_dropped += 1
+            queue.put_nowait((frame, submitted))
+
+    async def _worker(self, controller: Controller) -> None:
+        queue = self._queues[controller.name]
+        sent = None
+        transport = None
+        if controller.protocol == "udp":
+            transport, _ = await self._loop.create_datagram_endpoint(
+                asyncio.DatagramProtocol, remote_addr=(controller.host, controller.port))
+        try:
+            while True:
+                frame, submitted = await queue.get()
+                changed = changed_panels(controller.ids, frame, sent)
+                if changed:
+                    try:
+                        if transport is not None:
+                            transport.sendto(encode_frame(changed))
+                        else:
+                            await self._put_static(controller, changed)
+                    except OSError as e:
+                        print(f"Controller {controller.name}: {e}")
+                        continue
+                    controller.frames_sent += 1
+                    controller.latencies.append(time.monotonic() - submitted)
+                    del controller.latencies[:-1000]
+                sent = frame
+                await asyncio.sleep(controller.min_interval)
+        finally:
+            if transport is not None:
+                transport.close()
+
+    async def _put_static(self, controller: Controller, panels: List[Tuple[int, int, int, int]]) -> None:
+        """
+        Write panels as a static effect through the controller's HTTP API
+        """
+        anim_data = " ".join([str(len(panels))] + [f"{panel_id} 1 {r} {g} {b} 0 1" for panel_id, r, g, b in panels])
+        body = json.dumps({"write": {"command": "display", "animType": "static", "animData": anim_data,
+                                     "loop": False, "palette": []}}).encode()
+        reader, writer = await asyncio.open_connection(controller.host, controller.port)
+        try:
+            writer.write(f"PUT /api/v1/{controller.token}/effects HTTP/1.1\r\n"
+                         f"Host: {controller.host}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+            status = await reader.readline()
+            if not status.split()[1:2] or not status.split()[1].startswith(b"2"):
+                raise OSError(f"HTTP write failed: {status.decode(errors='replace').strip()}")
+        finally:
+            writer.close()
@@ -0,0 +1,284 @@
+from typing import Tuple, List, Iterable, Optional, Sequence
+import random
+import numpy as np
+
+
+def parse_hex(c: str) -> Tuple[int, int, int]:
+    """
+    c = colour in form "#123456"
+    returns (r, g, b) from 0-255
+    """
+    c = c.lstrip("#")
+    return (int(c[0:2], 16), int(c[2:4], 16), int(c[4:6], 16))
+
+
+def format_hex(r: int, g: int, b: int) -> str:
+    return f"#{int(r):02X}{int(g):02X}{int(b):02X}"
+
+
+# Layer blend modes on colours from 0 to 1, written so they work on floats and numpy arrays alike
+BLEND_MODES = {
+    "normal": lambda base, top: top,
+    "add": lambda base, top: (base + top + 1 - abs(base + top - 1)) / 2, # min(base + top, 1)
+    "multiply": lambda base, top: base * top,
+    "screen": lambda base, top: 1 - (1 - base) * (1 - top),
+}
+
+
+def new_buffer(size: int, engine: Optional[str] = None):
+    """
+    Create colour storage for size panels.
+    engine is "rgb" (numpy uint8 array) or "hex" (list of strings). Defaults to "rgb"
+    """
+    if engine is None:
+        engine = "rgb"
+    if engine == "rgb":
+        return RGBBuffer(size)
+    if engine == "hex":
+        return HexBuffer(size)
+    raise ValueError(f"Unknown storage engine: {engine}")
+
+
+class HexBuffer:
+    """
+    Colours stored as a list of "#RRGGBB" strings, one per flat position
+    """
+    engine = "hex"
+
+    def __init__(self, size: int, colour: str = "#000000") -> None:
+        self.colours: List[str] = [colour] * size
+
+    def __len__(self) -> int:
+        return len(self.colours)
+
+    def __getitem__(self, pos: int) -> str:
+        return self.colours[pos]
+
+    def __setitem__(self, pos: int, colour: str) -> None:
+        self.colours[pos] = colour
+
+    def copy(self) -> "HexBuffer":
+        new = HexBuffer(0)
+        new.colours = self.colours.copy()
+        return new
+
+    def hex(self, positions: Iterable[int]) -> List[str]:
+        return [self.colours[pos] for pos in positions]
+
+    def pack(self, positions: Iterable[int]) -> bytes:
+        """
+        Colours at positions as packed RGB, 3 bytes per position
+        """
+        return bytes.fromhex("".join(self.colours[pos][1:7] for pos in positions))
+
+    def unpack(self, positions: Sequence[int], packed: bytes) -> None:
+        """
+        Write packed RGB (see pack) to positions
+        """
+        hexed = packed.hex().upper()
+        for i, pos in enumerate(positions):
+            self.colours[pos] = "#" + hexed[6 * i:6 * i + 6]
+
+    def dump(self) -> bytes:
+        """
+        Every colour as packed RGB
+        """
+        return self.pack(range(len(self.colours)))
+
+    def load(self, packed: bytes) -> List[int]:
+        """
+        Replace every colour from packed RGB (see dump), returns the positions that changed
+        """
+        hexed = packed.hex().upper()
+        changed = []
+        for pos in range(len(self.colours)):
+            colour = "#" + hexed[6 * pos:6 * pos + 6]
+            if colour != self.colours[pos]:
+                self.colours[pos] = colour
+                changed.append(pos)
+        return changed
+
+    def changed(self, other: "HexBuffer") -> List[int]:
+        """
+        Positions where self and other differ
+        """
+        return [pos for pos, (a, b) in enumerate(zip(self.colours, other.colours)) if a != b]
+
+    def similar(self, target: Tuple[int, int, int], tol: float) -> List[bool]:
+        """
+        For every position, True if each channel is within tol of target
+        """
+        tr, tg, tb = target
+        similar = []
+        for c in self.colours:
+            r, g, b = parse_hex(c)
+            similar.append(abs(r - tr) <= tol and abs(g - tg) <= tol and abs(b - tb) <= tol)
+        return similar
+
+    def matching(self, target: Tuple[int, int, int], tol: float) -> List[int]:
+        """
+        Positions whose colour is within tol of target
+        """
+        return [pos for pos, ok in enumerate(self.similar(target, tol)) if ok]
+
+    def fill(self, positions: Iterable[int], colour: str) -> None:
+        for pos in positions:
+            self.colours[pos] = colour
+
+    def mix(self, positions: Sequence[int], colours: List[str], strength: float) -> None:
+        """
+        Move each position towards the average of colours by strength (0-1)
+        """
+        rgb = [parse_hex(c) for c in colours]
+        target = [sum(channel) / len(rgb) for channel in zip(*rgb)]
+        for pos in positions:
+            old = parse_hex(self.colours[pos])
+            self.colours[pos] = format_hex(*(o * (1 - strength) + t * strength for o, t in zip(old, target)))
+
+    def blend(self, positions: Sequence[int], adjacency: List[Tuple[int, ...]], strength: float) -> None:
+        """
+        Move each position towards the average of its neighbours in adjacency.
+        All new colours are computed from the colours before the blend
+        """
+        new = []
+        for pos in positions:
+            adj = [parse_hex(self.colours[a]) for a in adjacency[pos]]
+            mean = [sum(channel) / max(len(adj), 1) for channel in zip(*adj)] or [0, 0, 0]
+            old = parse_hex(self.colours[pos])
+            new.append(format_hex(*(o * (1 - strength) + m * strength for o, m in zip(old, mean))))
+        for pos, colour in zip(positions, new):
+            self.colours[pos] = colour
+
+    def compose(self, positions: Sequence[int], layers: List[tuple]) -> None:
+        """
+        Flatten layers into positions, bottom layer first, starting from black.
+        layers are (buffer, cover, opacity, mode) with cover 1 where the layer is painted, 0 where it is clear
+        """
+        for pos in positions:
+            acc = [0.0, 0.0, 0.0]
+            for buffer, cover, opacity, mode in layers:
+                alpha = opacity * cover[pos]
+                if alpha:
+                    top = [c / 255 for c in parse_hex(buffer.colours[pos])]
+                    blend = BLEND_MODES[mode]
+                    acc = [a * (1 - alpha) + blend(a, t) * alpha for a, t in zip(acc, top)]
+            self.colours[pos] = format_hex(*(a * 255 + 0.5 for a in acc))
+
+    def sample(self, positions: Sequence[int], probability: float, seed: Optional[int] = None) -> List[int]:
+        """
+        Random subset of positions, each kept with the given probability
+        """
+        rng = random.Random(seed) if seed is not None else random
+        return [pos for pos in positions if rng.random() < probability]
+
+
+class RGBBuffer:
+    """
+    Colours stored as a contiguous (N, 3) uint8 array.
+    Hex strings are only produced when asked for, e.g. when pushing to the canvas
+    """
+    engine = "rgb"
+
+    def __init__(self, size: int, colour: str = "#000000") -> None:
+        self.rgb = np.empty((size, 3), dtype=np.uint8)
+        self.rgb[:] = parse_hex(colour)
+        self._adjacency = None # (source list, padded index array, mask, counts)
+
+    def __len__(self) -> int:
+        return len(self.rgb)
+
+    def __getitem__(self, pos: int) -> str:
+        return "#" + self.rgb[pos].tobytes().hex().upper()
+
+    def __setitem__(self, pos: int, colour: str) -> None:
+        self.rgb[pos] = parse_hex(colour)
+
+    def copy(self) -> "RGBBuffer":
+        new = RGBBuffer(0)
+        new.rgb = self.rgb.copy()
+        new._adjacency = self._adjacency
+        return new
+
+    def hex(self, positions: Iterable[int]) -> List[str]:
+        packed = self.rgb[_index(positions)].tobytes().hex().upper()
+        return ["#" + packed[i:i + 6] for i in range(0, len(packed), 6)]
+
+    def pack(self, positions: Iterable[int]) -> bytes:
+        return self.rgb[_index(positions)].tobytes()
+
+    def unpack(self, positions: Sequence[int], packed: bytes) -> None:
+        self.rgb[_index(positions)] = np.frombuffer(packed, dtype=np.uint8).reshape(-1, 3)
+
+    def dump(self) -> bytes:
+        return self.rgb.tobytes()
+
+    def load(self, packed: bytes) -> List[int]:
+        new = np.frombuffer(packed, dtype=np.uint8).reshape(self.rgb.shape)
+        changed = np.flatnonzero((self.rgb != new).any(axis=1))
+        self.rgb[changed] = new[changed]
+        return changed.tolist()
+
+    def changed(self, other: "RGBBuffer") -> List[int]:
+        return np.flatnonzero((self.rgb != other.rgb).any(axis=1)).tolist()
+
+    def similar(self, target: Tuple[int, int, int], tol: float) -> List[bool]:
+        return self._similar(target, tol).tolist()
+
+    def matching(self, target: Tuple[int, int, int], tol: float) -> List[int]:
+        return np.flatnonzero(self._similar(target, tol)).tolist()
+
+    def _similar(self, target: Tuple[int, int, int], tol: float):
+        diff = np.abs(self.rgb.astype(np.int16) - np.array(target, dtype=np.int16))
+        return (diff <= tol).all(axis=1)
+
+    def fill(self, positions: Iterable[int], colour: str) -> None:
+        self.rgb[_index(positions)] = parse_hex(colour)
+
+    def mix(self, positions: Sequence[int], colours: List[str], strength: float) -> None:
+        idx = _index(positions)
+        target = np.array([parse_hex(c) for c in colours], dtype=np.float64).mean(axis=0)
+        self.rgb[idx] = self.rgb[idx] * (1 - strength) + target * strength
+
+    def blend(self, positions: Sequence[int], adjacency: List[Tuple[int, ...]], strength: float) -> None:
+        idx = _index(positions)
+        neighbours, mask, counts = self._padded(adjacency)
+        adj_rgb = self.rgb[neighbours[idx]] * mask[idx, :, None]
+        mean = adj_rgb.sum(axis=1) / np.maximum(counts[idx], 1)[:, None]
+        self.rgb[idx] = self.rgb[idx] * (1 - strength) + mean * strength
+
+    def compose(self, positions: Sequence[int], layers: List[tuple]) -> None:
+        idx = _index(positions)
+        acc = np.zeros((len(idx), 3))
+        for buffer, cover, opacity, mode in layers:
+            alpha = (opacity * np.frombuffer(cover, dtype=np.uint8)[idx])[:, None]
+            top = buffer.rgb[idx] / 255
+            acc = acc * (1 - alpha) + BLEND_MODES[mode](acc, top) * alpha
+        self.rgb[idx] = acc * 255 + 0.5
+
+    def sample(self, positions: Sequence[int], probability: float, seed: Optional[int] = None) -> List[int]:
+        idx = _index(positions)
+        rng = np.random.default_rng(seed)
+        return idx[rng.random(len(idx)) < probability].tolist()
+
+    def _padded(self, adjacency: List[Tuple[int, ...]]):
+        """
+        Adjacency lists as a (N, K) index array padded with 0, a mask of real entries and neighbour counts.
+        Cached for as long as the same adjacency list is passed in
+        """
+        if self._adjacency is None or self._adjacency[0] is not adjacency:
+            width = max((len(adj) for adj in adjacency), default=0)
+            neighbours = np.zeros((len(adjacency), width), dtype=np.intp)
+            mask = np.zeros((len(adjacency), width), dtype=np.float64)
+            for pos, adj in enumerate(adjacency):
+                neighbours[pos, :len(adj)] = adj
+                mask[pos, :len(adj)] = 1
+            self._adjacency = (adjacency, neighbours, mask, mask.sum(axis=1))
+        return self._adjacency[1:]
+
+
+def _index(positions: Iterable[int]):
+    if isinstance(positions, np.ndarray):
+        return positions
+    if not isinstance(positions, (list, tuple)):
+        positions = list(positions)
+    return np.asarray(positions, dtype=np.intp)
@@ -0,0 +1,87 @@
+from typing import Tuple, List
+import math
+
+BACKGROUND = (0, 0) # NanoList coordinate of the background
+
+
+class TriangleGeometry:
+    """
+    Pixel layout of the triangle grid drawn by Painting.
+    columns_per_row is the number of triangles in each panel row (NanoList.shape without the background row).
+    Vertices are precomputed once in units of one triangle length around the centre of the grid,
+    fit() only changes the scale and centre. pick() is constant time.
+    """
+    def __init__(self, columns_per_row: List[int]) -> None:
+        self.columns_per_row = list(columns_per_row)
+        self.growing: List[bool] = [num_cols > prev for prev, num_cols in zip([0] + self.columns_per_row, self.columns_per_row)]
+
+        unit_height = (3**0.5) / 2
+        self.unit_vertices: List[List[List[Tuple[float, float]]]] = [] # [row][col] -> 3 corners
+        for row, num_cols in enumerate(self.columns_per_row):
+            y_upper = (row - len(self.columns_per_row) / 2) * unit_height
+            y_lower = y_upper + unit_height
+            corners = []
+            for col in range(num_cols):
+                x0 = col / 2 - num_cols / 4
+                X = [x0, x0 + 0.5, x0 + 1]
+                Y = [y_lower, y_upper, y_lower] if self.is_upright(row, col) else [y_upper, y_lower, y_upper]
+                corners.append(list(zip(X, Y)))
+            self.unit_vertices.append(corners)
+        self.fit(600, 600)
+
+    def fit(self, canvas_width: float, canvas_height: float) -> None:
+        """
+        Calculate the largest triangles that fit the canvas, and the margins which center the grid
+        """
+        self.canvas_width = canvas_width
+        self.canvas_height = canvas_height
+        self.centre = (canvas_width / 2, canvas_height / 2)
+        max_width = canvas_width / (max(self.columns_per_row)+4) * 2
+        max_height = canvas_height / (len(self.columns_per_row)+2) * (2 / (3**0.5))
+        self.triangle_length = min(max_width, max_height)
+        self.triangle_height = self.triangle_length * (3**0.5) / 2
+        self.x_margins = [(canvas_width - num_cols * self.triangle_length / 2) / 2 for num_cols in self.columns_per_row]
+        self.y_margin = (canvas_height - len(self.columns_per_row) * self.triangle_height) / 2
+
+    def is_upright(self, row: int, col: int) -> bool:
+        """
+        True if the triangle at panel row, col points up. row does not count the background row
+        """
+        return (col + self.growing[row]) % 2 == 1
+
+    def vertices(self, row: int, col: int) -> List[Tuple[float, float]]:
+        """
+        Corner coordinates of the triangle at panel row, col. row does not count the background row
+        """
+        cx, cy = self.centre
+        return [(cx + self.triangle_length * x, cy + self.triangle_length * y) for x, y in self.unit_vertices[row][col]]
+
+    def centroids(self) -> List[Tuple[float, float]]:
+        """
+        Centre of every triangle in flat order (row by row), in triangle lengths from the centre of the grid
+        """
+        return [(sum(x for x, _ in corners) / 3, sum(y for _, y in corners) / 3)
+                for row in self.unit_vertices for corners in row]
+
+    def pick(self, x: float, y: float) -> Tuple[int, int]:
+        """
+        NanoList (row, col) of the triangle under pixel x, y, or BACKGROUND
+        """
+        if self.triangle_height <= 0:
+            return BACKGROUND
+        row_f = (y - self.y_margin) / self.triangle_height
+        row = math.floor(row_f)
+        if not 0 <= row < len(self.columns_per_row):
+            return BACKGROUND
+        depth = row_f - row # 0 at the top of the row, 1 at the bottom
+        u = (x - self.x_margins[row]) / (self.triangle_length / 2) # Position in half triangle lengths
+        k = math.floor(u)
+
+        # Triangle col spans u in [col, col+2] with its tip at col+1
+        for col in (k, k - 1):
+            if not 0 <= col < self.columns_per_row[row]:
+                continue
+            half_width = depth if self.is_upright(row, col) else 1 - depth
+            if abs(u - (col + 1)) <= half_width:
+                return (row + 1, col)
+        return BACKGROUND
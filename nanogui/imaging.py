@@ -0,0 +1,127 @@
+from typing import Iterator, List, Tuple, Union
+from functools import lru_cache
+import glob
+import os
+import numpy as np
+from PIL import Image, ImageSequence
+from nanogui.masks import triangle_labels, centre_pixels
+from nanogui.project import ProjectWriter
+
+
+class TriangleSampler:
+    """
+    Area-averages an image onto the triangle grid.
+    Which pixels fall in which triangle is worked out once per (image size, shape) and cached,
+    after which sampling a frame is one gather and one segmented sum over the image.
+    """
+    def __init__(self, shape: List[int]) -> None:
+        self.shape = tuple(shape)
+        self.size = sum(self.shape)
+        self.positions = list(range(self.shape[0], self.size)) # Every panel, no background
+
+    def sample(self, image: Union[Image.Image, np.ndarray]) -> bytes:
+        """
+        Packed RGB of every panel (see positions) for an image.
+        Arrays are (height, width) greyscale or (height, width, channels) with 1 to 4 channels (L, LA, RGB, RGBA),
+        alpha is dropped
+        """
+        if isinstance(image, np.ndarray) and not (image.ndim == 3 and image.shape[2] == 3):
+            if image.ndim == 3 and image.shape[2] == 1:
+                image = image[:, :, 0]
+            if not (image.ndim == 2 or (image.ndim == 3 and image.shape[2] in (2, 4))):
+                raise ValueError(f"Expected a greyscale, RGB or RGBA image, got an array of shape {image.shape}")
+            image = Image.fromarray(np.asarray(image, dtype=np.uint8))
+        if isinstance(image, Image.Image):
+            image = np.asarray(image.convert("RGB"))
+        height, width = image.shape[:2]
+        order, starts, covered, counts, empty, fallback = _weights(self.shape, width, height)
+
+        pixels = image.reshape(-1, 3)
+        means = np.empty((self.size, 3))
+        means[covered] = np.add.reduceat(pixels[order], starts, axis=0, dtype=np.uint32) / counts[:, None]
+        means[empty] = pixels[fallback] # Triangles smaller than a pixel take the pixel under their centre
+        return (means[self.shape[0]:] + 0.5).astype(np.uint8).tobytes()
+
+
+@lru_cache(maxsize=2)
+def _weights(shape: Tuple[int, ...], width: int, height: int):
+    """
+    Sampling plan for one image size:
+        order: indices of pixels inside a panel, grouped by panel
+        starts: where each panel's group starts in order
+        covered, counts: the flat position and number of pixels of each group
+        empty, fallback: panels without pixels and the pixel under their centre
+    """
+    labels = triangle_labels(shape, width, height).ravel()
+    order = np.argsort(labels, kind="stable").astype(np.int32)
+    order = order[labels[order] >= shape[0]]
+    sorted_labels = labels[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_labels[1:] != sorted_labels[:-1]])) if len(order) else np.zeros(0, dtype=np.intp)
+    covered = sorted_labels[starts]
+    counts = np.diff(np.concatenate([starts, [len(order)]]))
+
+    empty = np.setdiff1d(np.arange(shape[0], sum(shape)), covered)
+    centres = centre_pixels(shape, width, height)
+    fallback = np.array([centres[pos - shape[0]][1] * width + centres[pos - shape[0]][0] for pos in empty], dtype=np.intp)
+    return order, starts, covered, counts, empty, fallback
+
+
+def read_frames(path: str) -> Iterator[Image.Image]:
+    """
+    Decode frames one at a time, so memory stays flat for long clips.
+    path is an image (animated GIF/PNG/WebP give every frame), a directory of images, or a glob pattern
+    """
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, name) for name in os.listdir(path))
+    elif any(c in path for c in "*?["):
+        paths = sorted(glob.glob(path))
+    else:
+        paths = [path]
+
+    for frame_path in paths:
+        try:
+            image = Image.open(frame_path)
+        except OSError: # Not an image
+            continue
+        with image:
+            for frame in ImageSequence.Iterator(image):
+                yield frame.convert("RGB")
+
+
+def sample_frames(path: str, shape: List[int]) -> Iterator[bytes]:
+    """
+    Packed RGB panel colours for every frame of path, see read_frames
+    """
+    sampler = TriangleSampler(shape)
+    for frame in read_frames(path):
+        yield sampler.sample(frame)
+
+
+def save_clip(path: str, shape: List[int], out: str, background: bytes = b"", fps: float = 20) -> int:
+    """
+    Sample every frame of path (see read_frames) into a project file at out, one frame at a time, so memory stays flat
+    however long the clip. background is the packed RGB of the background cells, black when empty.
+    Returns the number of frames. out is removed when path has no frames or decoding fails
+    """
+    background = bytes(background) or bytes(3 * shape[0])
+    try:
+        with ProjectWriter(out, shape, fps) as writer:
+            for frame in sample_frames(path, shape):
+                writer.append(background + frame)
+    except BaseException:
+        os.remove(out)
+        raise
+    if not writer.frames:
+        os.remove(out)
+    return writer.frames
+
+
+def import_image(nanolist, path: str) -> None:
+    """
+    Paint the first frame of path onto the nanolist
+    """
+    frame = next(read_frames(path), None)
+    if frame is None:
+        raise ValueError(f"No image found at {path}")
+    sampler = TriangleSampler(nanolist.shape)
+    nanolist.write(sampler.positions, sampler.sample(frame))
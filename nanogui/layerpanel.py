@@ -0,0 +1,91 @@
+import tkinter as tk
+from nanogui.framebuffer import BLEND_MODES
+
+
+class LayerPanel(tk.Frame):
+    """
+    Layer list of the painting (top layer first) with controls for the selected layer.
+    Selecting a layer makes the tools paint into it
+    """
+    def __init__(self, parent, painting) -> None:
+        super().__init__(parent, bg="black", borderwidth=1, relief="flat")
+        self.painting = painting # Callable returning the Painting, which is made after the toolbar
+
+        self.listbox = tk.Listbox(self, height=4, width=16, exportselection=False)
+        self.listbox.grid(row=0, column=0, columnspan=4)
+        self.listbox.bind("<<ListboxSelect>>", self.on_select)
+
+        for i, (text, command) in enumerate([("+", self.add), ("-", self.remove), ("up", lambda: self.move(1)), ("down", lambda: self.move(-1))]):
+            tk.Button(self, text=text, width=3, command=command, relief="groove", borderwidth=2).grid(row=1, column=i)
+
+        self.mode = tk.StringVar(value="normal")
+        tk.OptionMenu(self, self.mode, *BLEND_MODES, command=lambda _: self.apply()).grid(row=2, column=0, columnspan=3, sticky="we")
+        self.visible = tk.BooleanVar(value=True)
+        tk.Checkbutton(self, text="show", variable=self.visible, command=self.apply).grid(row=2, column=3)
+        self.opacity = tk.Scale(self, from_=0, to=1, resolution=0.05, orient=tk.HORIZONTAL, label="opacity", command=lambda _: self.apply())
+        self.opacity.grid(row=3, column=0, columnspan=4)
+
+        self._refreshing = False
+        self.after(0, self.refresh)
+
+    @property
+    def nanolist(self):
+        return self.painting().nanolist
+
+    def refresh(self) -> None:
+        """
+        Show the layer stack and the settings of the active layer
+        """
+        self._refreshing = True
+        layers = self.nanolist.layers
+        self.listbox.delete(0, tk.END)
+        for layer in reversed(layers):
+            self.listbox.insert(tk.END, layer.name if layer.visible else f"({layer.name})")
+        active = self.nanolist.layer
+        self.listbox.selection_set(len(layers) - 1 - layers.index(active))
+        self.mode.set(active.mode)
+        self.visible.set(active.visible)
+        self.opacity.set(active.opacity)
+        self._refreshing = False
+
+    def on_select(self, event: tk.Event) -> None:
+        selection = self.listbox.curselection()
+        if selection:
+            layers = self.nanolist.layers
+            self.nanolist.set_active(layers[len(layers) - 1 - selection[0]])
+            self.refresh()
+
+    def apply(self) -> None:
+        """
+        Push the controls to the active layer
+        """
+        if self._refreshing:
+            return
+        self.nanolist.set_layer(self.nanolist.layer, opacity=float(self.opacity.get()), mode=self.mode.get(), visible=self.visible.get())
+        self.nanolist.update()
+        self.refresh()
+
+    def add(self) -> None:
+        self.nanolist.add_layer()
+        self.nanolist.update()
+        self.refresh()
+
+    def remove(self) -> None:
+        try:
+            self.nanolist.remove_layer(self.nanolist.layer)
+        except ValueError as e:
+            print(e)
+            return
+        self.nanolist.update()
+        self.refresh()
+
+    def move(self, step: int) -> None:
+        """
+        Move the active layer up (step 1) or down (step -1) the stack
+        """
+        layers = self.nanolist.layers
+        index = layers.index(self.nanolist.layer) + step
+        if 1 <= index < len(layers) and layers.index(self.nanolist.layer) > 0:
+            self.nanolist.move_layer(self.nanolist.layer, index)
+            self.nanolist.update()
+            self.refresh()
@@ -0,0 +1,77 @@
+from typing import List, Optional, Sequence
+from nanogui.framebuffer import new_buffer, BLEND_MODES
+
+
+class Layer:
+    """
+    One layer of a NanoList: its own colour store plus which cells have been painted (cover).
+    Cells that were never painted are clear and show the layers below.
+    The bottom layer is opaque everywhere.
+    """
+    def __init__(self, size: int, engine: Optional[str] = None, name: str = "layer", opaque: bool = False,
+                 opacity: float = 1.0, mode: str = "normal") -> None:
+        if mode not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode: {mode}")
+        self.name = name
+        self.flat = new_buffer(size, engine)
+        self.cover = bytearray(b"\x01" * size if opaque else size)
+        self.opaque = opaque
+        self.opacity = opacity
+        self.mode = mode
+        self.visible = True
+
+    def covers(self, positions: Sequence[int]) -> None:
+        """
+        Mark positions as painted
+        """
+        if not self.opaque:
+            cover = self.cover
+            for pos in positions:
+                cover[pos] = 1
+
+    def cover_all(self) -> List[int]:
+        """
+        Mark every position as painted, returns those that were clear
+        """
+        if self.opaque or 0 not in self.cover:
+            return []
+        clear = [pos for pos, covered in enumerate(self.cover) if not covered]
+        self.cover[:] = b"\x01" * len(self.cover)
+        return clear
+
+    def copy(self) -> "Layer":
+        new = Layer.__new__(Layer)
+        new.__dict__.update(self.__dict__)
+        new.flat = self.flat.copy()
+        new.cover = bytearray(self.cover)
+        return new
+
+    def changed(self, other: "Layer") -> List[int]:
+        """
+        Positions where colour or cover differ from other
+        """
+        changed = self.flat.changed(other.flat)
+        if self.cover != other.cover:
+            changed = sorted(set(changed).union(pos for pos, (a, b) in enumerate(zip(self.cover, other.cover)) if a != b))
+        return changed
+
+    def pack(self, positions: Sequence[int]) -> bytes:
+        """
+        Packed RGB of positions followed by their cover bytes (left out for opaque layers)
+        """
+        if self.opaque:
+            return self.flat.pack(positions)
+        return self.flat.pack(positions) + bytes(map(self.cover.__getitem__, positions))
+
+    def unpack(self, positions: Sequence[int], packed: bytes) -> None:
+        colours = 3 * len(positions)
+        self.flat.unpack(positions, packed[:colours])
+        if not self.opaque:
+            for pos, covered in zip(positions, packed[colours:]):
+                self.cover[pos] = covered
+
+    def plain(self) -> bool:
+        """
+        True when the layer shows exactly its own colours
+        """
+        return self.visible and self.opaque and self.opacity == 1 and self.mode == "normal"
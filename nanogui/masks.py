@@ -0,0 +1,107 @@
+"""
+Per-pixel triangle labels for rasterising or sampling the grid at a given pixel size.
+"""
+from typing import List, Tuple, Optional
+from functools import lru_cache
+import numpy as np
+
+
+@lru_cache(maxsize=2) # A few MB each at canvas size, callers keep the arrays they use
+def triangle_labels(shape: Tuple[int, ...], width: int, height: int, length: Optional[float] = None) -> np.ndarray:
+    """
+    (height, width) int32 array holding the NanoList flat position of the triangle covering each pixel centre,
+    0 (the background) where there is none.
+    The grid is centred with triangles length pixels long, by default as large as fits the image.
+    Cached per (shape, size, length); treat the result as read only.
+    """
+    columns = np.array(shape[1:])
+    rows = len(columns)
+    unit_height = (3**0.5) / 2
+    growing = columns > np.concatenate([[0], columns[:-1]])
+    offsets = np.cumsum(np.concatenate([[shape[0]], columns]))[:-1] # Flat position of each panel row's first cell
+
+    length = length or fit_length(shape, width, height)
+
+    # Pixel centres in triangle lengths from the centre of the grid
+    ux = (np.arange(width) + 0.5 - width / 2) / length
+    uy = (np.arange(height) + 0.5 - height / 2) / length
+
+    row_f = uy / unit_height + rows / 2
+    row = np.floor(row_f).astype(np.int64)
+    valid_row = (row >= 0) & (row < rows)
+    row_c = np.clip(row, 0, rows - 1)
+    depth = (row_f - row)[:, None] # 0 at the top of the row, 1 at the bottom
+
+    u = (ux[None, :] + columns[row_c][:, None] / 4) * 2 # Position in half lengths from the start of the row
+    k = np.floor(u).astype(np.int64)
+    labels = np.zeros((height, width), dtype=np.int32)
+    for col in (k, k - 1):
+        inside = valid_row[:, None] & (col >= 0) & (col < columns[row_c][:, None])
+        upright = (col + growing[row_c][:, None]) % 2 == 1
+        half_width = np.where(upright, depth, 1 - depth)
+        hit = inside & (np.abs(u - (col + 1)) <= half_width) & (labels == 0)
+        labels[hit] = (offsets[row_c][:, None] + col)[hit]
+    labels.setflags(write=False)
+    return labels
+
+
+def fit_length(shape: Tuple[int, ...], width: int, height: int) -> float:
+    """
+    Largest triangle length in pixels for which the whole grid fits in width x height
+    """
+    columns = shape[1:]
+    return min(width / (max(columns) / 2 + 0.5), height / (len(columns) * (3**0.5) / 2))
+
+
+def centre_pixels(shape: Tuple[int, ...], width: int, height: int, length: Optional[float] = None) -> List[Tuple[int, int]]:
+    """
+    (x, y) pixel nearest the centre of every panel, in flat order starting at the first panel
+    """
+    columns = shape[1:]
+    rows = len(columns)
+    unit_height = (3**0.5) / 2
+    length = length or fit_length(shape, width, height)
+
+    centres = []
+    prev = 0
+    for row, num_cols in enumerate(columns):
+        growing = num_cols > prev
+        for col in range(num_cols):
+            upright = (col + growing) % 2 == 1
+            x = col / 2 - num_cols / 4 + 0.5
+            y = (row - rows / 2 + (2 / 3 if upright else 1 / 3)) * unit_height
+            centres.append((min(width - 1, max(0, int(width / 2 + x * length))),
+                            min(height - 1, max(0, int(height / 2 + y * length)))))
+        prev = num_cols
+    return centres
+
+
+def triangle_edges(labels: np.ndarray) -> np.ndarray:
+    """
+    (height, width) bool array of the pixels of labels (see triangle_labels) on a border between two triangles,
+    drawn as the outline
+    """
+    edges = np.zeros(labels.shape, dtype=bool)
+    edges[:, 1:] |= labels[:, 1:] != labels[:, :-1]
+    edges[1:, :] |= labels[1:, :] != labels[:-1, :]
+    return edges
+
+
+@lru_cache(maxsize=2)
+def triangle_pixels(shape: Tuple[int, ...], width: int, height: int, length: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pixels of every triangle for redrawing single triangles of a (height, width) image, see triangle_labels.
+    Returns (pixels, starts, edges): pixels[starts[pos]:starts[pos + 1]] are the flat pixel indices inside flat position pos,
+    edges is triangle_edges of the labels, pixels on a border belong to no triangle.
+    Cached per (shape, size, length); treat the results as read only.
+    """
+    labels = triangle_labels(shape, width, height, length)
+    edges = triangle_edges(labels)
+    inner = np.flatnonzero(~edges).astype(np.int32)
+    inner_labels = labels.ravel()[inner]
+    pixels = inner[np.argsort(inner_labels, kind="stable")]
+    starts = np.zeros(sum(shape) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(inner_labels, minlength=sum(shape)), out=starts[1:])
+    for array in (pixels, starts, edges):
+        array.setflags(write=False)
+    return pixels, starts, edges
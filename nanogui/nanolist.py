@@ -1,101 +1,150 @@
-from typing import Tuple, Union, List
-import copy
+from typing import Tuple, Union, List, Dict, Iterable, Optional
+from collections import deque
+from array import array
+from nanogui.framebuffer import new_buffer, parse_hex, BLEND_MODES
+from nanogui.profiling import profiler
+from nanogui.layers import Layer
 
 # TODO Add colours to __str__
 
 class NanoList:
-    def __init__(self, canvas, shape=[1, 13, 15, 17, 19, 21, 23, 23, 21, 19, 17]):
+    def __init__(self, canvas, shape=[1, 13, 15, 17, 19, 21, 23, 23, 21, 19, 17], engine: Optional[str] = None, undo_budget: int = 1 << 20):
         """
         Container which will be used for storing colours of the NanoLeaf.
         
         0th entry is background colour. Not used for anything other than displaying on tkinter.
+        Colours are stored flat in self.flat, row by row. Flat position = index - 1
+        self.flat is the store of the active layer, see add_layer. What is displayed is the flattened layer stack
+        engine picks the storage, see framebuffer.new_buffer
+        undo_budget is the number of bytes the undo/redo history may use
         """
         self.canvas = canvas
-        self.shape: List[int] = shape
-        self.data = [["#000000"] * i for i in self.shape]
-        self.data[0][0] = "#555555"
-        self.undo_list = [copy.deepcopy(self.data)] # Most recent changes. Last entry is most recent
-        self.redo_list = [] # Previous undos. Last entry is most recent
-        self.forward = True # False if most recent change was an undo command
+        self.engine = engine
+        self.undo_budget = undo_budget
+        self.outputs = [] # Streams sent the colours on every update, see stream.PanelStream
+        self.view = None # Draws the changed positions instead of the canvas items when set, see raster.RasterGrid
+        self.shape = shape
+
+    @property
+    def shape(self) -> List[int]:
+        return self._shape
+
+    @shape.setter
+    def shape(self, shape: List[int]) -> None:
+        """
+        Changing the shape rebuilds the lookup tables and clears the canvas
+        """
+        self._shape: List[int] = list(shape)
+        self._build_layout()
+        base = Layer(len(self.coords), self.engine, name="background", opaque=True)
+        base.flat[0] = "#555555"
+        self.layers: List[Layer] = [base] # Bottom first
+        self.layer = base # Active layer, painted by the tools
+        self.flat = base.flat
+        self.composite = new_buffer(len(self.coords), base.flat.engine) # Flattened visible layers, see _recompose
+        self.dirty = set(range(len(self.flat))) # Flat positions changed since last canvas flush
+        self.items = list(range(1, len(self.flat)+1)) # Canvas item drawn for each flat position
+        self._reset_history()
+
+    def _build_layout(self) -> None:
+        """
+        Precompute lookup tables between flat position and (row, col)
+        offsets[row] = flat position of first cell in row, offsets[-1] = number of cells
+        coords[pos] = (row, col)
+        growing[row] = True if row is wider than the one above it
+        Neighbourhood stencils are built lazily per radius, see neighbours()
+        """
+        self.offsets: List[int] = [0]
+        for num_cols in self.shape:
+            self.offsets.append(self.offsets[-1] + num_cols)
+        self.coords: List[Tuple[int, int]] = [(row, col) for row, num_cols in enumerate(self.shape) for col in range(num_cols)]
+        self.growing: List[bool] = [num_cols > prev for prev, num_cols in zip([0] + self.shape, self.shape)]
+        self._stencils: Dict[int, List[Tuple[int, ...]]] = {}
+        self._adjacency: Optional[List[Tuple[int, ...]]] = None
+
+    @property
+    def data(self) -> List[List[str]]:
+        """
+        Nested [row][col] copy of the colours
+        """
+        return [self.flat.hex(range(a, b)) for a, b in zip(self.offsets, self.offsets[1:])]
 
-    def __getitem__(self, index):
+    @data.setter
+    def data(self, rows: List[List[str]]) -> None:
+        for pos, colour in enumerate(colour for row in rows for colour in row):
+            self[pos + 1] = colour
+        self._reset_history()
+
+    def _pos(self, index) -> int:
         """
-        Get entry based on either index or [row][col]
-            Although each row is staggered, each row starts at 0 index
+        Flat position for either index or (row, col)
         """
         if isinstance(index, tuple) and len(index)==1: index = index[0]
         if isinstance(index, tuple):
-            outer_index, inner_index = index
-            try:
-                return self.data[outer_index][inner_index]
-            except IndexError:
-                raise IndexError(f"Index {inner_index} out of range for sublist {outer_index}")
-        else:
-            index -=1
-            if index < 0:
-                raise IndexError("Negative indexing is not supported")
-            current_index = index
-            for outer_index, sublist in enumerate(self.data):
-                if current_index < len(sublist):
-                    return sublist[current_index]
-                current_index -= len(sublist)
+            row, col = index
+            if not (0 <= row < len(self.shape) and 0 <= col < self.shape[row]):
+                raise IndexError(f"Index {col} out of range for sublist {row}")
+            return self.offsets[row] + col
+        if index < 1:
+            raise IndexError("Negative indexing is not supported")
+        if index > len(self.flat):
             raise IndexError("Index out of range")
+        return index - 1
+
+    def __getitem__(self, index):
+        """
+        Get entry based on either index or [row][col]
+            Although each row is staggered, each row starts at 0 index
+        """
+        return self.flat[self._pos(index)]
 
     def __setitem__(self, index, value):
         """
         Set value with either index or [row][col]
         """
-        if isinstance(index, tuple) and len(index)==1: index = index[0]
-        if isinstance(index, tuple):
-            outer_index, inner_index = index
-            try:
-                self.data[outer_index][inner_index] = value
-            except IndexError:
-                raise IndexError(f"Index {inner_index} out of range for sublist {outer_index}")
-        else:
-            index -=1
-            if index < 0:
-                raise IndexError("Negative indexing is not supported")
-            current_index = index
-            for outer_index, sublist in enumerate(self.data):
-                if current_index < len(sublist):
-                    self.data[outer_index][current_index] = value
-                    return
-                current_index -= len(sublist)
-            raise IndexError("Index out of range")
+        pos = self._pos(index)
+        self.flat[pos] = value
+        self.dirty.add(pos)
+        if not self.layer.opaque: # The bottom layer is always covered
+            self.layer.cover[pos] = 1
         
     def _get_rowcol(self, index) -> Tuple[int, int]:
         """
         return (row, col) for given index
         """
-        if index < 0:
-            raise IndexError("Negative indexing is not supported")
-        current_index = index-1
-        for outer_index, sublist in enumerate(self.data):
-            if current_index < len(sublist):
-                return (outer_index, current_index)
-            current_index -= len(sublist)
-        raise IndexError("Index out of range")
+        return self.coords[self._pos(index)]
     
     def _get_index(self, coord: Tuple[int, int]) -> int:
         (row, col) = coord
-        index = 1
-        for i in range(row):
-            index += self.shape[i]
-        index += col
-        return index
+        return self.offsets[row] + col + 1
     
-    def knn(self, index, radius) -> Tuple[int]:
+    def knn(self, index, radius) -> List[Tuple[int, int]]:
         """
         Return nearest neighbours of a point based on set radius. returns absolute (row, col)
         """
-        if isinstance(index, tuple):
-            index = index[0]
-        relative_points = self._generate_points(radius, apply_flip=self._is_rightsideup(index))
-        center_pos = self._get_rowcol(index)
+        return [self.coords[pos] for pos in self.neighbours(self._pos(index), radius)]
+
+    def neighbours(self, pos: int, radius: int) -> Tuple[int, ...]:
+        """
+        Return flat positions of the nearest neighbours of flat position pos (itself included)
+        """
+        radius = int(radius)
+        stencil = self._stencils.get(radius)
+        if stencil is None:
+            stencil = self._build_stencil(radius)
+        return stencil[pos]
 
-        abs_pos = self._get_abs_pts(center_pos, relative_points)
-        return abs_pos
+    def _build_stencil(self, radius: int) -> List[Tuple[int, ...]]:
+        """
+        Compute the neighbours of every cell for one radius and cache them
+        """
+        patterns = {flip: self._generate_points(radius, apply_flip=flip) for flip in (False, True)}
+        stencil = []
+        for coord in self.coords:
+            abs_pts = self._get_abs_pts(coord, patterns[self._is_rightsideup(coord)])
+            stencil.append(tuple(self.offsets[row] + col for row, col in abs_pts))
+        self._stencils[radius] = stencil
+        return stencil
 
     def _get_abs_pts(self, center: Tuple[int, int], rel_pts: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
         """
@@ -162,8 +211,7 @@ class NanoList:
             row, col = self._get_rowcol(pos)
         else: (row, col) = pos
 
-        if row < 7: growing = True
-        else: growing = False
+        growing = self.growing[row]
 
         if (col + growing) % 2: 
             return False
@@ -175,15 +223,15 @@ class NanoList:
         Checks if triangle exists from a given (row, col) coordinate
         """
         if isinstance(pos, tuple) and len(pos)==1:
-            index = pos[0]
+            pos = pos[0]
         if isinstance(pos, int):
-            index = pos
-        try: (row, col) = self._get_rowcol(index)
-        except: (row, col) = pos
+            try: pos = self._get_rowcol(pos)
+            except IndexError: return False
+        (row, col) = pos
         if row < 1 or col < 0:
             return False
 
-        if row > len(self.shape):
+        if row >= len(self.shape):
             return False
 
         if col >= self.shape[row]:
@@ -207,56 +255,199 @@ class NanoList:
 
         return middle
     
-    def update(self):
-        for row_i, row in enumerate(self.data):
-            for col_i, colour in enumerate(row):
-                index = self._get_index((row_i, col_i))
-                self.canvas.itemconfig(index, fill=colour)
+    @profiler.timed("update")
+    def update(self, full: bool = False) -> None:
+        """
+        Push changed cells to the canvas.
+        Only indices in self.dirty are repainted unless full is set.
+        """
+        if full:
+            self.dirty.update(range(len(self.flat)))
+        positions = sorted(self.dirty)
+        shown = self._recompose(positions)
+        if self.view is not None:
+            self.view.paint(positions, shown)
+        else:
+            for pos, colour in zip(positions, shown.hex(positions)):
+                self.canvas.itemconfig(self.items[pos], fill=colour)
+        self.dirty.clear()
+        if positions:
+            for output in self.outputs:
+                output.submit(shown)
+
+    def _recompose(self, positions: List[int]):
+        """
+        Store holding the displayed colours, with positions brought up to date.
+        While the only visible layer shows its own colours that is the layer itself,
+        otherwise positions of the cached composite are flattened again in one pass over the layers
+        """
+        visible = [layer for layer in self.layers if layer.visible]
+        if len(visible) == 1 and visible[0].plain():
+            return visible[0].flat
+        if positions:
+            self.composite.compose(positions, [(layer.flat, layer.cover, layer.opacity, layer.mode) for layer in visible])
+        return self.composite
+
+    def _touch(self, positions: Iterable[int], layer: Optional[Layer] = None) -> None:
+        """
+        Mark positions painted on layer (the active one by default) and due for a repaint
+        """
+        layer = layer or self.layer
+        self.dirty.update(positions)
+        if not layer.opaque:
+            layer.covers(positions)
+
+    def displayed(self, index) -> str:
+        """
+        Colour shown at index after flattening the layers
+        """
+        pos = self._pos(index)
+        return self._recompose([pos])[pos]
+
+    def flattened(self) -> bytes:
+        """
+        Every displayed colour as packed RGB, see frame for the active layer only
+        """
+        return self._recompose(sorted(self.dirty)).dump()
 
+    def add_layer(self, name: Optional[str] = None, opacity: float = 1.0, mode: str = "normal") -> Layer:
+        """
+        New clear layer above the active one. It becomes the active layer
+        """
+        layer = Layer(len(self.flat), self.flat.engine, name or f"layer {len(self.layers)}", opacity=opacity, mode=mode)
+        self.layers.insert(self.layers.index(self.layer) + 1, layer)
+        self.set_active(layer)
+        self.dirty.update(range(len(self.flat)))
+        return layer
+
+    def remove_layer(self, layer: Union[int, Layer]) -> None:
+        """
+        Delete a layer and its undo history. The bottom layer can't be removed
+        """
+        layer = self._layer(layer)
+        index = self.layers.index(layer)
+        if index == 0:
+            raise ValueError("The bottom layer can't be removed")
+        if layer is self.layer:
+            self.set_active(self.layers[index - 1])
+        self.layers.remove(layer)
+        for journal in (self.undo_list, self.redo_list):
+            kept = [entry for entry in journal if entry[0] is not layer]
+            self.history_bytes -= sum(self._entry_size(entry) for entry in journal) - sum(self._entry_size(entry) for entry in kept)
+            journal[:] = kept
+        self.dirty.update(range(len(self.flat)))
+
+    def set_active(self, layer: Union[int, Layer]) -> None:
+        """
+        Paint into layer from now on. Changes to the previous layer are committed to the undo history first
+        """
+        layer = self._layer(layer)
+        self.update_undo()
+        self.layer = layer
+        self.flat = layer.flat
+        self._committed = layer.copy()
+
+    def set_layer(self, layer: Union[int, Layer], opacity: Optional[float] = None, mode: Optional[str] = None,
+                  visible: Optional[bool] = None, name: Optional[str] = None) -> None:
+        """
+        Change how a layer is blended. Every cell is recomposed on the next update
+        """
+        layer = self._layer(layer)
+        if mode is not None:
+            if mode not in BLEND_MODES:
+                raise ValueError(f"Unknown blend mode: {mode}")
+            layer.mode = mode
+        if opacity is not None:
+            layer.opacity = min(1.0, max(0.0, opacity))
+        if visible is not None:
+            layer.visible = visible
+        if name is not None:
+            layer.name = name
+        self.dirty.update(range(len(self.flat)))
+
+    def move_layer(self, layer: Union[int, Layer], index: int) -> None:
+        """
+        Put layer at index in the stack (0 is the bottom, which must stay opaque)
+        """
+        layer = self._layer(layer)
+        if index == 0 or self.layers.index(layer) == 0:
+            raise ValueError("The bottom layer can't be moved")
+        self.layers.remove(layer)
+        self.layers.insert(index, layer)
+        self.dirty.update(range(len(self.flat)))
+
+    def _layer(self, layer: Union[int, Layer]) -> Layer:
+        return self.layers[layer] if isinstance(layer, int) else layer
+
+    def _reset_history(self) -> None:
+        """
+        Forget all undo/redo entries and treat the current colours as committed
+        """
+        self.undo_list = [] # Journal entries (positions, old, new). Last entry is most recent
+        self.redo_list = [] # Undone entries. Last entry is most recent
+        self.history_bytes = 0
+        self._committed = self.layer.copy() # Active layer as of the last update_undo
+
+    @profiler.timed("undo_capture")
     def update_undo(self) -> None:
         """
         UNDOS:
-        undo_list = previous 10 things which it can undo
-        first in last out.
+        Record the cells changed since the last call as one journal entry.
+        Entries store the layer, flat positions and the packed old and new colours and cover (4 bytes each),
+        oldest entries are dropped once the history is larger than undo_budget.
         """
-        if not self.forward: # Means second last update was the undo button. Last update was an edit(click or drag)
-            self.redo_list = []
-        self.forward=True
-        self.undo_list.append(copy.deepcopy(self.data))
-        self.undo_list = self.undo_list[-10:] # Only keep 10 most recent
+        changed = self.layer.changed(self._committed)
+        if not changed:
+            return
+        positions = array("I", changed)
+        entry = (self.layer, positions, self._committed.pack(positions), self.layer.pack(positions))
+        self._committed.unpack(positions, entry[3])
+
+        self.history_bytes -= sum(self._entry_size(e) for e in self.redo_list)
+        self.redo_list = []
+        self.undo_list.append(entry)
+        self.history_bytes += self._entry_size(entry)
+        while self.history_bytes > self.undo_budget and len(self.undo_list) > 1:
+            self.history_bytes -= self._entry_size(self.undo_list.pop(0))
+
+    @staticmethod
+    def _entry_size(entry) -> int:
+        layer, positions, old, new = entry
+        return positions.itemsize * len(positions) + len(old) + len(new)
 
     def undo(self):
-        if self.forward:
-            self.undo_list.pop()
-        self.forward=False
-        try:
-            self.redo_list.append(self.data)
-            self.data = self.undo_list.pop()
-            self.update()
-        except IndexError:
+        self.update_undo()
+        if not self.undo_list:
             print("Nothing to undo")
+            return
+        layer, positions, old, new = entry = self.undo_list.pop()
+        self._apply(layer, positions, old)
+        self.redo_list.append(entry)
 
     def redo(self):
-            if self.redo_list == []:
-                print("Nothing to redo")
-                return
-            try:
-                self.undo_list.append(self.data)
-                self.data = self.redo_list.pop()
-                self.update()
-            except IndexError:
-                print("How did this happen?")
+        if not self.redo_list:
+            print("Nothing to redo")
+            return
+        layer, positions, old, new = entry = self.redo_list.pop()
+        self._apply(layer, positions, new)
+        self.undo_list.append(entry)
+
+    def _apply(self, layer: Layer, positions: array, packed: bytes) -> None:
+        """
+        Write a journal side to its layer, repainting only those cells
+        """
+        layer.unpack(positions, packed)
+        if layer is self.layer:
+            self._committed.unpack(positions, packed)
+        self.dirty.update(positions)
+        self.update()
 
     def colour_parse(self, c: str) -> Tuple[int, int, int]:
         """
         c = colour in form "#123456" (3 2 byte base 16 numbers)
         returns (12, 23, 45) (3 numbers from 0-255)
         """
-        c = c.lstrip("#")
-        r = int(c[0:2], 16)
-        g = int(c[2:4], 16)
-        b = int(c[4:6], 16)
-        return (r, g, b)
+        return parse_hex(c)
 
 
     def colour_mixer(self, c1, strength, *colours):
@@ -285,15 +476,111 @@ class NanoList:
         val_pts is the valid coords
         returns number of valid neighbours, abs coords of them
         """
-        index = self._get_index(init_coord)
-        for neigh_row, neigh_col in self.knn(index=index, radius=1):
-            if self.colour_similar(c1, self.data[neigh_row][neigh_col], tol):
-                neigh_coord = tuple((neigh_row, neigh_col))
-                if neigh_coord not in val_pts:
-                    val_pts.append(neigh_coord)
-                    self.similar_neighbour(neigh_coord, tol, c1, val_pts)
+        known = set(val_pts)
+        for pos in self.flood_fill(init_coord, tol, colour=c1):
+            if self.coords[pos] not in known:
+                val_pts.append(self.coords[pos])
         return val_pts
 
+    def flood_fill(self, index, tol: float, fill_all: bool = False, colour: Optional[str] = None, store=None) -> List[int]:
+        """
+        Flat positions of the cells connected to index whose colour is within tol of colour
+        (defaults to the colour at index). Breadth first, so layout size is not limited by recursion.
+        fill_all selects every matching panel instead of only the connected ones.
+        The starting cell is always included.
+        store is the colour store to search, the active layer by default (e.g. a snapshot from a worker thread)
+        """
+        flat = self.flat if store is None else store
+        start = self._pos(index)
+        target = self.colour_parse(colour or flat[start])
+
+        if fill_all:
+            return [start] + [pos for pos in flat.matching(target, tol) if pos >= self.offsets[1] and pos != start]
+        similar = flat.similar(target, tol)
+
+        seen = bytearray(len(self.flat))
+        seen[start] = 1
+        filled = [start]
+        queue = deque(filled)
+        while queue:
+            for adj in self.neighbours(queue.popleft(), 1):
+                if not seen[adj]:
+                    seen[adj] = 1
+                    if similar[adj]:
+                        filled.append(adj)
+                        queue.append(adj)
+        return filled
+
+    def fill(self, positions: Iterable[int], colour: str, layer: Optional[Layer] = None) -> None:
+        """
+        Set every flat position in positions of layer (the active one by default) to colour
+        """
+        layer = layer or self.layer
+        positions = list(positions)
+        layer.flat.fill(positions, colour)
+        self._touch(positions, layer)
+
+    def mix(self, positions: Iterable[int], colour: str, strength: float) -> None:
+        """
+        Mix colour into every flat position in positions with strength (0-1)
+        """
+        positions = list(positions)
+        self.flat.mix(positions, [colour], strength)
+        self._touch(positions)
+
+    def blend(self, positions: Iterable[int], strength: float) -> None:
+        """
+        Mix every flat position in positions with the average of its adjacent panels
+        """
+        positions = list(positions)
+        self.flat.blend(positions, self.adjacency(), strength)
+        self._touch(positions)
+
+    def spray(self, positions: Iterable[int], colour: str, strength: float, seed: Optional[int] = None) -> None:
+        """
+        Set a random subset of positions to colour. Higher strength covers more panels
+        """
+        self.fill(self.spray_sample(positions, strength, seed), colour)
+
+    def spray_sample(self, positions: Iterable[int], strength: float, seed: Optional[int] = None) -> List[int]:
+        """
+        Flat positions spray would cover. Depends only on the arguments, not on the colours
+        """
+        probability = (strength + 0.001) ** (strength + 1) / 3
+        return self.flat.sample(list(positions), probability, seed)
+
+    def write(self, positions: Iterable[int], packed: bytes, layer: Optional[Layer] = None) -> None:
+        """
+        Set flat positions of layer (the active one by default) from packed RGB, 3 bytes per position
+        """
+        layer = layer or self.layer
+        positions = list(positions)
+        layer.flat.unpack(positions, packed)
+        self._touch(positions, layer)
+
+    def frame(self) -> bytes:
+        """
+        Every colour of the active layer as packed RGB, 3 bytes per flat position. See flattened for the displayed colours
+        """
+        return self.flat.dump()
+
+    def load_frame(self, packed: bytes, layer: Optional[Layer] = None) -> None:
+        """
+        Replace every colour of layer (the active one by default) from packed RGB (see frame).
+        Only cells that change are repainted
+        """
+        layer = layer or self.layer
+        self.dirty.update(layer.flat.load(packed))
+        self.dirty.update(layer.cover_all())
+
+    def adjacency(self) -> List[Tuple[int, ...]]:
+        """
+        Flat positions of the panels touching each panel (radius 1 without the panel itself)
+        """
+        if self._adjacency is None:
+            self._adjacency = [tuple(adj for adj in self.neighbours(pos, 1) if adj != pos) for pos in range(len(self.flat))]
+        return self._adjacency
+
 
     def colour_similar(self, c1: str, c2: str, tol: float) -> bool:
         """
@@ -0,0 +1,192 @@
+"""
+Recording and replay of tool applications.
+
+Every call routed through Painting.tool_functions is stored as an Op: the tool, the cell clicked, the tool options,
+the colour, the spray seed and the brush footprint. Replaying a log against a NanoList of the same shape and engine
+repeats the exact same calls without a canvas.
+
+Log files are binary:
+    magic    4 bytes  b"NOPS"
+    version  uint16   little endian
+    length   uint32   size of the JSON header that follows
+    header   JSON     {"shape": [...], "engine": ..., "tools": [...]}
+    ops               _OP followed by npts uint32 flat positions, op after op
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from array import array
+import json
+import struct
+from nanogui.framebuffer import format_hex, parse_hex
+from nanogui.tools import TOOLS
+
+MAGIC = b"NOPS"
+VERSION = 1
+_PREAMBLE = struct.Struct("<4sHI")
+_OP = struct.Struct("<BHHBddB3sIH") # tool, row, col, radius, strength, tolerance, flags, colour, seed, npts
+_FILL_ALL, _SEEDED = 1, 2
+
+
+class Op:
+    """
+    One tool application. pts is the brush footprint as flat positions, None for non brush tools
+    """
+    __slots__ = ("tool", "item", "radius", "strength", "tolerance", "fill_all", "colour", "seed", "pts")
+
+    def __init__(self, tool: str, item: Tuple[int, int], radius: int = 0, strength: float = 0.0, tolerance: float = 0.0,
+                 fill_all: bool = False, colour: str = "#000000", seed: Optional[int] = None, pts: Optional[array] = None) -> None:
+        self.tool = tool
+        self.item = item
+        self.radius = radius
+        self.strength = strength
+        self.tolerance = tolerance
+        self.fill_all = fill_all
+        self.colour = colour
+        self.seed = seed
+        self.pts = pts
+
+    def params(self) -> dict:
+        """
+        Keyword arguments for the tool function
+        """
+        params = {"radius": self.radius, "strength": self.strength, "tolerance": self.tolerance,
+                  "fill_all": self.fill_all, "colour1": self.colour}
+        if self.seed is not None:
+            params["seed"] = self.seed
+        if self.pts is not None:
+            params["pts"] = self.pts
+        return params
+
+    def footprint(self, nanolist) -> List[int]:
+        return list(self.pts) if self.pts else list(nanolist.neighbours(nanolist._pos(self.item), self.radius))
+
+    def __repr__(self) -> str:
+        return f"Op({self.tool!r}, {self.item}, colour={self.colour!r}, pts={len(self.pts) if self.pts else None})"
+
+
+class OpLog:
+    """
+    Ops in the order they were applied, for a layout shape and storage engine
+    """
+    def __init__(self, shape: List[int], engine: Optional[str] = None) -> None:
+        self.shape = list(shape)
+        self.engine = engine
+        self.ops: List[Op] = []
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def __iter__(self) -> Iterator[Op]:
+        return iter(self.ops)
+
+    def record(self, tool: str, item: Tuple[int, int], **kwargs) -> None:
+        """
+        Store a call tool_functions[tool](item, **kwargs). Tools which only read the canvas (dropper) are skipped
+        """
+        if tool not in TOOLS:
+            return
+        pts = kwargs.get("pts")
+        self.ops.append(Op(tool, tuple(item), int(kwargs.get("radius", 0)), float(kwargs.get("strength", 0)),
+                           float(kwargs.get("tolerance", 0)), bool(kwargs.get("fill_all", False)),
+                           kwargs["colour1"], kwargs.get("seed"), array("I", pts) if pts else None))
+
+    def to_bytes(self) -> bytes:
+        tools = list(TOOLS)
+        header = json.dumps({"shape": self.shape, "engine": self.engine, "tools": tools}).encode()
+        out = bytearray(_PREAMBLE.pack(MAGIC, VERSION, len(header)) + header)
+        for op in self.ops:
+            flags = (_FILL_ALL if op.fill_all else 0) | (_SEEDED if op.seed is not None else 0)
+            pts = op.pts or array("I")
+            out += _OP.pack(tools.index(op.tool), op.item[0], op.item[1], op.radius, op.strength, op.tolerance,
+                            flags, bytes(parse_hex(op.colour)), op.seed or 0, len(pts))
+            out += pts.tobytes()
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "OpLog":
+        magic, version, length = _PREAMBLE.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not an op log")
+        if version > VERSION:
+            raise ValueError(f"Op log needs a newer version of the format ({version})")
+        header = json.loads(data[_PREAMBLE.size:_PREAMBLE.size + length])
+        log = cls(header["shape"], header.get("engine"))
+        tools = header["tools"]
+        offset = _PREAMBLE.size + length
+        while offset < len(data):
+            tool, row, col, radius, strength, tolerance, flags, colour, seed, npts = _OP.unpack_from(data, offset)
+            offset += _OP.size
+            pts = None
+            if npts:
+                pts = array("I")
+                pts.frombytes(data[offset:offset + 4 * npts])
+                offset += 4 * npts
+            log.ops.append(Op(tools[tool], (row, col), radius, strength, tolerance, bool(flags & _FILL_ALL),
+                              format_hex(*colour), seed if flags & _SEEDED else None, pts))
+        return log
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "OpLog":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def replay(nanolist, log: OpLog, fast: bool = False) -> int:
+    """
+    Apply every op of log to nanolist as fast as possible, returns the number of NanoList operations made.
+    fast folds runs of consecutive ops first, see _fold, with the same result. Nothing is drawn, call nanolist.update() afterwards.
+    The log must come from the same layout and storage engine: the engines draw spray's random cells differently
+    """
+    if list(log.shape) != list(nanolist.shape):
+        raise ValueError(f"Log layout {log.shape} does not match {nanolist.shape}")
+    if log.engine is not None and log.engine != nanolist.flat.engine:
+        raise ValueError(f"Log recorded with the {log.engine} engine, not {nanolist.flat.engine}")
+    if not fast:
+        for op in log:
+            TOOLS[op.tool](nanolist, op.item, **op.params())
+        return len(log)
+    return _fold(nanolist, log.ops)
+
+
+def _fold(nanolist, ops: List[Op]) -> int:
+    """
+    Apply ops, merging runs of consecutive pencil and spray ops: they only overwrite cells, so a run becomes one fill
+    per colour of the cells' final colours. Other tools depend on the colours they paint over (marker rounds every mix)
+    and are applied as they are
+    """
+    calls = 0
+    fills: Dict[int, str] = {} # pos: final colour of the current pencil/spray run
+
+    def flush() -> int:
+        count = 0
+        for colour, positions in _group(fills).items():
+            nanolist.fill(positions, colour)
+            count += 1
+        fills.clear()
+        return count
+
+    for op in ops:
+        if op.tool in ("pencil", "spray"):
+            pts = op.footprint(nanolist)
+            if op.tool == "spray":
+                pts = nanolist.spray_sample(pts, op.strength, op.seed)
+            for pos in pts:
+                fills[pos] = op.colour
+        else:
+            calls += flush()
+            TOOLS[op.tool](nanolist, op.item, **op.params())
+            calls += 1
+    return calls + flush()
+
+
+def _group(values: dict) -> dict:
+    """
+    {key: value} as {value: [keys]}
+    """
+    groups = {}
+    for key, value in values.items():
+        groups.setdefault(value, []).append(key)
+    return groups
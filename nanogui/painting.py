@@ -1,7 +1,21 @@
 import tkinter as tk
+import os
+import random
+import tempfile
+import time
+from functools import partial
+from typing import Tuple, List, Optional
 from tkinter import ttk
-from random import random
 import nanogui.nanolist as nl
+from nanogui.geometry import TriangleGeometry, BACKGROUND
+from nanogui.stroke import Stroke
+from nanogui.effects import EffectRunner
+from nanogui.animation import Player
+from nanogui.project import Project, save_project
+from nanogui.tools import TOOLS, BRUSH_TOOLS
+from nanogui.oplog import OpLog
+from nanogui.profiling import profiler, Overlay
+from nanogui.workers import WorkerPool, blend_job, bucket_job
 
 
 
@@ -9,7 +23,15 @@ class Painting(ttk.Frame):
     """
     Canvas for drawing
     """
-    def __init__(self, parent: tk.Tk) -> None:
+    def __init__(self, parent: tk.Tk, fps: int = 50, stamp_once: bool = True, background_threshold: int = 2000, backend: str = "polygon",
+                 shape: Optional[List[int]] = None) -> None:
+        """
+        Layouts with at least background_threshold cells run blend, bucket and effects on worker threads.
+        backend is "polygon" (a canvas item per panel) or "raster" (the grid drawn as one image, see raster.RasterGrid).
+        shape is the panel layout, the NanoList default when not given
+        """
+        if backend not in ("polygon", "raster"):
+            raise ValueError(f"Unknown canvas backend: {backend}")
         super().__init__(parent)
         
         self.canvas_width = 600
@@ -18,7 +40,7 @@ class Painting(ttk.Frame):
         self.canvas = tk.Canvas(self, bg="red", width=self.canvas_width, height=self.canvas_height)
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
-        self.nanolist = nl.NanoList(self.canvas)
+        self.nanolist = nl.NanoList(self.canvas, shape) if shape else nl.NanoList(self.canvas)
         self.after(0, self.nanolist.update)
         
         self.bind("<Configure>", self.on_resize)
@@ -28,138 +50,349 @@ class Painting(ttk.Frame):
         self.canvas.bind("<MouseWheel>", self.scroll_radius)
 
         self.triangles = []  # Store references to the triangle items
+        self.backend = backend
+        self.raster = None # RasterGrid drawing the panels with the raster backend
         
-        self.columns_per_row = [13, 15, 17, 19, 21, 23, 23, 21, 19, 17]  # Grid layout
+        self.geometry = TriangleGeometry(self.nanolist.shape[1:]) # Grid layout, without the background row
         self.draw_grid()
-
-        self.tool_functions = {
-            "blend": self.blend,
-            "bucket": self.bucket,
-            "dropper": self.dropper,
-            "marker": self.marker,
-            "pencil": self.pencil,
-            "spray": self.spray
-        }
+        self.workers = WorkerPool(self, on_batch=self.flush_background)
+        self.use_workers = len(self.nanolist.flat) >= background_threshold
+        self.background_tools = {"blend", "bucket"} # Run on self.workers when self.use_workers is set
+        self.blend_pending = set() # Footprint of blend jobs not yet applied, redone by the job superseding them
+        self.stroke_jobs = [] # Jobs submitted by the current stroke, its undo step closes once they are applied
+        self.effects = EffectRunner(self, self.nanolist, self.geometry, workers=self.workers if self.use_workers else None)
+        self.player = None # Plays imported clips
+        self.player_path = None # Temporary project file the player reads, removed when it closes
+        self.imports = WorkerPool(self, workers=1) # Decodes imported media, apart from self.workers so strokes never cancel an import
+        self.import_path = None # Project file the latest import is decoded into
+
+        self.tool_functions = {name: partial(tool, self.nanolist) for name, tool in TOOLS.items()}
+        self.tool_functions["dropper"] = self.dropper
+        self.brush_tools = BRUSH_TOOLS
+        self.recorder: Optional[OpLog] = None # Records every tool application while set
+        self.overlay = Overlay(self.canvas) # Frame time overlay, see profiling
+        self.drag_since = None # When the oldest pending drag arrived, while profiling
 
         self.current_tool_function = None
+        self.current_tool = None
+        self.stroke = None
+        self.stamp_once = stamp_once # Paint each panel at most once per stroke
+        self.op_params = {} # Tool options, snapshotted when the mouse button is pressed
+        self.pending_drags = [] # (x, y) of motion events not yet applied
+        self.frame_interval = 1000 // fps # ms between render ticks while dragging
+        self.tick_id = None
+        self.resize_id = None
 
     def on_resize(self, event: tk.Event) -> None:
         """
-        Resize the canvas to fit drawing in new window size and update the grid to fit the window
-        """
-        toolbar_width = self.master.toolbar.winfo_width()
-        self.canvas_width = self.master.winfo_width() - toolbar_width
-        self.canvas_height = self.master.winfo_height()
-        self.canvas.config(width=self.canvas_width, height=self.canvas_height)
-        self.canvas.coords(self.background, 0, 0, self.canvas_width, self.canvas_height)
-        
-        # Recalculate the triangle size and update the grid
-        self.update_grid()
-
-    def calculate_max_triangle_size(self) -> int:
-        """
-        Calculate the maximum triangle size that allows the grid to fit within the canvas.
+        Resize the canvas to fit drawing in new window size. The grid is updated once the resize events stop
         """
-        max_width = self.canvas_width / (max(self.columns_per_row)+4) * 2
-        max_height = self.canvas_height / (len(self.columns_per_row)+2) * (2 / (3**0.5))
-        return min(max_width, max_height)
+        if self.resize_id is not None:
+            self.after_cancel(self.resize_id)
+        self.resize_id = self.after(self.frame_interval, self.update_grid)
 
     def draw_grid(self) -> None:
         """
         Draw triangles row by row in the pattern used in UofC, ensuring they fit within the canvas.
         """
-        self.background = self.canvas.create_rectangle(0, 0, self.canvas_width, self.canvas_height, outline="", fill="blue")
-
-        prev_num_cols = 0
-        self.triangle_length = self.calculate_max_triangle_size()
-        self.triangle_height = self.triangle_length * (3**0.5) / 2
+        self.geometry.fit(self.canvas_width, self.canvas_height)
+        self.triangle_length = self.geometry.triangle_length
+        self.triangle_height = self.geometry.triangle_height
 
-        for row, num_cols in enumerate(self.columns_per_row):
-            growing = num_cols > prev_num_cols
-            x_margin = (self.canvas_width - num_cols * self.triangle_length / 2) / 2
-            y_margin = (self.canvas_height - len(self.columns_per_row) * self.triangle_height) / 2
-            
-            y_lower = y_margin + self.triangle_height * (row + 1)
-            y_upper = y_margin + self.triangle_height * row
-
-            X = [x_margin, x_margin + self.triangle_length / 2, x_margin + self.triangle_length]
+        if self.backend == "raster":
+            from nanogui.raster import RasterGrid # Pillow and numpy drawing, only loaded for this backend
+            self.raster = RasterGrid(self.canvas, self.nanolist.shape, self.geometry)
+            self.raster.fit(self.canvas_width, self.canvas_height)
+            self.nanolist.view = self.raster
+            return
 
+        self.background = self.canvas.create_rectangle(0, 0, self.canvas_width, self.canvas_height, outline="", fill="blue")
+        for row, num_cols in enumerate(self.geometry.columns_per_row):
             for col in range(num_cols):
-                Y = [y_lower, y_upper, y_lower] if (col + growing) % 2 == 1 else [y_upper, y_lower, y_upper]
-                triangle = self.canvas.create_polygon(list(zip(X, Y)), outline="white", fill="")
+                triangle = self.canvas.create_polygon(self.geometry.vertices(row, col), outline="white", fill="", tags="panel")
                 self.triangles.append(triangle)
-                X = [i + self.triangle_length / 2 for i in X]
 
-            prev_num_cols = num_cols
+        self.nanolist.items = [self.background] + self.triangles
 
     def update_grid(self) -> None:
         """
-        Update the positions and sizes of the existing triangles to fit within the resized canvas.
+        Scale and move the existing triangles to fit within the resized canvas.
         """
-        prev_num_cols = 0
-        self.triangle_length = self.calculate_max_triangle_size()
-        self.triangle_height = self.triangle_length * (3**0.5) / 2
-        triangle_index = 0
-
-        for row, num_cols in enumerate(self.columns_per_row):
-            growing = num_cols > prev_num_cols
-            x_margin = (self.canvas_width - num_cols * self.triangle_length / 2) / 2
-            y_margin = (self.canvas_height - len(self.columns_per_row) * self.triangle_height) / 2
-            
-            y_lower = y_margin + self.triangle_height * (row + 1)
-            y_upper = y_margin + self.triangle_height * row
-
-            X = [x_margin, x_margin + self.triangle_length / 2, x_margin + self.triangle_length]
-
-            for col in range(num_cols):
-                Y = [y_lower, y_upper, y_lower] if (col + growing) % 2 == 1 else [y_upper, y_lower, y_upper]
-                coords = list(zip(X, Y))
-                self.canvas.coords(self.triangles[triangle_index], *sum(coords, ()))
-                triangle_index += 1
-                X = [i + self.triangle_length / 2 for i in X]
+        self.resize_id = None
+        toolbar_width = self.master.toolbar.winfo_width()
+        self.canvas_width = self.master.winfo_width() - toolbar_width
+        self.canvas_height = self.master.winfo_height()
+        self.canvas.config(width=self.canvas_width, height=self.canvas_height)
 
-            prev_num_cols = num_cols
+        if self.raster is not None:
+            self.geometry.fit(self.canvas_width, self.canvas_height)
+            self.triangle_length = self.geometry.triangle_length
+            self.triangle_height = self.geometry.triangle_height
+            self.raster.fit(self.canvas_width, self.canvas_height)
+            return
 
+        self.canvas.coords(self.background, 0, 0, self.canvas_width, self.canvas_height)
+        old_length, (old_x, old_y) = self.geometry.triangle_length, self.geometry.centre
+        self.geometry.fit(self.canvas_width, self.canvas_height)
+        self.triangle_length = self.geometry.triangle_length
+        self.triangle_height = self.geometry.triangle_height
+        new_x, new_y = self.geometry.centre
+
+        if old_length > 0 and self.triangle_length > 0:
+            scale = self.triangle_length / old_length
+            self.canvas.scale("panel", old_x, old_y, scale, scale)
+            self.canvas.move("panel", new_x - old_x, new_y - old_y)
+        else: # Grid was collapsed to a point, place every triangle again
+            for triangle, (row, col) in zip(self.triangles, self.nanolist.coords[1:]):
+                self.canvas.coords(triangle, *sum(self.geometry.vertices(row - 1, col), ()))
+
+    @profiler.timed("click")
     def on_canvas_click(self, event: tk.Event) -> None:
         """
         Handles canvas click event
         """
-        item = self.canvas.find_closest(event.x, event.y)
+        since = time.perf_counter() if profiler.enabled else None
+        item = self.geometry.pick(event.x, event.y)
+        if self.effects.name and item != BACKGROUND:
+            self.effects.set_origin(item)
         
         # op_params of the form {"radius":2, ...}
-        op_params = {x:self.master.toolbar.options[x].get() for x in self.master.toolbar.options}
-        op_params["colour1"] = self.master.toolbar.colour1
+        self.op_params = {x:self.master.toolbar.options[x].get() for x in self.master.toolbar.options}
+        self.op_params["colour1"] = self.master.toolbar.colour1
+        self.op_params["fill_all"] = bool(event.state & 0x0001) # Shift held
         
-        if item[0] != self.background or self.master.toolbar.selected_tool=="dropper":
-            self.current_tool_function = self.tool_functions.get(self.master.toolbar.selected_tool)
+        if item != BACKGROUND or self.master.toolbar.selected_tool=="dropper":
+            self.current_tool = self.master.toolbar.selected_tool
+            self.current_tool_function = self.tool_functions.get(self.current_tool)
             if self.current_tool_function:
-                self.current_tool_function(item, **op_params)
+                self.stroke = Stroke(self.nanolist, self.geometry, self.op_params["radius"], once=self.stamp_once)
+                self.apply_stamps(self.stroke.line_to(event.x, event.y))
+                self.nanolist.update()
+                self.mark_paint(since)
+                self.tick_id = self.after(self.frame_interval, self.render_tick)
             else:
                 print(f"No function defined for tool: {self.master.toolbar.selected_tool}")
-        elif item[0] == self.background:
+        elif item == BACKGROUND:
             if self.master.toolbar.selected_tool != "blend":
                 self.nanolist[item] = self.master.toolbar.colour1
                 self.nanolist.update()
                 self.nanolist.update_undo()
 
+    @profiler.timed("drag")
     def on_canvas_drag(self, event: tk.Event) -> None:
         """
-        Handles dragging motion over the canvas
+        Handles dragging motion over the canvas. Only queues the position, see render_tick
         """
-        self.after(20) # still 50fps
         if self.current_tool_function:
-            item = self.canvas.find_closest(event.x, event.y)
-            op_params = {x:self.master.toolbar.options[x].get() for x in self.master.toolbar.options}
-            op_params["colour1"] = self.master.toolbar.colour1
-            if item[0] != self.background or self.master.toolbar.selected_tool=="dropper":
-                self.current_tool_function(item, **op_params)
+            if profiler.enabled and not self.pending_drags:
+                self.drag_since = time.perf_counter()
+            self.pending_drags.append((event.x, event.y))
+
+    def render_tick(self) -> None:
+        """
+        Apply queued drag positions and flush the canvas once. Reschedules itself until the button is released
+        """
+        self.apply_pending_drags()
+        self.tick_id = self.after(self.frame_interval, self.render_tick)
+
+    @profiler.timed("drag_apply")
+    def apply_pending_drags(self) -> None:
+        pending, self.pending_drags = self.pending_drags, []
+        since, self.drag_since = self.drag_since, None
+        if not pending or not self.current_tool_function:
+            return
+        centres = []
+        for x, y in pending:
+            centres += self.stroke.line_to(x, y)
+        self.apply_stamps(centres)
+        self.nanolist.update()
+        self.mark_paint(since)
+
+    def mark_paint(self, since: Optional[float] = None) -> None:
+        """
+        While profiling, note when Tk has drawn the canvas changes (idle callbacks run after the redraw)
+        """
+        if profiler.enabled:
+            self.after_idle(profiler.painted, since)
+
+    def apply_stamps(self, centres: List[Tuple[int, int]]) -> None:
+        """
+        Apply the current tool at every centre. Brush tools get the union of their footprints in one call
+        """
+        if self.current_tool != "dropper":
+            centres = [item for item in centres if item != BACKGROUND]
+        if not centres:
+            return
+        if self.current_tool in self.brush_tools:
+            pts = self.stroke.footprint(centres)
+            if pts:
+                self.apply_tool(centres[-1], pts=pts, **self.op_params)
+        else:
+            for item in centres:
+                self.apply_tool(item, **self.op_params)
+
+    def apply_tool(self, item: Tuple[int, int], **kwargs) -> None:
+        """
+        Call the current tool, see run_tool
+        """
+        self.run_tool(self.current_tool, item, **kwargs)
+
+    def run_tool(self, tool: str, item: Tuple[int, int], background: bool = True, **kwargs) -> None:
+        """
+        Call tool, recording the call when a recorder is set. Spray gets a fresh seed so it can be replayed.
+        background=False keeps blend and bucket on the Tk thread even when self.use_workers is set
+        """
+        if tool == "spray":
+            kwargs["seed"] = random.getrandbits(32)
+        if self.recorder is not None:
+            self.recorder.record(tool, item, **kwargs)
+        if background and self.use_workers and tool in self.background_tools:
+            self.run_in_background(tool, item, **kwargs)
+            return
+        if not profiler.enabled:
+            self.tool_functions[tool](item, **kwargs)
+            return
+        start = time.perf_counter()
+        self.tool_functions[tool](item, **kwargs)
+        profiler.record(f"tool.{tool}", start, time.perf_counter())
+
+    def run_in_background(self, tool: str, item: Tuple[int, int], **kwargs) -> None:
+        """
+        Submit tool to the worker pool, computed on a snapshot of the active layer.
+        A newer blend stamp supersedes the one in flight and blends its footprint as well
+        """
+        layer = self.nanolist.layer
+        if tool == "blend":
+            pts = kwargs.get("pts") or self.nanolist.neighbours(self.nanolist._pos(item), kwargs["radius"])
+            self.blend_pending.update(pts)
+
+            def done(result) -> None:
+                positions, packed = result
+                self.blend_pending.difference_update(positions)
+                self.nanolist.write(positions, packed, layer=layer)
+
+            self.stroke_jobs.append(self.workers.submit(blend_job, layer.flat.copy(), sorted(self.blend_pending), self.nanolist.adjacency(),
+                                                        kwargs["strength"], key="blend", on_done=done))
+        elif tool == "bucket":
+            colour = kwargs["colour1"]
+            self.stroke_jobs.append(self.workers.submit(bucket_job, self.nanolist, layer.flat.copy(), item, kwargs["tolerance"],
+                                                        kwargs.get("fill_all", False), on_done=lambda pts: self.nanolist.fill(pts, colour, layer=layer)))
+
+    def flush_background(self) -> None:
+        """
+        Show every result collected by one poll of the worker pool in a single canvas update
+        """
+        self.nanolist.update()
+        self.mark_paint()
 
     def on_canvas_release(self, event: tk.Event) -> None:
         """
         Handles mouse button release after dragging
         """
+        if self.tick_id is not None:
+            self.after_cancel(self.tick_id)
+            self.tick_id = None
+        self.apply_pending_drags()
         self.current_tool_function = None
-        self.nanolist.update_undo()
+        self.stroke = None
+        jobs, self.stroke_jobs = self.stroke_jobs, []
+        self.workers.when_idle(self.nanolist.update_undo, jobs) # Its own jobs only, effect frames never stop coming
+
+    def import_media(self, path: str, fps: float = 20) -> None:
+        """
+        Put an image on the panels, or play a GIF/animated image/directory of frames at fps.
+        Frames are decoded on a worker into a temporary project file, played straight from disk like open_project
+        """
+        from nanogui.imaging import save_clip # Pillow is only loaded once something is imported
+        handle, temp = tempfile.mkstemp(suffix=".nano")
+        os.close(handle)
+        self.import_path = temp
+        background = self.nanolist.frame()[:3 * self.nanolist.offsets[1]]
+        self.imports.submit(save_clip, path, self.nanolist.shape, temp, background, fps,
+                            on_done=partial(self.show_import, path, temp), on_error=partial(self.import_failed, path, temp))
+
+    def show_import(self, path: str, temp: str, frames: int) -> None:
+        """
+        Called once every frame of path has been written to temp
+        """
+        if temp != self.import_path: # A later import replaces this one
+            if frames:
+                os.remove(temp)
+            return
+        self.import_path = None
+        if not frames:
+            print(f"No image found at {path}")
+            return
+        self.close_player()
+        project = Project(temp)
+        if len(project) == 1:
+            view = project.frame_bytes(0)
+            try:
+                panels = view[3 * self.nanolist.offsets[1]:].tobytes()
+            finally:
+                view.release() # The map cannot be closed while a view is exported
+            project.close()
+            os.remove(temp)
+            self.nanolist.write(range(self.nanolist.offsets[1], len(self.nanolist.flat)), panels)
+            self.nanolist.update()
+            self.nanolist.update_undo()
+            return
+        self.player = Player(self, self.nanolist, project)
+        self.player_path = temp
+        self.player.play()
+
+    def import_failed(self, path: str, temp: str, error: Exception) -> None:
+        if temp == self.import_path:
+            self.import_path = None
+            print(f"Could not import {path}: {error}")
+
+    def save_project(self, path: str) -> None:
+        """
+        Save the playing animation, or the current design if nothing is playing
+        """
+        if self.player is not None:
+            timeline = self.player.timeline
+            frames = (timeline.frame(i) for i in range(timeline.length))
+            save_project(path, self.nanolist.shape, frames, fps=timeline.fps)
+        else:
+            save_project(path, self.nanolist.shape, [self.nanolist.flattened()])
+
+    def open_project(self, path: str) -> None:
+        """
+        Show a saved design, or play a saved animation straight from the file
+        """
+        project = Project(path)
+        if list(project.shape) != list(self.nanolist.shape):
+            project.close()
+            print(f"Project layout {project.shape} does not match {self.nanolist.shape}")
+            return
+        self.close_player()
+        if len(project) == 1:
+            self.nanolist.load_frame(project.frame(0).tobytes())
+            project.close()
+            self.nanolist.update()
+            self.nanolist.update_undo()
+            return
+        self.player = Player(self, self.nanolist, project)
+        self.player.play()
+
+    def close_player(self) -> None:
+        if self.player is not None:
+            self.player.close()
+            if isinstance(self.player.timeline, Project):
+                self.player.timeline.close()
+            if self.player_path is not None:
+                os.remove(self.player_path)
+                self.player_path = None
+            self.player = None
+
+    def start_recording(self) -> OpLog:
+        self.recorder = OpLog(self.nanolist.shape, self.nanolist.flat.engine)
+        return self.recorder
+
+    def stop_recording(self) -> Optional[OpLog]:
+        recorder, self.recorder = self.recorder, None
+        return recorder
 
     def scroll_radius(self, event: tk.Event):
         current_r = self.master.toolbar.options['radius'].get()
@@ -172,69 +405,10 @@ class Painting(ttk.Frame):
         path = f"@img/cursors/{tool}.cur"
         self['cursor'] = path
 
-    def blend(self, item: int, **kwargs) -> None:
-        radius = kwargs["radius"]
-        strength = kwargs["strength"]
-        pts = self.nanolist.knn(item, radius=radius)
-        for x in pts:
-            i = self.nanolist._get_index(x)
-            adj_col = []
-            adj_pts = self.nanolist.knn(i, radius=1)
-            adj_pts = [pt for pt in adj_pts if pt != x]
-            for y in adj_pts:
-                adj_col.append(self.nanolist[y])
-            new_col = self.nanolist.colour_mixer(self.nanolist[x], strength, adj_col)
-            self.nanolist[x] = new_col
-            self.nanolist.update()
-            
-
-    def bucket(self, item: int, **kwargs) -> None:
-        tolerance = kwargs["tolerance"]
-        pts_abs = [self.nanolist._get_rowcol(item[0])]
-        c1 = self.nanolist[pts_abs[0]]
-        pts_abs = self.nanolist.similar_neighbour(pts_abs[0], tolerance, c1, pts_abs)
-        for x in pts_abs:
-            self.nanolist[x] = self.master.toolbar.colour1
-            self.nanolist.update()
-
-
-    def dropper(self, item: int, **kwargs) -> None:
+    def dropper(self, item: Tuple[int, int], **kwargs) -> None:
         """
         changes colour to the colour of the one clicked
         """
-        self.master.toolbar.colour1 = self.nanolist[item]
-        self.master.toolbar.colour1_button.config(bg=self.nanolist[item])
-
-    def marker(self, item: int, **kwargs) -> None:
-        """
-        Marker adds colour mixing with what is already on the canvas
-        """
-        radius = kwargs["radius"]
-        strength = kwargs["strength"]
-        pts = self.nanolist.knn(item, radius=radius)
-        for x in pts:
-            new_colour = self.nanolist.colour_mixer(self.nanolist[x], strength, [self.master.toolbar.colour1])
-            self.nanolist[x] = new_colour
-            self.nanolist.update()
-
-    def pencil(self, item: int, **kwargs) -> None:
-        """
-        Pencil directly changes colour
-        """
-        radius = kwargs["radius"]
-        pts = self.nanolist.knn(item, radius=radius)
-        for x in pts:
-            self.nanolist[x] = self.master.toolbar.colour1
-            self.nanolist.update()
-
-    def spray(self, item: int, **kwargs) -> None:
-        """
-        Adds colour with randomness
-        """
-        radius = kwargs["radius"]
-        strength = kwargs["strength"]
-        pts = self.nanolist.knn(item, radius=radius)
-        for x in pts:
-            if 3*random() < ((strength+0.001)**((strength+1))):
-                self.nanolist[x] = self.master.toolbar.colour1
-                self.nanolist.update()
\ No newline at end of file
+        colour = self.nanolist.displayed(item)
+        self.master.toolbar.colour1 = colour
+        self.master.toolbar.colour1_button.config(bg=colour)
@@ -0,0 +1,167 @@
+"""
+Lightweight timing of the editor's stages (hit testing, tools, canvas refresh, undo capture, ...).
+Disabled by default; a disabled timed() wrapper costs one attribute check per call.
+"""
+from typing import Callable, Dict, Optional
+from collections import deque
+import functools
+import json
+import os
+import threading
+import time
+
+
+class Profiler:
+    """
+    Keeps the last window durations of every stage for percentiles, and the last trace_size spans for a Chrome trace
+    """
+    def __init__(self, window: int = 1000, trace_size: int = 200_000) -> None:
+        self.enabled = False
+        self.window = window
+        self.stages: Dict[str, deque] = {}
+        self.trace: deque = deque(maxlen=trace_size) # (name, start, end, thread id)
+        self.paints: deque = deque(maxlen=window) # perf_counter of every paint, for fps
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    def clear(self) -> None:
+        with self._lock:
+            self.stages.clear()
+            self.trace.clear()
+            self.paints.clear()
+
+    def record(self, name: str, start: float, end: float) -> None:
+        """
+        Add one span of stage name, start and end from time.perf_counter
+        """
+        with self._lock:
+            samples = self.stages.get(name)
+            if samples is None:
+                samples = self.stages[name] = deque(maxlen=self.window)
+            samples.append(end - start)
+            self.trace.append((name, start, end, threading.get_ident()))
+
+    def timed(self, name: str) -> Callable:
+        """
+        Decorator recording every call of the function as stage name while enabled
+        """
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, start, time.perf_counter())
+            return wrapper
+        return decorator
+
+    def painted(self, since: Optional[float] = None) -> None:
+        """
+        Mark a finished paint. since is when the event that caused it arrived, recorded as event_to_paint
+        """
+        now = time.perf_counter()
+        with self._lock:
+            self.paints.append(now)
+        if since is not None:
+            self.record("event_to_paint", since, now)
+
+    def fps(self, period: float = 1.0) -> float:
+        """
+        Paints per second over the last period seconds
+        """
+        now = time.perf_counter()
+        with self._lock:
+            return sum(1 for t in self.paints if now - t <= period) / period
+
+    def percentiles(self, name: str, qs=(50, 95, 99)) -> Dict[int, float]:
+        """
+        {q: seconds} of the recent durations of stage name, empty if there are none
+        """
+        with self._lock:
+            samples = sorted(self.stages.get(name, ()))
+        if not samples:
+            return {}
+        return {q: samples[min(len(samples) - 1, int(q / 100 * len(samples)))] for q in qs}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        {stage: {"count", "p50", "p95", "p99"}} with times in milliseconds
+        """
+        with self._lock:
+            names = list(self.stages)
+        out = {}
+        for name in names:
+            pct = self.percentiles(name)
+            out[name] = {"count": len(self.stages[name]), **{f"p{q}": 1000 * v for q, v in pct.items()}}
+        return out
+
+    def export_chrome_trace(self, path: str) -> int:
+        """
+        Write the recorded spans as Chrome trace JSON (chrome://tracing, Perfetto). Returns the number of spans
+        """
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.trace)
+        events = [{"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                   "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6}
+                  for name, start, end, tid in spans]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+profiler = Profiler() # Shared by every instrumented module
+
+
+class Overlay:
+    """
+    Text in the corner of a tk.Canvas showing event to paint latency, fps and the slowest stages,
+    refreshed every interval ms while shown
+    """
+    def __init__(self, canvas, profiler: Profiler = profiler, interval: int = 250, stages: int = 5) -> None:
+        self.canvas = canvas
+        self.profiler = profiler
+        self.interval = interval
+        self.stages = stages
+        self.item = None
+        self._after_id = None
+
+    @property
+    def visible(self) -> bool:
+        return self.item is not None
+
+    def toggle(self) -> None:
+        """
+        Show the overlay and start profiling, or hide it and stop
+        """
+        if self.visible:
+            self.canvas.after_cancel(self._after_id)
+            self.canvas.delete(self.item)
+            self.item = None
+            self.profiler.enable(False)
+        else:
+            self.profiler.enable(True)
+            self.item = self.canvas.create_text(8, 8, anchor="nw", fill="white", font=("Courier", 9), text="", tags="overlay")
+            self.refresh()
+
+    def text(self) -> str:
+        latency = self.profiler.percentiles("event_to_paint")
+        lines = [f"fps {self.profiler.fps():5.1f}"]
+        if latency:
+            lines.append("paint p50 {:.1f} p95 {:.1f} p99 {:.1f} ms".format(*(1000 * latency[q] for q in (50, 95, 99))))
+        summary = self.profiler.summary()
+        summary.pop("event_to_paint", None)
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1].get("p95", 0))[:self.stages]:
+            lines.append(f"{name:14s} p95 {stats['p95']:.2f} ms")
+        return "\n".join(lines)
+
+    def refresh(self) -> None:
+        self.canvas.itemconfig(self.item, text=self.text())
+        self.canvas.tag_raise(self.item)
+        self._after_id = self.canvas.after(self.interval, self.refresh)
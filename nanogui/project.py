@@ -0,0 +1,178 @@
+"""
+Binary project files.
+
+    magic    4 bytes  b"NANO"
+    version  uint16   little endian
+    length   uint32   size of the JSON header that follows
+    header   JSON     {"shape": [...], "fps": ..., "metadata": {...}}, padded with spaces to a multiple of 16 bytes
+    frames            packed RGB, 3 bytes per NanoList flat position (background first), frame after frame
+
+The number of frames follows from the file size, so frames can be appended without touching the header.
+"""
+from typing import Iterable, List, Optional, Union
+import json
+import mmap
+import os
+import struct
+import numpy as np
+
+MAGIC = b"NANO"
+VERSION = 1
+_PREAMBLE = struct.Struct("<4sHI")
+_ALIGN = 16
+
+
+def _header(shape: List[int], fps: float, metadata: dict) -> bytes:
+    header = json.dumps({"shape": list(shape), "fps": fps, "metadata": metadata}).encode()
+    start = _PREAMBLE.size + len(header)
+    header += b" " * (-start % _ALIGN)
+    return _PREAMBLE.pack(MAGIC, VERSION, len(header)) + header
+
+
+class ProjectWriter:
+    """
+    Writes a project frame by frame, e.g. while recording, without keeping the frames in memory
+    """
+    def __init__(self, path: str, shape: List[int], fps: float = 30, **metadata) -> None:
+        self.shape = list(shape)
+        self.frame_size = 3 * sum(self.shape)
+        self.frames = 0
+        self._file = open(path, "wb")
+        self._file.write(_header(self.shape, fps, metadata))
+
+    def append(self, frame: Union[bytes, np.ndarray]) -> None:
+        """
+        frame is packed RGB (NanoList.frame()) or an (N, 3) uint8 array
+        """
+        data = memoryview(frame).cast("B")
+        if len(data) != self.frame_size:
+            raise ValueError(f"Frame is {len(data)} bytes, expected {self.frame_size}")
+        self._file.write(data)
+        self.frames += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ProjectWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Project:
+    """
+    Read only view of a project file through mmap. Opening is constant time whatever the number of frames,
+    and only the pages of frames that are read are loaded from disk.
+
+    Has the frame interface of animation.Timeline (length, fps, frame(index)), so a Player can play it directly
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            magic, version, length = _PREAMBLE.unpack(self._file.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a project file")
+            if version > VERSION:
+                raise ValueError(f"{path} needs a newer version of the project format ({version})")
+            header = json.loads(self._file.read(length))
+            self.shape: List[int] = header["shape"]
+            self.fps: float = header["fps"]
+            self.metadata: dict = header.get("metadata", {})
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self.version = version
+        self.size = sum(self.shape) # Flat positions per frame
+        self.frame_size = 3 * self.size
+        self.data_offset = _PREAMBLE.size + length
+        self.length = (len(self._map) - self.data_offset) // self.frame_size
+        self.cache_frames = self.length # Every frame is always available, see is_cached
+
+    def __len__(self) -> int:
+        return self.length
+
+    def frame_bytes(self, index: int) -> memoryview:
+        """
+        Packed RGB of one frame, without copying
+        """
+        if not 0 <= index < self.length:
+            raise IndexError(f"Frame {index} out of range for {self.length} frames")
+        start = self.data_offset + index * self.frame_size
+        return memoryview(self._map)[start:start + self.frame_size]
+
+    def frame(self, index: int) -> np.ndarray:
+        """
+        (N, 3) uint8 colours of one frame, a read only view into the file
+        """
+        return np.frombuffer(self.frame_bytes(index), dtype=np.uint8).reshape(self.size, 3)
+
+    def frames(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        (stop - start, N, 3) read only view of a run of frames
+        """
+        stop = self.length if stop is None else min(stop, self.length)
+        count = max(0, stop - start)
+        return np.frombuffer(self._map, dtype=np.uint8, count=count * self.frame_size,
+                             offset=self.data_offset + start * self.frame_size).reshape(count, self.size, 3)
+
+    def is_cached(self, index: int) -> bool:
+        return True
+
+    def render(self, start: int, stop: int) -> np.ndarray:
+        return self.frames(start, stop)
+
+    def close(self) -> None:
+        """
+        Views returned by frame/frames must be released before closing
+        """
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "Project":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def save_project(path: str, shape: List[int], frames: Iterable[Union[bytes, np.ndarray]], fps: float = 30, **metadata) -> int:
+    """
+    Write every frame to path, returns the number of frames.
+    The file is replaced in one step once every frame is written. On POSIX an open Project of path keeps reading
+    the old frames, on Windows a file that is mapped cannot be replaced and this raises PermissionError:
+    close any Project of path first
+    """
+    temp = path + ".tmp"
+    try:
+        with ProjectWriter(temp, shape, fps, **metadata) as writer:
+            for frame in frames:
+                writer.append(frame)
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return writer.frames
+
+
+def save_nanolist(nanolist, path: str, **metadata) -> None:
+    """
+    Single frame project of the displayed colours, every visible layer flattened into one frame
+    """
+    save_project(path, nanolist.shape, [nanolist.flattened()], **metadata)
+
+
+def load_nanolist(nanolist, path: str, index: int = 0) -> None:
+    """
+    Copy frame index of a project into the nanolist. Only changed cells are repainted on the next update
+    """
+    with Project(path) as project:
+        if list(project.shape) != list(nanolist.shape):
+            raise ValueError(f"Project layout {project.shape} does not match {nanolist.shape}")
+        view = project.frame_bytes(index)
+        try:
+            nanolist.load_frame(view)
+        finally:
+            view.release() # The map cannot be closed while a view is exported
@@ -0,0 +1,84 @@
+"""
+Raster backend for the Painting canvas: the whole grid is one image shown through a single PhotoImage,
+instead of one canvas polygon per panel. Suits layouts with thousands of panels, where Tk slows down with the item count.
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageTk
+from nanogui.geometry import TriangleGeometry
+from nanogui.masks import triangle_labels, triangle_pixels
+
+
+class RasterGrid:
+    """
+    Draws NanoList colours into an image on canvas, laid out by geometry like the polygon grid.
+    Set as NanoList.view, update() then only redraws the pixels of the triangles that changed
+    and copies their bounding box to the PhotoImage.
+    The pixel masks are built once per canvas size (see masks.triangle_pixels)
+    """
+    def __init__(self, canvas, shape: List[int], geometry: TriangleGeometry, outline: Optional[Tuple[int, int, int]] = (255, 255, 255)) -> None:
+        self.canvas = canvas
+        self.shape = tuple(shape)
+        self.geometry = geometry
+        self.outline = outline
+        self.palette = np.zeros((sum(self.shape), 3), dtype=np.uint8) # Colour drawn for every flat position
+        self.photo = None
+        self.item = None
+
+    def fit(self, width: int, height: int) -> None:
+        """
+        Size the image to the canvas, using the triangle length geometry was fitted with. Redraws everything
+        """
+        self.width, self.height = max(1, int(width)), max(1, int(height))
+        length = self.geometry.triangle_length or None
+        self.labels = triangle_labels(self.shape, self.width, self.height, length)
+        self.pixels, self.starts, self.edges = triangle_pixels(self.shape, self.width, self.height, length)
+        self.image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.redraw()
+        self.photo = ImageTk.PhotoImage(Image.fromarray(self.image))
+        if self.item is None:
+            self.item = self.canvas.create_image(0, 0, image=self.photo, anchor="nw")
+        else:
+            self.canvas.itemconfig(self.item, image=self.photo)
+
+    def redraw(self) -> None:
+        """
+        Draw every triangle from the palette in one lookup
+        """
+        self.image[...] = self.palette[self.labels]
+        if self.outline is not None:
+            self.image[self.edges] = self.outline
+
+    def paint(self, positions: List[int], store) -> None:
+        """
+        Show the colours of store (a framebuffer) at flat positions
+        """
+        if not positions:
+            return
+        colours = np.frombuffer(store.pack(positions), dtype=np.uint8).reshape(-1, 3)
+        self.palette[positions] = colours
+        if len(positions) > len(self.palette) // 4: # Cheaper to redraw the whole image
+            self.redraw()
+            box = None
+        else:
+            pos = np.asarray(positions)
+            counts = self.starts[pos + 1] - self.starts[pos]
+            pixels = np.concatenate([self.pixels[self.starts[p]:self.starts[p + 1]] for p in positions])
+            if not len(pixels): # Triangles too small to have inner pixels
+                return
+            self.image.reshape(-1, 3)[pixels] = np.repeat(colours, counts, axis=0)
+            rows, cols = np.divmod(pixels, self.width)
+            box = (int(cols.min()), int(rows.min()), int(cols.max()) + 1, int(rows.max()) + 1)
+        if self.photo is not None:
+            self.show(box)
+
+    def show(self, box: Optional[Tuple[int, int, int, int]] = None) -> None:
+        """
+        Copy the image to the PhotoImage, only the pixels inside box (x0, y0, x1, y1) when given
+        """
+        if box is None:
+            self.photo.paste(Image.fromarray(self.image))
+            return
+        x0, y0, x1, y1 = box
+        patch = ImageTk.PhotoImage(Image.fromarray(self.image[y0:y1, x0:x1]))
+        self.canvas.tk.call(str(self.photo), "copy", str(patch), "-to", x0, y0)
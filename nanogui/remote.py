@@ -0,0 +1,365 @@
+"""
+Remote control of the editor over line delimited JSON on a local TCP socket.
+
+Every line sent is one request, either a single op or {"id": ..., "ops": [op, ...]}, answered with
+{"type": "reply", "id": ..., "ok": true} (or "ok": false and an "error") once it has been applied.
+A request is applied whole or not at all, the error of a failed one names the op that failed.
+Cells are flat positions (row offset + col, 0 is the background) or [row, col]. Ops:
+    {"op": "set", "cells": [[cell, "#RRGGBB"], ...]}
+    {"op": "frame", "rgb": "<hex of packed RGB, 3 bytes per flat position>"}
+    {"op": "tool", "tool": "pencil", "item": [row, col], "radius": 1, "colour1": "#FF0000", ...}
+    {"op": "effect", "name": "ripple", "origin": cell, ...params}, "name": null stops the effect
+    {"op": "subscribe"} / {"op": "unsubscribe"}
+On connecting the client gets {"type": "hello", "shape": [...], "cells": n}. Subscribers get
+{"type": "diff", "frame": n, "cells": [[pos, "#RRGGBB"], ...]} with the displayed cells that changed
+since the last diff they were sent, the first one holding every cell.
+
+The asyncio loop runs on a background thread. Requests are applied on the Tk thread once per tick:
+all set and frame ops of a tick become one NanoList write and one canvas update.
+A subscriber that reads slower than frames are made only ever has the newest frame pending, so it falls
+behind by skipping frames and never holds up the UI or other clients.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import queue
+import threading
+from nanogui.framebuffer import parse_hex, format_hex
+from nanogui.stream import changed_panels
+from nanogui.tools import TOOLS
+from nanogui.effects import check_params
+
+DEFAULT_PORT = 7070
+TOOL_DEFAULTS = {"radius": 1, "strength": 0.5, "tolerance": 10, "colour1": "#FFFFFF"}
+MAX_RADIUS = 5 # Largest brush NanoList has neighbourhood patterns for
+TOOL_OPTIONS = {"radius", "strength", "tolerance", "colour1", "fill_all", "pts"}
+
+
+def _number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _colour(value) -> tuple:
+    """
+    (r, g, b) of a "#RRGGBB" string, ValueError for anything else
+    """
+    if not isinstance(value, str) or len(value) != 7 or not value.startswith("#"):
+        raise ValueError(f"Colours are \"#RRGGBB\", got {value!r}")
+    return parse_hex(value)
+
+
+class Client:
+    """
+    One connection. pending is the newest frame not yet diffed for it, sent the last frame it was sent
+    """
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.pending: Optional[Tuple[int, bytes]] = None
+        self.sent: Optional[bytes] = None
+        self.wake = asyncio.Event()
+        self.frames_sent = 0
+        self.frames_skipped = 0 # Frames replaced by a newer one before they were sent
+
+    def send(self, message: dict) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+class RemoteServer:
+    """
+    Serves the remote control protocol for a Painting on host:port (port 0 picks a free one, see self.port).
+    Added to NanoList.outputs to see every canvas update, like stream.PanelStream
+    """
+    def __init__(self, painting, host: str = "127.0.0.1", port: int = DEFAULT_PORT, tick: int = 20) -> None:
+        self.painting = painting
+        self.nanolist = painting.nanolist
+        self.host = host
+        self.port = port
+        self.tick = tick # ms between applying the requests received
+
+        self.subscribers: Set[Client] = set()
+        self.frames = 0 # Frames published to subscribers
+        self._requests = queue.SimpleQueue() # (client, id, ops) for the Tk thread
+        self._resync = False # A new subscriber wants the whole frame
+
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="RemoteServer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+        self.nanolist.outputs.append(self)
+        self._after_id = painting.after(self.tick, self.poll)
+
+    def close(self) -> None:
+        if self in self.nanolist.outputs:
+            self.nanolist.outputs.remove(self)
+        if self._after_id is not None:
+            self.painting.after_cancel(self._after_id)
+            self._after_id = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    # Tk thread
+
+    def submit(self, flat) -> None:
+        """
+        NanoList output: publish the displayed colours to subscribers
+        """
+        if self.subscribers:
+            self._loop.call_soon_threadsafe(self._publish, flat.dump())
+
+    def poll(self) -> None:
+        """
+        Apply every request received since the last tick, then update the canvas once
+        """
+        self._after_id = self.painting.after(self.tick, self.poll)
+        if self._resync:
+            self._resync = False
+            self._loop.call_soon_threadsafe(self._publish, self.nanolist.flattened())
+
+        cells: Dict[int, bytes] = {} # Packed RGB of set cells not yet written
+        base: List[Optional[bytes]] = [None] # Frame loaded this tick, cells go on top of it
+        changed = False
+
+        def flush() -> None:
+            if base[0] is not None:
+                frame = bytearray(base[0])
+                for pos, rgb in cells.items():
+                    frame[3 * pos:3 * pos + 3] = rgb
+                self.nanolist.load_frame(bytes(frame))
+            elif cells:
+                positions = sorted(cells)
+                self.nanolist.write(positions, b"".join(cells[pos] for pos in positions))
+            base[0] = None
+            cells.clear()
+
+        while True:
+            try:
+                client, request_id, ops = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            staged, staged_base = dict(cells), base[0]
+            snapshot = None # Active layer before a request that writes the NanoList itself, to undo it on failure
+            if any(op[0] in ("tool", "effect") for op in ops):
+                flush()
+                snapshot = self.nanolist.layer.copy()
+            started = False # An effect was started by the request
+            for i, op in enumerate(ops):
+                try:
+                    if op[0] == "set":
+                        cells.update(op[1])
+                    elif op[0] == "frame":
+                        base[0] = op[1]
+                        cells.clear()
+                    elif op[0] == "tool":
+                        flush()
+                        self.painting.run_tool(op[1], op[2], background=False, **op[3]) # On this thread, so a failed request can be undone
+                    elif op[0] == "effect":
+                        flush()
+                        if op[1] is None:
+                            self.painting.effects.stop()
+                        else:
+                            started = True
+                            self.painting.effects.start(op[1], **op[2])
+                            if op[3] is not None:
+                                self.painting.effects.set_origin(op[3])
+                except Exception as e: # Nothing of a failed request is applied
+                    if snapshot is None:
+                        cells.clear()
+                        cells.update(staged)
+                        base[0] = staged_base
+                    else:
+                        if started:
+                            self.painting.effects.stop()
+                        self._restore(snapshot)
+                    self._reply(client, request_id, f"op {i} ({op[0]}): {type(e).__name__}: {e}")
+                    break
+            else:
+                self._reply(client, request_id)
+
+        flush()
+        if changed:
+            self.nanolist.update()
+            if self.painting.stroke is None: # Mid stroke, the release commits the undo step
+                self.nanolist.update_undo()
+            self.painting.mark_paint()
+
+    def _restore(self, snapshot) -> None:
+        """
+        Put the active layer back to snapshot (a copy of it), repainting the cells that differ
+        """
+        layer = self.nanolist.layer
+        cells = layer.changed(snapshot)
+        layer.unpack(cells, snapshot.pack(cells))
+        self.nanolist.dirty.update(cells)
+
+    def _reply(self, client: Client, request_id, error: Optional[str] = None) -> None:
+        self._loop.call_soon_threadsafe(self._answer, client, request_id, error)
+
+    # Asyncio thread
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        try:
+            server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port, limit=1 << 24))
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+            return
+        self.port = server.sockets[0].getsockname()[1]
+        self._loop.call_soon(self._ready.set)
+        self._loop.run_forever()
+        server.close()
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = Client(writer)
+        client.send({"type": "hello", "shape": list(self.nanolist.shape), "cells": len(self.nanolist.flat)})
+        streamer = self._loop.create_task(self._stream(client))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    self._receive(client, line)
+        except (ConnectionError, ValueError): # ValueError: line over the reader limit
+            pass
+        except asyncio.CancelledError: # Server closing, end the connection quietly
+            pass
+        finally:
+            self.subscribers.discard(client)
+            streamer.cancel()
+            writer.close()
+
+    def _receive(self, client: Client, line: bytes) -> None:
+        """
+        Parse one request. Subscriptions are handled here, everything else is queued for the Tk thread
+        """
+        request_id = None
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError("A request is a JSON object")
+            request_id = message.get("id")
+            ops = []
+            for i, op in enumerate(message["ops"] if "ops" in message else [message]):
+                if op.get("op") == "subscribe":
+                    self.subscribers.add(client)
+                    client.sent = None
+                    self._resync = True
+                elif op.get("op") == "unsubscribe":
+                    self.subscribers.discard(client)
+                else:
+                    try:
+                        ops.append(self._parse(op))
+                    except (ValueError, KeyError, TypeError, IndexError) as e:
+                        raise ValueError(f"op {i} ({op.get('op')}): {type(e).__name__}: {e}") from e
+        except (ValueError, KeyError, TypeError, IndexError, AttributeError) as e:
+            self._answer(client, request_id, str(e) if e.__cause__ is not None else f"{type(e).__name__}: {e}")
+            return
+        if ops:
+            self._requests.put((client, request_id, ops))
+        else:
+            self._answer(client, request_id)
+
+    def _parse(self, op: dict) -> tuple:
+        """
+        Checked op in the form applied by poll
+        """
+        kind = op.get("op")
+        if kind == "set":
+            return ("set", [(self._cell(cell), bytes(_colour(colour))) for cell, colour in op["cells"]])
+        if kind == "frame":
+            packed = bytes.fromhex(op["rgb"])
+            if len(packed) != 3 * len(self.nanolist.flat):
+                raise ValueError(f"A frame has {3 * len(self.nanolist.flat)} bytes, got {len(packed)}")
+            return ("frame", packed)
+        if kind == "tool":
+            if op["tool"] not in TOOLS:
+                raise ValueError(f"Unknown tool: {op['tool']}")
+            options = {**TOOL_DEFAULTS, **{k: v for k, v in op.items() if k not in ("op", "tool", "item", "id")}}
+            unknown = set(options) - TOOL_OPTIONS
+            if unknown:
+                raise ValueError(f"Unknown tool options: {', '.join(sorted(unknown))}")
+            radius = options["radius"]
+            if isinstance(radius, bool) or not isinstance(radius, int) or not 0 <= radius <= MAX_RADIUS:
+                raise ValueError(f"radius is a whole number from 0 to {MAX_RADIUS}, got {radius!r}")
+            if not _number(options["strength"]) or not 0 <= options["strength"] <= 1:
+                raise ValueError(f"strength is a number from 0 to 1, got {options['strength']!r}")
+            if not _number(options["tolerance"]) or options["tolerance"] < 0:
+                raise ValueError(f"tolerance is a number from 0, got {options['tolerance']!r}")
+            options["strength"] = float(options["strength"]) # An int strength overflows the rgb engine's mix
+            _colour(options["colour1"])
+            if not isinstance(options.get("fill_all", False), bool):
+                raise ValueError(f"fill_all is true or false, got {options['fill_all']!r}")
+            if "pts" in options:
+                options["pts"] = [self._cell(cell) for cell in options["pts"]]
+            item = self._cell(op["item"])
+            if item < self.nanolist.offsets[1]:
+                raise IndexError("Tools are used on panels, not the background")
+            return ("tool", op["tool"], self.nanolist.coords[item], options)
+        if kind == "effect":
+            name = op.get("name")
+            params = {k: v for k, v in op.items() if k not in ("op", "name", "origin", "id")}
+            if name is not None:
+                check_params(name, params)
+            origin = self.nanolist.coords[self._cell(op["origin"])] if "origin" in op else None
+            return ("effect", name, params, origin)
+        raise ValueError(f"Unknown op: {kind}")
+
+    def _cell(self, cell) -> int:
+        """
+        Flat position of a flat position or [row, col]
+        """
+        if isinstance(cell, list):
+            if len(cell) != 2 or any(isinstance(i, bool) or not isinstance(i, int) for i in cell):
+                raise IndexError(f"No cell {cell}")
+            return self.nanolist._pos(tuple(cell))
+        if isinstance(cell, bool) or not isinstance(cell, int) or not 0 <= cell < len(self.nanolist.flat):
+            raise IndexError(f"No cell {cell}")
+        return cell
+
+    def _answer(self, client: Client, request_id, error: Optional[str] = None) -> None:
+        if error is None:
+            client.send({"type": "reply", "id": request_id, "ok": True})
+        else:
+            client.send({"type": "reply", "id": request_id, "ok": False, "error": error})
+
+    def _publish(self, frame: bytes) -> None:
+        self.frames += 1
+        for client in self.subscribers:
+            if client.pending is not None:
+                client.frames_skipped += 1
+            client.pending = (self.frames, frame)
+            client.wake.set()
+
+    async def _stream(self, client: Client) -> None:
+        """
+        Send the subscriber diffs, waiting for its socket to drain between them
+        """
+        cells = range(len(self.nanolist.flat))
+        while True:
+            await client.wake.wait()
+            client.wake.clear()
+            if client.pending is None or client not in self.subscribers:
+                continue
+            (number, frame), client.pending = client.pending, None
+            changed = changed_panels(cells, frame, client.sent)
+            client.sent = frame
+            if changed:
+                client.send({"type": "diff", "frame": number, "cells": [[pos, format_hex(r, g, b)] for pos, r, g, b in changed]})
+                client.frames_sent += 1
+                try:
+                    await client.writer.drain()
+                except ConnectionError:
+                    return
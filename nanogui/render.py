@@ -0,0 +1,80 @@
+from typing import Iterable, List, Optional, Tuple, Union
+import os
+import shutil
+import subprocess
+import numpy as np
+from PIL import Image
+from nanogui.geometry import TriangleGeometry
+from nanogui.masks import triangle_edges, triangle_labels
+
+
+class Renderer:
+    """
+    Draws NanoList frames into images without a display, laid out like the Painting canvas.
+    The triangle masks are built once per output size, each frame is then a single palette lookup.
+    """
+    def __init__(self, shape: List[int], width: int = 600, height: int = 600, outline: Optional[Tuple[int, int, int]] = (255, 255, 255)) -> None:
+        self.shape = tuple(shape)
+        self.width = width
+        self.height = height
+        geometry = TriangleGeometry(self.shape[1:])
+        geometry.fit(width, height)
+        self.labels = triangle_labels(self.shape, width, height, geometry.triangle_length)
+        self.outline = outline
+        self.edges = triangle_edges(self.labels)
+
+    def render(self, frame) -> np.ndarray:
+        """
+        (height, width, 3) uint8 image of a NanoList, a frame in packed RGB (NanoList.frame()) or an (N, 3) array
+        """
+        if hasattr(frame, "flattened"):
+            frame = frame.flattened()
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            frame = np.frombuffer(frame, dtype=np.uint8)
+        palette = np.asarray(frame, dtype=np.uint8).reshape(-1, 3)
+        image = palette[self.labels]
+        if self.outline is not None:
+            image[self.edges] = self.outline
+        return image
+
+    def image(self, frame) -> Image.Image:
+        return Image.fromarray(self.render(frame))
+
+
+def export_png(renderer: Renderer, frame: Union[bytes, np.ndarray], path: str) -> None:
+    renderer.image(frame).save(path)
+
+
+def export_gif(renderer: Renderer, frames: Iterable[Union[bytes, np.ndarray]], path: str, fps: float = 30) -> None:
+    images = (renderer.image(frame) for frame in frames)
+    first = next(images)
+    first.save(path, save_all=True, append_images=images, duration=int(1000 / fps), loop=0)
+
+
+def export_frames(renderer: Renderer, frames: Iterable[Union[bytes, np.ndarray]], directory: str, pattern: str = "frame_{:05d}.png") -> int:
+    """
+    One PNG per frame, e.g. to feed to a video encoder. Returns the number of frames written
+    """
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for count, frame in enumerate(frames, start=1):
+        renderer.image(frame).save(os.path.join(directory, pattern.format(count - 1)))
+    return count
+
+
+def export_mp4(renderer: Renderer, frames: Iterable[Union[bytes, np.ndarray]], path: str, fps: float = 30) -> None:
+    """
+    Pipe raw frames to ffmpeg, which must be on the PATH
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is needed for mp4 export, use export_frames instead")
+    command = [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+               "-s", f"{renderer.width}x{renderer.height}", "-r", str(fps), "-i", "-",
+               "-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", path]
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as encoder:
+        for frame in frames:
+            encoder.stdin.write(renderer.render(frame).tobytes())
+        encoder.stdin.close()
+    if encoder.returncode:
+        raise RuntimeError(f"ffmpeg exited with {encoder.returncode}")
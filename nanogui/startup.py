@@ -0,0 +1,40 @@
+"""
+Startup timing: time from launch to each stage and to the first paint of the canvas.
+Set NANOGUI_STARTUP to print the report, NANOGUI_STARTUP_LOG to a file path to append it as a JSON line.
+"""
+from typing import Dict
+import json
+import os
+import time
+
+
+class StartupTimer:
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.marks: Dict[str, float] = {} # Stage: seconds since start
+        self.done = False
+
+    def mark(self, stage: str) -> None:
+        self.marks[stage] = time.perf_counter() - self.start
+
+    def report(self) -> dict:
+        return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **{stage: round(1000 * t, 1) for stage, t in self.marks.items()}}
+
+    def first_paint(self) -> None:
+        """
+        Called once the window has been drawn. Records first_paint and writes the report
+        """
+        if self.done:
+            return
+        self.done = True
+        self.mark("first_paint")
+        report = self.report()
+        if os.environ.get("NANOGUI_STARTUP"):
+            print("Startup (ms since launch): " + ", ".join(f"{stage} {ms}" for stage, ms in report.items() if stage != "time"))
+        log = os.environ.get("NANOGUI_STARTUP_LOG")
+        if log:
+            with open(log, "a") as f:
+                f.write(json.dumps(report) + "\n")
+
+
+startup = StartupTimer() # Started when first imported, main.py imports it before anything else
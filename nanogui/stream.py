@@ -0,0 +1,147 @@
+from typing import Tuple, List, Dict, Optional
+import json
+import socket
+import struct
+import threading
+import time
+import urllib.request
+
+EXT_CONTROL_PORT = 60222
+
+
+def enable_ext_control(host: str, token: str, port: int = 16021) -> None:
+    """
+    Ask a Nanoleaf controller to accept external control (v2) frames over UDP
+    """
+    body = json.dumps({"write": {"command": "display", "animType": "extControl", "extControlVersion": "v2"}}).encode()
+    request = urllib.request.Request(f"http://{host}:{port}/api/v1/{token}/effects", data=body, method="PUT")
+    urllib.request.urlopen(request, timeout=2).close()
+
+
+def panel_ids(nanolist, path: Optional[str] = None) -> Dict[Tuple[int, int], int]:
+    """
+    NanoList (row, col) to controller panel id, read from a JSON file of [[row, col, panel id], ...].
+    Without a file every panel is numbered by its flat position
+    """
+    if path is None:
+        return {nanolist.coords[pos]: pos for pos in range(nanolist.offsets[1], len(nanolist.flat))}
+    with open(path) as f:
+        return {(row, col): panel_id for row, col, panel_id in json.load(f)}
+
+
+def encode_frame(panels: List[Tuple[int, int, int, int]], transition: int = 0) -> bytes:
+    """
+    External control v2 packet for panels [(panel id, r, g, b), ...]
+    transition is in units of 100 ms
+    """
+    packet = bytearray(struct.pack(">H", len(panels)))
+    for panel_id, r, g, b in panels:
+        packet += struct.pack(">HBBBBH", panel_id, r, g, b, 0, transition)
+    return bytes(packet)
+
+
+def decode_frame(packet: bytes) -> Dict[int, Tuple[int, int, int]]:
+    """
+    Inverse of encode_frame, returns {panel id: (r, g, b)}
+    """
+    (count,) = struct.unpack_from(">H", packet)
+    panels = {}
+    for i in range(count):
+        panel_id, r, g, b, _, _ = struct.unpack_from(">HBBBBH", packet, 2 + 8 * i)
+        panels[panel_id] = (r, g, b)
+    return panels
+
+
+def changed_panels(ids: List[int], frame: bytes, sent: Optional[bytes]) -> List[Tuple[int, int, int, int]]:
+    """
+    [(panel id, r, g, b), ...] for every panel whose packed colour in frame differs from sent.
+    Every panel is included when sent is None
+    """
+    changed = []
+    for i, panel_id in enumerate(ids):
+        rgb = frame[3 * i:3 * i + 3]
+        if sent is None or rgb != sent[3 * i:3 * i + 3]:
+            changed.append((panel_id, *rgb))
+    return changed
+
+
+class PanelStream:
+    """
+    Streams NanoList colours to physical panels.
+    panel_ids maps NanoList (row, col) to the controller's panel id.
+    submit() only copies the mapped colours, a background thread sends the newest frame
+    at most max_fps times a second and only includes panels that changed since the last packet.
+    """
+    def __init__(self, nanolist, panel_ids: Dict[Tuple[int, int], int], host: str, port: int = EXT_CONTROL_PORT,
+                 max_fps: float = 30, transition: int = 0) -> None:
+        self.address = (host, port)
+        self.positions = [nanolist._pos(coord) for coord in panel_ids]
+        self.ids = list(panel_ids.values())
+        self.min_interval = 1 / max_fps
+        self.transition = transition
+
+        self.sent: Optional[bytes] = None # Packed RGB of the last frame sent
+        self.frames_sent = 0
+        self.frames_skipped = 0 # Frames replaced by a newer one before they were sent
+        self.frames_failed = 0 # Packets the socket refused (network down, host unreachable)
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._pending: Optional[bytes] = None
+        self._wake = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="PanelStream", daemon=True)
+        self._thread.start()
+
+    def submit(self, flat) -> None:
+        """
+        Queue the current colours of a NanoList store (NanoList.flat). Never blocks on the socket
+        """
+        frame = flat.pack(self.positions)
+        with self._wake:
+            if self._pending is not None:
+                self.frames_skipped += 1
+            self._pending = frame
+            self._wake.notify()
+
+    def close(self) -> None:
+        with self._wake:
+            self._running = False
+            self._wake.notify()
+        self._thread.join()
+        self._socket.close()
+
+    def _run(self) -> None:
+        last_send = 0.0
+        while True:
+            with self._wake:
+                while self._running and self._pending is None:
+                    self._wake.wait()
+                if not self._running:
+                    return
+            wait = last_send + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait) # Newer frames replace the pending one meanwhile
+            with self._wake:
+                frame, self._pending = self._pending, None
+            previous = self.sent
+            packet = self._diff(frame)
+            if packet is not None:
+                try:
+                    self._socket.sendto(packet, self.address)
+                except OSError as e:
+                    print(f"Panel stream to {self.address[0]}: {e}")
+                    self.frames_failed += 1
+                    self.sent = previous # The next packet carries these panels again
+                else:
+                    self.frames_sent += 1
+            last_send = time.monotonic()
+
+    def _diff(self, frame: bytes) -> Optional[bytes]:
+        """
+        Packet with the panels that differ from the last frame sent, None if nothing changed
+        """
+        changed = changed_panels(self.ids, frame, self.sent)
+        self.sent = frame
+        if not changed:
+            return None
+        return encode_frame(changed, self.transition)
@@ -0,0 +1,85 @@
+from typing import Tuple, List, Optional, Iterable
+import math
+from nanogui.geometry import TriangleGeometry, BACKGROUND
+from nanogui.profiling import profiler
+
+
+class Stroke:
+    """
+    Cells covered by one drag of the mouse.
+    Motion samples are joined with straight lines, walked edge to edge so fast strokes have no gaps,
+    and with once=True each panel is only handed to the tool the first time the brush covers it.
+    """
+    def __init__(self, nanolist, geometry: TriangleGeometry, radius: int, once: bool = True) -> None:
+        self.nanolist = nanolist
+        self.geometry = geometry
+        self.radius = radius
+        self.once = once
+        self.last: Optional[Tuple[float, float]] = None # Previous motion sample
+        self.stamped = set() # Flat positions already painted during this stroke
+
+    @profiler.timed("hit_test")
+    def line_to(self, x: float, y: float) -> List[Tuple[int, int]]:
+        """
+        (row, col) of every cell crossed going from the previous sample to x, y, in order.
+        The first sample only returns the cell under it
+        """
+        if self.last is None:
+            samples = [(x, y)]
+        else:
+            x0, y0 = self.last
+            ts = self._crossings(x0, y0, x, y)
+            # Between two crossings the line stays inside one cell, however little of it it cuts
+            samples = [(x0 + (x - x0) * t, y0 + (y - y0) * t) for t in ((a + b) / 2 for a, b in zip(ts, ts[1:]))] + [(x, y)]
+        self.last = (x, y)
+
+        cells = []
+        for sx, sy in samples:
+            cell = self.geometry.pick(sx, sy)
+            if not cells or cells[-1] != cell:
+                cells.append(cell)
+        return cells
+
+    def _crossings(self, x0: float, y0: float, x1: float, y1: float) -> List[float]:
+        """
+        Fractions of the way from x0, y0 to x1, y1 where the line crosses a row boundary or a triangle edge, in order,
+        starting with 0 and ending with 1. Uses the same row and half length coordinates as TriangleGeometry.pick
+        """
+        geometry = self.geometry
+        ts = {0.0, 1.0}
+        if geometry.triangle_height <= 0:
+            return sorted(ts)
+        r0 = (y0 - geometry.y_margin) / geometry.triangle_height
+        r1 = (y1 - geometry.y_margin) / geometry.triangle_height
+        if r0 != r1:
+            ts.update((k - r0) / (r1 - r0) for k in range(math.ceil(min(r0, r1)), math.floor(max(r0, r1)) + 1))
+
+        half = geometry.triangle_length / 2
+        rows = len(geometry.columns_per_row)
+        for row in range(max(0, math.floor(min(r0, r1))), min(rows - 1, math.floor(max(r0, r1))) + 1):
+            # Part of the line inside this row
+            ta, tb = (0.0, 1.0) if r0 == r1 else sorted(((row - r0) / (r1 - r0), (row + 1 - r0) / (r1 - r0)))
+            ta, tb = max(ta, 0.0), min(tb, 1.0)
+            if ta >= tb:
+                continue
+            u0 = (x0 - geometry.x_margins[row]) / half
+            u1 = (x1 - geometry.x_margins[row]) / half
+            for sign in (1, -1): # Edges are the lines u + depth and u - depth = whole numbers, see pick
+                fa = u0 + (u1 - u0) * ta + sign * (r0 + (r1 - r0) * ta - row)
+                fb = u0 + (u1 - u0) * tb + sign * (r0 + (r1 - r0) * tb - row)
+                if fa != fb:
+                    ts.update(ta + (m - fa) / (fb - fa) * (tb - ta) for m in range(math.ceil(min(fa, fb)), math.floor(max(fa, fb)) + 1))
+        return sorted(t for t in ts if 0 <= t <= 1)
+
+    def footprint(self, centres: Iterable[Tuple[int, int]]) -> List[int]:
+        """
+        Flat positions covered by the brush at every centre, without the ones already stamped if once is set
+        """
+        pts = set()
+        for centre in centres:
+            if centre != BACKGROUND:
+                pts.update(self.nanolist.neighbours(self.nanolist._pos(centre), self.radius))
+        if self.once:
+            pts -= self.stamped
+            self.stamped |= pts
+        return sorted(pts)
@@ -1,6 +1,9 @@
 import tkinter as tk
-from tkinter import ttk, colorchooser
-from PIL import Image, ImageTk
+from tkinter import ttk, colorchooser, filedialog
+from nanogui.assets import load_icon
+from nanogui.effects import EFFECTS, parameters
+from nanogui.profiling import profiler
+from nanogui.layerpanel import LayerPanel
 
 
 class ToolSideBar(ttk.Frame):
@@ -12,14 +15,16 @@ class ToolSideBar(ttk.Frame):
         self.icons = {}
         self.buttons = {}
         self.selected_tool = None
+        self.effect_buttons = {}
         # Options
         self.options = {}
         self.colour1 = "#FF69B4"
         self.colour_hist = {}
 
-        # Create tools and colour buttons
-        self.create_tool_options()
+        # Tool buttons first, the effect, project and layer widgets once the window is up
         self.create_tools()
+        self.create_tool_options()
+        self.after_idle(self.create_effects)
 
         # Initially select pen
         self.select_tool(None)
@@ -28,8 +33,7 @@ class ToolSideBar(ttk.Frame):
         icons = ["blend", "bucket", "dropper", "marker", "pencil", "spray"]
         for i, icon in enumerate(icons):
             try:
-                image = Image.open(f"img/icons/{icon}.png").resize((50, 50))
-                photo = ImageTk.PhotoImage(image)
+                photo = load_icon(f"img/icons/{icon}.png", (50, 50))
                 button = tk.Button(self, image=photo, command=lambda icon=icon: self.select_tool(icon), relief="groove", borderwidth=2)
                 button.grid(row=i // 2 + 2, column=i % 2, padx=5, pady=5)  # Adjust row to start below colour buttons
                 self.icons[icon] = photo  # Store reference
@@ -37,6 +41,32 @@ class ToolSideBar(ttk.Frame):
             except FileNotFoundError:
                 print(f"Icon {icon}.png not found in the 'img/icons/' directory.")
 
+    def create_effects(self) -> None:
+        """
+        Buttons which start and stop the procedural effects
+        """
+        for i, effect in enumerate(EFFECTS):
+            button = tk.Button(self, text=effect, width=8, command=lambda effect=effect: self.select_effect(effect), relief="groove", borderwidth=2)
+            button.grid(row=i // 2 + 10, column=i % 2, padx=5, pady=2)  # Below undo/redo
+            self.effect_buttons[effect] = button
+
+        import_butt = tk.Button(self, text="import", width=8, command=self.import_media, relief="groove", borderwidth=2)
+        import_butt.grid(row=len(EFFECTS) // 2 + 10, column=len(EFFECTS) % 2, padx=5, pady=2)
+
+        save_butt = tk.Button(self, text="save", width=8, command=self.save_project, relief="groove", borderwidth=2)
+        save_butt.grid(row=(len(EFFECTS) + 1) // 2 + 10, column=(len(EFFECTS) + 1) % 2, padx=5, pady=2)
+        open_butt = tk.Button(self, text="open", width=8, command=self.open_project, relief="groove", borderwidth=2)
+        open_butt.grid(row=(len(EFFECTS) + 2) // 2 + 10, column=(len(EFFECTS) + 2) % 2, padx=5, pady=2)
+        self.record_butt = tk.Button(self, text="record", width=8, command=self.toggle_recording, relief="groove", borderwidth=2)
+        self.record_butt.grid(row=(len(EFFECTS) + 3) // 2 + 10, column=(len(EFFECTS) + 3) % 2, padx=5, pady=2)
+        self.stats_butt = tk.Button(self, text="stats", width=8, command=self.toggle_stats, relief="groove", borderwidth=2)
+        self.stats_butt.grid(row=(len(EFFECTS) + 4) // 2 + 10, column=(len(EFFECTS) + 4) % 2, padx=5, pady=2)
+        trace_butt = tk.Button(self, text="trace", width=8, command=self.export_trace, relief="groove", borderwidth=2)
+        trace_butt.grid(row=(len(EFFECTS) + 5) // 2 + 10, column=(len(EFFECTS) + 5) % 2, padx=5, pady=2)
+
+        self.layer_panel = LayerPanel(self, lambda: self.master.canvas_frame)
+        self.layer_panel.grid(row=(len(EFFECTS) + 6) // 2 + 11, column=0, columnspan=2, pady=5)
+
     def create_tool_options(self) -> None:
         """
         Create button to select colours, and scale to change radius of brush
@@ -74,9 +104,8 @@ class ToolSideBar(ttk.Frame):
         make_col_hist_butts()
 
         # Undo/redo buttons
-        image = Image.open("img/icons/undo.png").resize((40, 40))
-        self.undo_img = ImageTk.PhotoImage(image)
-        self.redo_img = ImageTk.PhotoImage(image.transpose(Image.FLIP_LEFT_RIGHT))
+        self.undo_img = load_icon("img/icons/undo.png", (40, 40))
+        self.redo_img = load_icon("img/icons/undo.png", (40, 40), flip=True)
         self.undo_butt = tk.Button(self, image=self.undo_img, command=self.undo, relief="groove", borderwidth=2)
         self.redo_butt = tk.Button(self, image=self.redo_img, command=self.redo, relief="groove", borderwidth=2)
         self.undo_butt.grid(row=9, column=0, padx=5, pady=5)
@@ -119,6 +148,66 @@ class ToolSideBar(ttk.Frame):
             else:
                 button.config(bg="SystemButtonFace")
     
+    def select_effect(self, effect: str) -> None:
+        """
+        Start effect, or stop it if it is already running
+        """
+        runner = self.master.canvas_frame.effects
+        if runner.name == effect:
+            runner.stop()
+        else:
+            params = {"colour1": self.colour1} if "colour1" in parameters(effect) else {} # Not every effect has a colour
+            runner.start(effect, **params)
+
+        for e, button in self.effect_buttons.items():
+            if e == runner.name:
+                button.config(bg="green")
+            else:
+                button.config(bg="SystemButtonFace")
+
+    def import_media(self) -> None:
+        path = filedialog.askopenfilename(title="Import image or clip", filetypes=[("Images", "*.png *.jpg *.jpeg *.gif *.webp *.bmp"), ("All files", "*")])
+        if path:
+            self.master.canvas_frame.import_media(path)
+
+    def save_project(self) -> None:
+        path = filedialog.asksaveasfilename(title="Save project", defaultextension=".nano", filetypes=[("NanoGUI projects", "*.nano")])
+        if path:
+            self.master.canvas_frame.save_project(path)
+
+    def open_project(self) -> None:
+        path = filedialog.askopenfilename(title="Open project", filetypes=[("NanoGUI projects", "*.nano"), ("All files", "*")])
+        if path:
+            self.master.canvas_frame.open_project(path)
+
+    def toggle_recording(self) -> None:
+        """
+        Start recording tool applications, or stop and save them as an op log
+        """
+        canvas_frame = self.master.canvas_frame
+        if canvas_frame.recorder is None:
+            canvas_frame.start_recording()
+            self.record_butt.config(bg="green")
+            return
+        log = canvas_frame.stop_recording()
+        self.record_butt.config(bg="SystemButtonFace")
+        path = filedialog.asksaveasfilename(title="Save recording", defaultextension=".nops", filetypes=[("Op logs", "*.nops")])
+        if path:
+            log.save(path)
+
+    def toggle_stats(self) -> None:
+        """
+        Show or hide the frame time overlay, which also turns profiling on and off
+        """
+        overlay = self.master.canvas_frame.overlay
+        overlay.toggle()
+        self.stats_butt.config(bg="green" if overlay.visible else "SystemButtonFace")
+
+    def export_trace(self) -> None:
+        path = filedialog.asksaveasfilename(title="Save Chrome trace", defaultextension=".json", filetypes=[("Chrome trace", "*.json")])
+        if path:
+            profiler.export_chrome_trace(path)
+
     def choose_colour(self, index: int):
         """
         change active colour from one in history
@@ -0,0 +1,61 @@
+"""
+Painting tools acting on a NanoList only, so they run the same with or without a canvas (see oplog for replay).
+Every tool is called as tool(nanolist, item, **options) with item the (row, col) clicked.
+Brush tools take their footprint as flat positions through pts, otherwise it is the radius around item.
+"""
+from typing import Tuple
+
+
+def blend(nanolist, item: Tuple[int, int], **kwargs) -> None:
+    radius = kwargs["radius"]
+    strength = kwargs["strength"]
+    pts = kwargs.get("pts") or nanolist.neighbours(nanolist._pos(item), radius)
+    nanolist.blend(pts, strength)
+
+
+def bucket(nanolist, item: Tuple[int, int], **kwargs) -> None:
+    """
+    Fill the connected region of similar colour. fill_all fills every similar panel
+    """
+    tolerance = kwargs["tolerance"]
+    pts = nanolist.flood_fill(item, tolerance, fill_all=kwargs.get("fill_all", False))
+    nanolist.fill(pts, kwargs["colour1"])
+
+
+def marker(nanolist, item: Tuple[int, int], **kwargs) -> None:
+    """
+    Marker adds colour mixing with what is already on the canvas
+    """
+    radius = kwargs["radius"]
+    strength = kwargs["strength"]
+    pts = kwargs.get("pts") or nanolist.neighbours(nanolist._pos(item), radius)
+    nanolist.mix(pts, kwargs["colour1"], strength)
+
+
+def pencil(nanolist, item: Tuple[int, int], **kwargs) -> None:
+    """
+    Pencil directly changes colour
+    """
+    radius = kwargs["radius"]
+    pts = kwargs.get("pts") or nanolist.neighbours(nanolist._pos(item), radius)
+    nanolist.fill(pts, kwargs["colour1"])
+
+
+def spray(nanolist, item: Tuple[int, int], **kwargs) -> None:
+    """
+    Adds colour with randomness. The same seed always covers the same panels
+    """
+    radius = kwargs["radius"]
+    strength = kwargs["strength"]
+    pts = kwargs.get("pts") or nanolist.neighbours(nanolist._pos(item), radius)
+    nanolist.spray(pts, kwargs["colour1"], strength, seed=kwargs.get("seed"))
+
+
+TOOLS = {
+    "blend": blend,
+    "bucket": bucket,
+    "marker": marker,
+    "pencil": pencil,
+    "spray": spray,
+}
+BRUSH_TOOLS = {"blend", "marker", "pencil", "spray"} # Accept a precomputed footprint through pts
@@ -0,0 +1,154 @@
+"""
+Background execution of heavy operations, so Tk callbacks stay short.
+
+Jobs run on a thread pool (numpy releases the GIL for the bulk of the work) against snapshots of the colour stores,
+never the live NanoList. Finished jobs are collected by polling with widget.after and applied on the Tk thread,
+all results of one poll followed by a single on_batch call (e.g. one NanoList.update).
+"""
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import traceback
+
+
+class Job:
+    """
+    One submitted call. Once cancelled its result is never applied
+    """
+    __slots__ = ("fn", "args", "kwargs", "on_done", "on_error", "key", "future", "cancelled")
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict, on_done: Optional[Callable], key: Optional[Hashable],
+                 on_error: Optional[Callable] = None) -> None:
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.on_error = on_error
+        self.key = key
+        self.future = None
+        self.cancelled = False
+
+
+class WorkerPool:
+    """
+    Thread pool with an after-polled completion queue.
+    A job submitted with the key of an unfinished job supersedes it: the older one is cancelled.
+    At most max_pending jobs are in flight, submitting more cancels the oldest
+    """
+    def __init__(self, widget, workers: int = 2, max_pending: int = 8, poll_interval: int = 10, on_batch: Optional[Callable] = None) -> None:
+        self.widget = widget
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.on_batch = on_batch
+        self.pending: List[Job] = [] # Submitted and not yet collected, oldest first
+        self.latest: Dict[Hashable, Job] = {}
+        self.cancelled = 0 # Jobs cancelled since the pool was made
+        self._results = queue.SimpleQueue()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="nanogui-worker")
+        self._idle: List[Tuple[Optional[Sequence[Job]], Callable]] = [] # when_idle callbacks and the jobs they wait for
+        self._after_id = None
+
+    def submit(self, fn: Callable, *args, on_done: Optional[Callable] = None, key: Optional[Hashable] = None,
+               on_error: Optional[Callable] = None, **kwargs) -> Job:
+        """
+        Run fn(*args, **kwargs) on a worker, then on_done(result) on the Tk thread, or on_error(exception) when it raised
+        """
+        if key is not None and key in self.latest:
+            self.cancel(self.latest[key])
+        job = Job(fn, args, kwargs, on_done, key, on_error)
+        if key is not None:
+            self.latest[key] = job
+        self.pending.append(job)
+        live = [j for j in self.pending if not j.cancelled]
+        for old in live[:max(0, len(live) - self.max_pending)]:
+            self.cancel(old)
+        job.future = self._executor.submit(self._run, job)
+        if self._after_id is None:
+            self._after_id = self.widget.after(self.poll_interval, self.poll)
+        return job
+
+    def cancel(self, job: Job) -> None:
+        if job.cancelled:
+            return
+        job.cancelled = True
+        self.cancelled += 1
+        if self.latest.get(job.key) is job:
+            del self.latest[job.key]
+        if job.future is not None and job.future.cancel(): # Never started, nothing will come back
+            self.pending.remove(job)
+
+    def when_idle(self, callback: Callable, jobs: Optional[Sequence[Job]] = None) -> None:
+        """
+        Call callback on the Tk thread once jobs (by default every pending job) have been applied or cancelled,
+        straight away if they have. Jobs submitted later are not waited for
+        """
+        if any(job in self.pending for job in (self.pending if jobs is None else jobs)):
+            self._idle.append((jobs, callback))
+        else:
+            callback()
+
+    def _run(self, job: Job) -> None:
+        if job.cancelled:
+            self._results.put((job, None, None))
+            return
+        try:
+            self._results.put((job, job.fn(*job.args, **job.kwargs), None))
+        except Exception as e:
+            self._results.put((job, None, e))
+
+    def poll(self) -> None:
+        """
+        Apply every finished job on the Tk thread, then call on_batch once
+        """
+        self._after_id = None
+        applied = False
+        while True:
+            try:
+                job, result, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if job in self.pending:
+                self.pending.remove(job)
+            if self.latest.get(job.key) is job:
+                del self.latest[job.key]
+            if job.cancelled:
+                continue
+            if error is not None and job.on_error is not None:
+                job.on_error(error)
+                continue
+            if error is not None:
+                print("Background job failed:", "".join(traceback.format_exception(type(error), error, error.__traceback__)))
+                continue
+            if job.on_done is not None:
+                job.on_done(result)
+                applied = True
+        if applied and self.on_batch is not None:
+            self.on_batch()
+        if self.pending:
+            self._after_id = self.widget.after(self.poll_interval, self.poll)
+        waiting, self._idle = self._idle, []
+        for jobs, callback in waiting:
+            self.when_idle(callback, jobs)
+
+    def close(self) -> None:
+        for job in list(self.pending):
+            self.cancel(job)
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def blend_job(store, positions: Sequence[int], adjacency, strength: float) -> Tuple[Sequence[int], bytes]:
+    """
+    Blend positions of a store snapshot, returns (positions, packed RGB) to write back
+    """
+    store.blend(positions, adjacency, strength)
+    return positions, store.pack(positions)
+
+
+def bucket_job(nanolist, store, item, tolerance: float, fill_all: bool) -> List[int]:
+    """
+    Positions a bucket fill at item covers, found on a store snapshot
+    """
+    return nanolist.flood_fill(item, tolerance, fill_all=fill_all, store=store)
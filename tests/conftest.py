@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Repository root, for plain `pytest`
+
+from benchmarks.bench import StubCanvas
+import nanogui.nanolist as nl
+
+
+@pytest.fixture(params=["hex", "rgb"])
+def engine(request):
+    return request.param
+
+
+@pytest.fixture
+def nanolist(engine):
+    """
+    Default layout drawn on a StubCanvas, with the initial full repaint done
+    """
+    nanolist = nl.NanoList(StubCanvas(), engine=engine)
+    nanolist.update()
+    nanolist.canvas.configured = 0
+    return nanolist
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from nanogui.animation import EASINGS, Timeline
+
+SIZE = 4
+
+
+def solid(value: int) -> np.ndarray:
+    return np.full((SIZE, 3), value, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("easing", list(EASINGS))
+def test_easings(easing):
+    timeline = Timeline(SIZE, 30)
+    timeline.set_keyframe(10, solid(0), easing)
+    timeline.set_keyframe(20, solid(200))
+    frames = timeline.render(0, 30)[:, 0, 0]
+
+    assert (frames[:11] == 0).all() # Held before and at the first keyframe
+    assert (frames[20:] == 200).all() # and from the last one on
+    t = np.arange(1, 10) / 10
+    expected = np.floor(EASINGS[easing](t) * 200 + 0.5)
+    assert np.array_equal(frames[11:20], expected)
+
+
+def test_easing_shapes():
+    timeline = Timeline(SIZE, 30)
+    middle = {}
+    for easing in EASINGS:
+        timeline.set_keyframe(0, solid(0), easing)
+        timeline.set_keyframe(10, solid(100))
+        middle[easing] = timeline.frame(5)[0, 0]
+    assert middle == {"linear": 50, "ease-in": 25, "ease-out": 75, "ease-in-out": 50, "step": 0}
+
+
+def test_single_keyframe():
+    timeline = Timeline(SIZE, 10)
+    timeline.set_keyframe(5, solid(7))
+    assert (timeline.render(0, 10) == 7).all()
+
+
+def test_segments_match_pairwise_scan():
+    rng = np.random.default_rng(0)
+    timeline = Timeline(SIZE, 500)
+    keys = sorted(rng.choice(500, 60, replace=False).tolist())
+    easings = list(EASINGS)
+    for i, key in enumerate(keys):
+        timeline.set_keyframe(key, rng.integers(0, 256, (SIZE, 3), dtype=np.uint8), easings[i % len(easings)])
+    timeline.remove_keyframe(keys.pop(30))
+    frames = timeline.render(0, 500)
+
+    for index in range(500):
+        if index <= keys[0]:
+            expected = timeline.keyframes[keys[0]][0]
+        elif index >= keys[-1]:
+            expected = timeline.keyframes[keys[-1]][0]
+        else:
+            b = next(key for key in keys if key > index)
+            a = keys[keys.index(b) - 1]
+            colours_a, easing = timeline.keyframes[a]
+            t = np.float32(EASINGS[easing]((index - a) / (b - a)))
+            delta = timeline.keyframes[b][0].astype(np.float32) - colours_a
+            expected = (colours_a + t * delta + 0.5).astype(np.uint8)
+        assert np.array_equal(frames[index], expected), index
+
+
+def test_cache_evicts_least_recently_used():
+    timeline = Timeline(SIZE, 100, cache_frames=4)
+    timeline.set_keyframe(0, solid(0))
+    timeline.set_keyframe(99, solid(99))
+    timeline.render(0, 4)
+    timeline.frame(0) # Now the most recently used
+    timeline.render(10, 12)
+    assert [timeline.is_cached(i) for i in (0, 1, 2, 3, 10, 11)] == [True, False, False, True, True, True]
+
+
+def test_edits_invalidate_cache():
+    timeline = Timeline(SIZE, 20)
+    timeline.set_keyframe(0, solid(0))
+    timeline.set_keyframe(10, solid(100))
+    assert timeline.frame(5)[0, 0] == 50
+    assert timeline.is_cached(5)
+
+    timeline.set_keyframe(10, solid(200))
+    assert not timeline.is_cached(5)
+    assert timeline.frame(5)[0, 0] == 100
+
+    timeline.set_keyframe(6, solid(0), "step")
+    assert timeline.frame(5)[0, 0] == 0
+
+    timeline.remove_keyframe(6)
+    assert not timeline.is_cached(5)
+    assert timeline.frame(5)[0, 0] == 100
+    assert timeline.frame(15)[0, 0] == 200
@@ -0,0 +1,53 @@
+import itertools
+from types import SimpleNamespace
+import pytest
+from nanogui.effects import EFFECTS, EffectRunner, check_params, parameters
+from nanogui.geometry import TriangleGeometry
+from nanogui.toolbar import ToolSideBar
+
+
+class Widget:
+    """
+    after() without Tk: callbacks are kept, not run
+    """
+    def __init__(self) -> None:
+        self.scheduled = {}
+        self.after_ids = itertools.count(1)
+
+    def after(self, ms, fn):
+        after_id = next(self.after_ids)
+        self.scheduled[after_id] = fn
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.scheduled.pop(after_id, None)
+
+    def after_idle(self, fn):
+        pass
+
+
+@pytest.fixture
+def runner(nanolist):
+    return EffectRunner(Widget(), nanolist, TriangleGeometry(nanolist.shape[1:]))
+
+
+@pytest.mark.parametrize("name", list(EFFECTS))
+def test_toolbar_starts_every_effect(runner, name):
+    toolbar = SimpleNamespace(master=SimpleNamespace(canvas_frame=SimpleNamespace(effects=runner)),
+                              colour1="#FF0000", effect_buttons={})
+    ToolSideBar.select_effect(toolbar, name)
+    assert runner.name == name
+    assert runner.widget.scheduled # Next frame on its way
+    ToolSideBar.select_effect(toolbar, name) # Clicking again stops it
+    assert runner.name is None
+
+
+@pytest.mark.parametrize("name", list(EFFECTS))
+def test_defaults_pass_check(name):
+    check_params(name, parameters(name))
+
+
+def test_strict_params(runner):
+    with pytest.raises(ValueError):
+        runner.start("plasma", colour1="#FF0000")
+    assert runner.name is None
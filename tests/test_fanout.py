@@ -0,0 +1,136 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from benchmarks.bench import StubCanvas
+import nanogui.nanolist as nl
+from nanogui.fanout import Controller, FanOut, load_manifest
+from nanogui.stream import decode_frame
+
+SHAPE = [1, 3, 5]
+
+
+def udp_receiver() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2)
+    return sock
+
+
+class HTTPStandIn(ThreadingHTTPServer):
+    """
+    Local controller HTTP API, keeps the JSON bodies it was sent
+    """
+    def __init__(self) -> None:
+        self.bodies = []
+        self.received = threading.Event()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_PUT(self) -> None:
+                server.bodies.append((self.path, json.loads(self.rfile.read(int(self.headers["Content-Length"])))))
+                self.send_response(204)
+                self.end_headers()
+                server.received.set()
+
+            def log_message(self, *args) -> None:
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+def wait_for(condition, timeout: float = 2) -> bool:
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_load_manifest(tmp_path):
+    path = tmp_path / "wall.json"
+    path.write_text(json.dumps({"shape": SHAPE, "controllers": [
+        {"name": "a", "host": "127.0.0.1", "panels": [[1, 0, 10], [1, 1, 11]], "max_fps": 10},
+        {"name": "b", "host": "127.0.0.1", "protocol": "http", "token": "t", "panels": [[2, 0, 20]]}]}))
+    shape, controllers = load_manifest(str(path))
+    assert shape == SHAPE
+    assert controllers[0].panels == {(1, 0): 10, (1, 1): 11}
+    assert controllers[0].min_interval == pytest.approx(0.1)
+    assert controllers[1].port == 16021
+
+
+def test_load_manifest_rejects_shared_panels(tmp_path):
+    path = tmp_path / "wall.json"
+    path.write_text(json.dumps({"shape": SHAPE, "controllers": [
+        {"name": "a", "host": "127.0.0.1", "panels": [[1, 0, 10]]},
+        {"name": "b", "host": "127.0.0.1", "panels": [[1, 0, 20]]}]}))
+    with pytest.raises(ValueError):
+        load_manifest(str(path))
+
+
+def test_fan_out_to_udp_and_http_stand_ins():
+    left, right, http = udp_receiver(), udp_receiver(), HTTPStandIn()
+    controllers = [
+        Controller("left", "127.0.0.1", {(1, 0): 10, (1, 1): 11}, port=left.getsockname()[1], max_fps=1000),
+        Controller("right", "127.0.0.1", {(1, 2): 12, (2, 0): 20}, port=right.getsockname()[1], max_fps=1000),
+        Controller("web", "127.0.0.1", {(2, 4): 24}, port=http.server_address[1], protocol="http", token="secret", max_fps=1000),
+    ]
+    nanolist = nl.NanoList(StubCanvas(), SHAPE)
+    fanout = FanOut(nanolist, controllers)
+    nanolist.outputs.append(fanout)
+    try:
+        nanolist.fill(range(1, len(nanolist.flat)), "#000000")
+        nanolist[1, 1] = "#FF0000"
+        nanolist[2, 0] = "#00FF00"
+        nanolist[2, 4] = "#0000FF"
+        nanolist.update()
+        assert decode_frame(left.recv(1024)) == {10: (0, 0, 0), 11: (255, 0, 0)}
+        assert decode_frame(right.recv(1024)) == {12: (0, 0, 0), 20: (0, 255, 0)}
+        assert http.received.wait(2)
+        path, body = http.bodies[0]
+        assert path == "/api/v1/secret/effects"
+        assert body["write"]["animType"] == "static"
+        assert body["write"]["animData"] == "1 24 1 0 0 255 0 1"
+
+        nanolist[1, 0] = "#FFFFFF" # Only the left controller changes
+        nanolist.update()
+        assert decode_frame(left.recv(1024)) == {10: (255, 255, 255)}
+        right.settimeout(0.2)
+        with pytest.raises(socket.timeout):
+            right.recv(1024)
+        assert wait_for(lambda: fanout.stats()["left"]["sent"] == 2)
+    finally:
+        fanout.close()
+        http.shutdown()
+        left.close()
+        right.close()
+
+
+def test_stalled_controller_drops_frames_without_delaying_others():
+    fast = udp_receiver()
+    stalled = socket.socket() # Accepts the HTTP connection and never answers
+    stalled.bind(("127.0.0.1", 0))
+    stalled.listen()
+    controllers = [
+        Controller("fast", "127.0.0.1", {(1, 0): 10}, port=fast.getsockname()[1], max_fps=1000),
+        Controller("stalled", "127.0.0.1", {(1, 1): 11}, port=stalled.getsockname()[1], protocol="http", max_fps=1000),
+    ]
+    nanolist = nl.NanoList(StubCanvas(), SHAPE)
+    fanout = FanOut(nanolist, controllers)
+    nanolist.outputs.append(fanout)
+    try:
+        for i in range(10):
+            nanolist.fill([1, 2], f"#{i:02X}0000")
+            nanolist.update()
+            assert decode_frame(fast.recv(1024)) == {10: (i, 0, 0)}
+        assert wait_for(lambda: fanout.stats()["stalled"]["dropped"] > 0)
+        assert wait_for(lambda: fanout.stats()["fast"]["sent"] == 10) # Counted after sendto returns
+        assert fanout.stats()["stalled"]["sent"] == 0
+    finally:
+        fanout.close()
+        stalled.close()
+        fast.close()
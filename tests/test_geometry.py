@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from benchmarks.bench import StubCanvas
+import nanogui.nanolist as nl
+from nanogui.geometry import BACKGROUND, TriangleGeometry
+
+
+def default_shape():
+    return nl.NanoList(StubCanvas()).shape
+
+
+def brute_force(geometry, xs, ys):
+    """
+    (row, col) of the triangle strictly containing every point, BACKGROUND outside every triangle, None within eps of an edge
+    """
+    eps = 1e-6 * geometry.triangle_length
+    hits = np.full(len(xs), -1)
+    ambiguous = np.zeros(len(xs), dtype=bool)
+    cells = [(row, col) for row, num_cols in enumerate(geometry.columns_per_row) for col in range(num_cols)]
+    for i, (row, col) in enumerate(cells):
+        corners = geometry.vertices(row, col)
+        area = (corners[1][0] - corners[0][0]) * (corners[2][1] - corners[0][1]) - (corners[1][1] - corners[0][1]) * (corners[2][0] - corners[0][0])
+        inside = np.full(len(xs), np.inf)
+        for (ax, ay), (bx, by) in zip(corners, corners[1:] + corners[:1]):
+            distance = ((bx - ax) * (ys - ay) - (by - ay) * (xs - ax)) / np.hypot(bx - ax, by - ay) * np.sign(area)
+            inside = np.minimum(inside, distance)
+        hits[inside > eps] = i
+        ambiguous |= np.abs(inside) <= eps
+    return [None if ambiguous[j] else BACKGROUND if hits[j] < 0 else (cells[hits[j]][0] + 1, cells[hits[j]][1])
+            for j in range(len(xs))]
+
+
+@pytest.mark.parametrize("size", [(600, 600), (800, 450), (333, 517)])
+def test_pick_matches_brute_force(size):
+    geometry = TriangleGeometry(default_shape()[1:])
+    geometry.fit(*size)
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(-10, size[0] + 10, 20000)
+    ys = rng.uniform(-10, size[1] + 10, 20000)
+    expected = brute_force(geometry, xs, ys)
+    picked = [geometry.pick(x, y) for x, y in zip(xs, ys)]
+    checked = [(p, e) for p, e in zip(picked, expected) if e is not None]
+    assert [p for p, e in checked if p != e] == []
+
+    hits = [e for _, e in checked if e != BACKGROUND]
+    upright = {geometry.is_upright(row - 1, col) for row, col in hits}
+    assert upright == {True, False} # Both kinds of triangle were hit
+    assert len(hits) < len(checked) # and the background
+
+
+def test_pick_centroids():
+    geometry = TriangleGeometry(default_shape()[1:])
+    geometry.fit(700, 500)
+    cx, cy = geometry.centre
+    cells = [(row + 1, col) for row, num_cols in enumerate(geometry.columns_per_row) for col in range(num_cols)]
+    for cell, (x, y) in zip(cells, geometry.centroids()):
+        assert geometry.pick(cx + x * geometry.triangle_length, cy + y * geometry.triangle_length) == cell
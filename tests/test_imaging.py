@@ -0,0 +1,135 @@
+import os
+import time
+import numpy as np
+import pytest
+from PIL import Image
+from nanogui.imaging import TriangleSampler, sample_frames, save_clip
+from nanogui.painting import Painting
+from nanogui.project import Project
+from nanogui.workers import WorkerPool
+
+SHAPE = [1, 13, 15, 17, 19, 21, 23, 23, 21, 19, 17]
+
+
+@pytest.fixture
+def rgb():
+    return np.random.default_rng(1).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+
+
+def test_rgba_array_drops_alpha(rgb):
+    sampler = TriangleSampler(SHAPE)
+    rgba = np.dstack([rgb, np.full(rgb.shape[:2], 7, dtype=np.uint8)])
+    assert sampler.sample(rgba) == sampler.sample(rgb)
+
+
+def test_greyscale_array_is_spread_to_rgb(rgb):
+    sampler = TriangleSampler(SHAPE)
+    grey = rgb[:, :, 0]
+    expected = sampler.sample(np.dstack([grey] * 3))
+    assert sampler.sample(grey) == expected
+    assert sampler.sample(grey[:, :, None]) == expected
+
+
+def test_other_channel_counts_are_rejected(rgb):
+    with pytest.raises(ValueError):
+        TriangleSampler(SHAPE).sample(np.zeros((60, 80, 5), dtype=np.uint8))
+
+
+def gif(path, count: int) -> None:
+    rng = np.random.default_rng(2)
+    frames = [Image.fromarray(rng.integers(0, 256, (60, 80, 3), dtype=np.uint8)) for _ in range(count)]
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=50)
+
+
+def test_save_clip_streams_every_frame(tmp_path):
+    source, out = str(tmp_path / "clip.gif"), str(tmp_path / "clip.nano")
+    gif(source, 5)
+    background = b"\x01\x02\x03"
+    assert save_clip(source, SHAPE, out, background, fps=12) == 5
+    with Project(out) as project:
+        assert (len(project), project.fps) == (5, 12)
+        assert [bytes(project.frame(i)) for i in range(5)] == [background + frame for frame in sample_frames(source, SHAPE)]
+
+
+def test_save_clip_without_frames(tmp_path):
+    out = str(tmp_path / "clip.nano")
+    assert save_clip(str(tmp_path), SHAPE, out) == 0 # Empty directory
+    assert not os.path.exists(out)
+
+
+class Painter:
+    """
+    The import methods of Painting on a NanoList, without Tk: after() callbacks are kept, tests poll the pool themselves
+    """
+    import_media = Painting.import_media
+    show_import = Painting.show_import
+    import_failed = Painting.import_failed
+    close_player = Painting.close_player
+
+    def __init__(self, nanolist) -> None:
+        self.nanolist = nanolist
+        self.player = None
+        self.player_path = None
+        self.import_path = None
+        self.imports = WorkerPool(self, workers=1)
+
+    def after(self, ms, fn):
+        return 1
+
+    def after_cancel(self, after_id):
+        pass
+
+    def after_idle(self, fn):
+        pass
+
+    def settle(self) -> None:
+        end = time.monotonic() + 5
+        while self.imports.pending and time.monotonic() < end:
+            self.imports.poll()
+            time.sleep(0.005)
+        assert not self.imports.pending
+
+
+def test_import_plays_from_a_project_file(nanolist, tmp_path):
+    source = str(tmp_path / "clip.gif")
+    gif(source, 3)
+    painter = Painter(nanolist)
+    painter.import_media(source, fps=10)
+    painter.settle()
+
+    project = painter.player.timeline
+    assert isinstance(project, Project) and len(project) == 3
+    assert os.path.exists(painter.player_path)
+    panels = 3 * nanolist.offsets[1]
+    assert nanolist.frame()[panels:] == bytes(project.frame(0))[panels:] # First frame shown
+    path = painter.player_path
+    painter.close_player()
+    assert not os.path.exists(path)
+    painter.imports.close()
+
+
+def test_import_still_image(nanolist, tmp_path):
+    source = str(tmp_path / "logo.png")
+    Image.fromarray(np.full((60, 80, 3), 200, dtype=np.uint8)).save(source)
+    painter = Painter(nanolist)
+    painter.import_media(source)
+    temp = painter.import_path
+    painter.settle()
+    assert painter.player is None
+    assert not os.path.exists(temp)
+    assert set(nanolist.frame()[3 * nanolist.offsets[1]:]) == {200}
+    painter.imports.close()
+
+
+def test_later_import_wins(nanolist, tmp_path):
+    first, second = str(tmp_path / "first.gif"), str(tmp_path / "second.png")
+    gif(first, 3)
+    Image.fromarray(np.zeros((60, 80, 3), dtype=np.uint8)).save(second)
+    painter = Painter(nanolist)
+    painter.import_media(first)
+    stale = painter.import_path
+    painter.import_media(second)
+    painter.settle()
+    assert painter.player is None # The clip finished first but was replaced
+    assert not os.path.exists(stale)
+    painter.imports.close()
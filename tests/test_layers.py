@@ -0,0 +1,81 @@
+import pytest
+
+
+def shown(nanolist, pos: int) -> str:
+    return nanolist.displayed(nanolist.coords[pos])
+
+
+def test_single_layer_shows_its_own_store(nanolist):
+    assert nanolist._recompose([1, 2]) is nanolist.flat
+
+
+def test_clear_cells_show_the_layer_below(nanolist):
+    nanolist.fill([10, 11], "#204060")
+    top = nanolist.add_layer("top")
+    assert nanolist.layer is top
+    nanolist.fill([11], "#FF0000")
+    assert shown(nanolist, 10) == "#204060"
+    assert shown(nanolist, 11) == "#FF0000"
+    assert nanolist.layers[0].flat[11] == "#204060" # Painting went to the active layer only
+
+
+@pytest.mark.parametrize("mode, top, opacity, expected", [
+    ("normal", "#008000", 0.5, "#804000"), # Half of each
+    ("add", "#808000", 1.0, "#FF8000"),
+    ("multiply", "#808080", 1.0, "#800000"),
+    ("screen", "#008000", 1.0, "#FF8000"),
+])
+def test_blend_modes(nanolist, mode, top, opacity, expected):
+    nanolist.fill([10], "#FF0000")
+    nanolist.add_layer(opacity=opacity, mode=mode)
+    nanolist.fill([10], top)
+    assert shown(nanolist, 10) == expected
+
+
+def test_hidden_and_moved_layers(nanolist):
+    nanolist.fill([10], "#FF0000")
+    green = nanolist.add_layer("green")
+    nanolist.fill([10], "#00FF00")
+    blue = nanolist.add_layer("blue")
+    nanolist.fill([10], "#0000FF")
+    assert shown(nanolist, 10) == "#0000FF"
+    nanolist.set_layer(blue, visible=False)
+    assert shown(nanolist, 10) == "#00FF00"
+    nanolist.set_layer(blue, visible=True)
+    nanolist.move_layer(blue, 1)
+    assert [layer.name for layer in nanolist.layers] == ["background", "blue", "green"]
+    assert shown(nanolist, 10) == "#00FF00"
+    with pytest.raises(ValueError):
+        nanolist.move_layer(green, 0)
+
+
+def test_remove_layer_drops_its_history(nanolist):
+    top = nanolist.add_layer()
+    nanolist.fill([10], "#FF0000")
+    nanolist.update_undo()
+    assert nanolist.undo_list
+    nanolist.remove_layer(top)
+    assert nanolist.undo_list == []
+    assert nanolist.history_bytes == 0
+    with pytest.raises(ValueError):
+        nanolist.remove_layer(0)
+
+
+def test_undo_on_a_layer_restores_clear_cells(nanolist):
+    nanolist.fill([10], "#FF0000")
+    nanolist.add_layer()
+    nanolist.fill([10], "#00FF00")
+    nanolist.update_undo()
+    nanolist.undo()
+    assert nanolist.layer.cover[10] == 0
+    assert shown(nanolist, 10) == "#FF0000"
+    nanolist.redo()
+    assert shown(nanolist, 10) == "#00FF00"
+
+
+def test_update_draws_the_composite(nanolist):
+    nanolist.fill([10], "#FF0000")
+    nanolist.add_layer(opacity=0.5)
+    nanolist.fill([10], "#0000FF")
+    nanolist.update()
+    assert nanolist.flattened()[30:33] == bytes([128, 0, 128])
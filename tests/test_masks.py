@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+import nanogui.raster
+from nanogui.geometry import TriangleGeometry
+from nanogui.masks import triangle_edges, triangle_labels, triangle_pixels
+from nanogui.raster import RasterGrid
+from nanogui.render import Renderer
+
+SHAPE = (1, 3, 5, 5, 3)
+WIDTH, HEIGHT = 120, 100
+
+
+def test_labels_are_compact():
+    labels = triangle_labels(SHAPE, WIDTH, HEIGHT)
+    assert labels.dtype == np.int32
+    assert set(np.unique(labels)) == set(range(sum(SHAPE))) # Every panel has pixels, 0 is the background
+    assert triangle_labels.cache_info().maxsize <= 2
+    assert triangle_pixels.cache_info().maxsize <= 2
+
+
+def test_pixels_match_labels():
+    labels = triangle_labels(SHAPE, WIDTH, HEIGHT)
+    pixels, starts, edges = triangle_pixels(SHAPE, WIDTH, HEIGHT)
+    assert np.array_equal(edges, triangle_edges(labels))
+    for pos in range(sum(SHAPE)):
+        inside = pixels[starts[pos]:starts[pos + 1]]
+        assert (labels.ravel()[inside] == pos).all()
+    assert len(pixels) + edges.sum() == WIDTH * HEIGHT
+
+
+class Store:
+    """
+    Packed RGB colour store, the part of a framebuffer RasterGrid reads
+    """
+    def __init__(self, colours: np.ndarray) -> None:
+        self.colours = colours
+
+    def pack(self, positions) -> bytes:
+        return self.colours[positions].tobytes()
+
+
+class Canvas:
+    def create_image(self, *args, **kwargs):
+        return 1
+
+
+@pytest.fixture
+def grid(monkeypatch):
+    """
+    RasterGrid without Tk: PhotoImage is stubbed and show() records the boxes it is asked to copy
+    """
+    monkeypatch.setattr(nanogui.raster.ImageTk, "PhotoImage", lambda image: image)
+    geometry = TriangleGeometry(list(SHAPE[1:]))
+    geometry.fit(WIDTH, HEIGHT)
+    grid = RasterGrid(Canvas(), list(SHAPE), geometry)
+    grid.fit(WIDTH, HEIGHT)
+    grid.shown = []
+    grid.show = grid.shown.append
+    return grid
+
+
+def test_raster_matches_renderer(grid):
+    colours = np.random.default_rng(0).integers(0, 256, (sum(SHAPE), 3), dtype=np.uint8)
+    grid.paint(list(range(sum(SHAPE))), Store(colours))
+    assert grid.shown == [None] # Everything changed, the whole image is copied
+    assert np.array_equal(grid.image, Renderer(list(SHAPE), WIDTH, HEIGHT).render(colours))
+
+
+def test_raster_copies_changed_box(grid):
+    colours = np.zeros((sum(SHAPE), 3), dtype=np.uint8)
+    grid.paint(list(range(sum(SHAPE))), Store(colours))
+    before = grid.image.copy()
+    colours[5] = (255, 0, 0)
+    grid.paint([5], Store(colours))
+
+    x0, y0, x1, y1 = grid.shown[-1]
+    changed = np.argwhere((grid.image != before).any(axis=2))
+    assert len(changed)
+    assert (changed[:, 0].min(), changed[:, 1].min(), changed[:, 0].max() + 1, changed[:, 1].max() + 1) == (y0, x0, y1, x1)
+    assert (x1 - x0) * (y1 - y0) < WIDTH * HEIGHT // 4
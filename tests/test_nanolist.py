@@ -0,0 +1,104 @@
+from benchmarks.bench import StubCanvas, scaled_shape
+import nanogui.nanolist as nl
+
+
+def test_update_repaints_only_dirty_cells(nanolist):
+    nanolist[2, 3] = "#FF0000"
+    nanolist.fill([40, 41], "#00FF00")
+    assert nanolist.dirty == {nanolist._pos((2, 3)), 40, 41}
+    nanolist.update()
+    assert nanolist.canvas.configured == 3
+    assert not nanolist.dirty
+    nanolist.update()
+    assert nanolist.canvas.configured == 3
+
+
+def test_full_update_repaints_everything(nanolist):
+    nanolist.update(full=True)
+    assert nanolist.canvas.configured == len(nanolist.flat)
+
+
+def test_stencil_is_cached_and_matches_uncached_neighbours(nanolist):
+    pos = nanolist._pos((5, 7))
+    first = nanolist.neighbours(pos, 2)
+    assert nanolist.neighbours(pos, 2) is first
+    pattern = nanolist._generate_points(2, apply_flip=nanolist._is_rightsideup((5, 7)))
+    expected = [nanolist.offsets[row] + col for row, col in nanolist._get_abs_pts((5, 7), pattern)]
+    assert list(first) == expected
+
+
+def test_radius_one_neighbours_are_symmetric(nanolist):
+    for pos in range(nanolist.offsets[1], len(nanolist.flat)):
+        assert nanolist.neighbours(pos, 0) == (pos,)
+        assert pos in nanolist.neighbours(pos, 1)
+        for other in nanolist.neighbours(pos, 1):
+            assert pos in nanolist.neighbours(other, 1)
+
+
+def test_knn_returns_coordinates(nanolist):
+    assert nanolist.knn((5, 7), 1) == [nanolist.coords[pos] for pos in nanolist.neighbours(nanolist._pos((5, 7)), 1)]
+
+
+def test_flood_fill_stays_in_connected_region(nanolist):
+    region = set(nanolist.neighbours(nanolist._pos((5, 7)), 2))
+    nanolist.fill(region, "#FF0000")
+    nanolist.fill([nanolist._pos((1, 0))], "#FF0000") # Same colour, not connected
+    assert set(nanolist.flood_fill((5, 7), 0)) == region
+
+
+def test_flood_fill_all_selects_every_matching_panel(nanolist):
+    nanolist.fill([30, 60, 90], "#FF0000")
+    assert sorted(nanolist.flood_fill(nanolist.coords[60], 0, fill_all=True)) == [30, 60, 90]
+
+
+def test_flood_fill_large_layout_without_recursion(engine):
+    nanolist = nl.NanoList(StubCanvas(), scaled_shape(6), engine=engine)
+    filled = nanolist.flood_fill((1, 0), 0)
+    assert len(filled) == len(nanolist.flat) - nanolist.offsets[1] # Every panel, not the background
+
+
+def test_undo_redo_restore_each_gesture(nanolist):
+    original = nanolist.frame()
+    nanolist.fill([10, 11, 12], "#FF0000")
+    nanolist.update_undo()
+    first = nanolist.frame()
+    nanolist.fill([11, 50], "#0000FF")
+    nanolist.update_undo()
+    second = nanolist.frame()
+
+    nanolist.undo()
+    assert nanolist.frame() == first
+    nanolist.undo()
+    assert nanolist.frame() == original
+    nanolist.redo()
+    assert nanolist.frame() == first
+    nanolist.redo()
+    assert nanolist.frame() == second
+
+
+def test_undo_commits_pending_changes_first(nanolist):
+    original = nanolist.frame()
+    nanolist.fill([10], "#FF0000")
+    nanolist.undo()
+    assert nanolist.frame() == original
+    nanolist.redo()
+    assert nanolist[nanolist.coords[10]] == "#FF0000"
+
+
+def test_new_gesture_clears_redo(nanolist):
+    nanolist.fill([10], "#FF0000")
+    nanolist.update_undo()
+    nanolist.undo()
+    nanolist.fill([20], "#00FF00")
+    nanolist.update_undo()
+    assert nanolist.redo_list == []
+
+
+def test_history_is_trimmed_to_budget(engine):
+    nanolist = nl.NanoList(StubCanvas(), engine=engine, undo_budget=200)
+    for i in range(20):
+        nanolist.fill(range(1, 11), f"#{i:02X}0000")
+        nanolist.update_undo()
+    assert nanolist.history_bytes <= 200
+    assert 1 <= len(nanolist.undo_list) < 20
+    assert nanolist.history_bytes == sum(nanolist._entry_size(e) for e in nanolist.undo_list)
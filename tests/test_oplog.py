@@ -0,0 +1,94 @@
+import random
+import pytest
+from benchmarks.bench import StubCanvas, random_grid
+import nanogui.nanolist as nl
+from nanogui.oplog import OpLog, replay
+from nanogui.tools import TOOLS
+
+
+def brush_log(nanolist, tools, seed=0, ops=40, strength=0.5):
+    """
+    Strokes of tools walking between neighbouring panels, with a bucket fill after each
+    """
+    rng = random.Random(seed)
+    log = OpLog(nanolist.shape, nanolist.flat.engine)
+    pos = nanolist.offsets[1]
+    for i in range(ops):
+        pos = rng.choice(nanolist.adjacency()[pos] or (pos,))
+        tool = tools[i % len(tools)]
+        options = {"radius": rng.randrange(0, 3), "strength": strength, "tolerance": 10, "fill_all": False,
+                   "colour1": rng.choice(["#FF0000", "#00FF00", "#0000FF"])}
+        log.record(tool, nanolist.coords[pos], pts=nanolist.neighbours(pos, options["radius"]),
+                   seed=rng.getrandbits(32) if tool == "spray" else None, **options)
+        if i % 10 == 9:
+            log.record("bucket", nanolist.coords[pos], **options)
+    return log
+
+
+def fresh(nanolist):
+    other = nl.NanoList(StubCanvas(), shape=nanolist.shape, engine=nanolist.flat.engine)
+    random_grid(other, random.Random(1))
+    return other
+
+
+def test_bytes_round_trip(nanolist):
+    log = brush_log(nanolist, ["pencil", "spray", "marker"])
+    log.record("dropper", (1, 1), colour1="#000000") # Read only, not recorded
+    loaded = OpLog.from_bytes(log.to_bytes())
+    assert (loaded.shape, loaded.engine, len(loaded)) == (log.shape, log.engine, len(log))
+    for op, other in zip(log, loaded):
+        assert repr(op) == repr(other)
+        assert op.params() == other.params()
+
+
+def test_save_and_load(nanolist, tmp_path):
+    log = brush_log(nanolist, ["pencil"])
+    path = str(tmp_path / "strokes.nops")
+    log.save(path)
+    assert OpLog.load(path).to_bytes() == log.to_bytes()
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        OpLog.from_bytes(b"NOPE" + bytes(6))
+
+
+@pytest.mark.parametrize("tools", [["pencil"], ["spray"], ["pencil", "spray"], ["pencil", "blend", "spray"]])
+def test_fast_replay_matches_replay(nanolist, tools):
+    log = brush_log(nanolist, tools)
+    slow, fast = fresh(nanolist), fresh(nanolist)
+    assert replay(slow, log) == len(log)
+    assert replay(fast, log, fast=True) <= len(log)
+    assert fast.frame() == slow.frame()
+
+
+@pytest.mark.parametrize("strength", [0.05, 0.5])
+def test_fast_replay_marker_exact(nanolist, strength):
+    log = brush_log(nanolist, ["marker"], strength=strength)
+    slow, fast = fresh(nanolist), fresh(nanolist)
+    replay(slow, log)
+    replay(fast, log, fast=True)
+    assert fast.frame() == slow.frame()
+
+
+def test_engine_mismatch(nanolist):
+    log = brush_log(nanolist, ["spray"])
+    other = nl.NanoList(StubCanvas(), engine="hex" if nanolist.flat.engine == "rgb" else "rgb")
+    with pytest.raises(ValueError):
+        replay(other, log)
+
+
+def test_replay_matches_recorded_session(nanolist):
+    log = brush_log(nanolist, ["pencil", "marker", "spray"])
+    live = fresh(nanolist)
+    for op in log: # The calls Painting.tool_functions made while recording
+        TOOLS[op.tool](live, op.item, **op.params())
+    replayed = fresh(nanolist)
+    replay(replayed, OpLog.from_bytes(log.to_bytes()))
+    assert replayed.frame() == live.frame()
+
+
+def test_layout_mismatch(nanolist):
+    log = OpLog([1, 3, 5])
+    with pytest.raises(ValueError):
+        replay(nanolist, log)
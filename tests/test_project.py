@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from benchmarks.bench import StubCanvas
+import nanogui.nanolist as nl
+from nanogui.project import Project, ProjectWriter, load_nanolist, save_nanolist, save_project
+
+SHAPE = [1, 3, 5]
+
+
+def test_nanolist_round_trip(nanolist, tmp_path):
+    path = str(tmp_path / "design.nano")
+    nanolist.fill(range(0, len(nanolist.flat), 2), "#12AB34")
+    save_nanolist(nanolist, path, author="test")
+    saved = nanolist.frame()
+
+    other = nl.NanoList(StubCanvas(), engine=nanolist.flat.engine)
+    load_nanolist(other, path)
+    assert other.frame() == saved
+    with Project(path) as project:
+        assert project.metadata == {"author": "test"}
+        assert len(project) == 1
+
+
+def test_frames_round_trip(tmp_path):
+    path = str(tmp_path / "clip.nano")
+    frames = np.random.default_rng(0).integers(0, 256, (5, sum(SHAPE), 3), dtype=np.uint8)
+    assert save_project(path, SHAPE, frames, fps=12) == 5
+    with Project(path) as project:
+        assert (project.shape, project.fps, len(project)) == (SHAPE, 12, 5)
+        assert np.array_equal(project.frame(3), frames[3])
+        assert np.array_equal(project.frames(1, 4), frames[1:4])
+        assert bytes(project.frame_bytes(0)) == frames[0].tobytes()
+        with pytest.raises(IndexError):
+            project.frame_bytes(5)
+
+
+def test_writer_rejects_wrong_frame_size(tmp_path):
+    with ProjectWriter(str(tmp_path / "clip.nano"), SHAPE) as writer:
+        with pytest.raises(ValueError):
+            writer.append(b"\x00" * 5)
+
+
+def test_not_a_project(tmp_path):
+    path = tmp_path / "other.nano"
+    path.write_bytes(b"PNG?" + bytes(32))
+    with pytest.raises(ValueError):
+        Project(str(path))
+
+
+def test_load_failure_releases_the_map(tmp_path):
+    path = str(tmp_path / "design.nano")
+    nanolist = nl.NanoList(StubCanvas(), SHAPE)
+    save_nanolist(nanolist, path)
+
+    def fail(packed, layer=None):
+        raise RuntimeError("load failed")
+
+    nanolist.load_frame = fail
+    with pytest.raises(RuntimeError, match="load failed"): # Not BufferError from closing a map with a live view
+        load_nanolist(nanolist, path)
+    with pytest.raises(ValueError):
+        load_nanolist(nl.NanoList(StubCanvas()), path) # Layout mismatch
+
+
+def test_nanolist_saves_every_layer(nanolist, tmp_path):
+    path = str(tmp_path / "layers.nano")
+    nanolist.fill(range(1, len(nanolist.flat)), "#000080")
+    nanolist.add_layer()
+    nanolist[3, 3] = "#FF0000"
+    nanolist.update()
+    save_nanolist(nanolist, path)
+
+    other = nl.NanoList(StubCanvas(), engine=nanolist.flat.engine)
+    load_nanolist(other, path)
+    assert other.frame() == nanolist.flattened()
+    assert other[3, 3] == "#FF0000"
+    assert other[3, 4] == "#000080"
@@ -0,0 +1,233 @@
+import itertools
+import json
+import select
+import socket
+from typing import Optional
+from functools import partial
+import pytest
+from benchmarks.bench import StubCanvas
+import nanogui.nanolist as nl
+from nanogui.effects import EFFECTS, EffectRunner
+from nanogui.geometry import TriangleGeometry
+from nanogui.painting import Painting
+from nanogui.remote import RemoteServer
+from nanogui.tools import TOOLS
+
+
+class FakePainting:
+    """
+    The parts of Painting the server uses, without Tk. after() only records callbacks, tests call them
+    """
+    run_tool = Painting.run_tool
+
+    def __init__(self) -> None:
+        self.nanolist = nl.NanoList(StubCanvas())
+        self.nanolist.update()
+        self.tool_functions = {name: partial(tool, self.nanolist) for name, tool in TOOLS.items()}
+        self.recorder = None
+        self.use_workers = False
+        self.background_tools = set()
+        self.stroke = None
+        self.scheduled = {}
+        self.after_ids = itertools.count(1)
+        self.effects = EffectRunner(self, self.nanolist, TriangleGeometry(self.nanolist.shape[1:]))
+
+    def after(self, ms, fn):
+        after_id = next(self.after_ids)
+        self.scheduled[after_id] = fn
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.scheduled.pop(after_id, None)
+
+    def after_idle(self, fn):
+        pass
+
+    def mark_paint(self):
+        pass
+
+
+class Connection:
+    def __init__(self, server) -> None:
+        self.server = server
+        self.sock = socket.create_connection(("127.0.0.1", server.port), timeout=5)
+        self.buffer = b""
+        self.diffs = []
+        self.hello = self.read()
+
+    def read(self, timeout: float = 5) -> Optional[dict]:
+        """
+        Next message, None when none came within timeout seconds
+        """
+        while b"\n" not in self.buffer:
+            if not select.select([self.sock], [], [], timeout)[0]:
+                return None
+            self.buffer += self.sock.recv(1 << 16)
+        line, self.buffer = self.buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def request(self, message: dict) -> dict:
+        """
+        Send message and run the server's Tk-side tick until its reply comes, keeping the diffs sent meanwhile
+        """
+        self.sock.sendall(json.dumps(message).encode() + b"\n")
+        for _ in range(100):
+            self.server.poll()
+            while True:
+                reply = self.read(0.05)
+                if reply is None:
+                    break
+                if reply["type"] == "reply":
+                    return reply
+                self.diffs.append(reply)
+        raise AssertionError(f"No reply to {message}")
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+@pytest.fixture
+def painting():
+    return FakePainting()
+
+
+@pytest.fixture
+def client(painting):
+    server = RemoteServer(painting, port=0)
+    connection = Connection(server)
+    yield connection
+    connection.close()
+    server.close()
+
+
+def colour(painting, pos):
+    return painting.nanolist.flat[pos]
+
+
+def test_hello(painting, client):
+    assert client.hello == {"type": "hello", "shape": list(painting.nanolist.shape), "cells": len(painting.nanolist.flat)}
+
+
+def test_set_and_frame(painting, client):
+    reply = client.request({"id": 1, "ops": [{"op": "set", "cells": [[1, "#FF0000"], [[2, 3], "#00FF00"]]}]})
+    assert reply == {"type": "reply", "id": 1, "ok": True}
+    assert colour(painting, 1) == "#FF0000"
+    assert colour(painting, painting.nanolist.offsets[2] + 3) == "#00FF00"
+
+    frame = "10" * 3 * len(painting.nanolist.flat)
+    assert client.request({"id": 2, "ops": [{"op": "frame", "rgb": frame}, {"op": "set", "cells": [[4, "#123456"]]}]})["ok"]
+    assert colour(painting, 4) == "#123456"
+    assert colour(painting, 5) == "#101010"
+
+
+def test_tool(painting, client):
+    reply = client.request({"op": "tool", "tool": "pencil", "item": [3, 3], "radius": 0, "colour1": "#0000FF"})
+    assert reply["ok"]
+    assert painting.nanolist[3, 3] == "#0000FF"
+
+
+@pytest.mark.parametrize("op", [
+    {"op": "bogus"},
+    {"op": "set", "cells": [[True, "#FF0000"]]},
+    {"op": "set", "cells": [[[True, 1], "#FF0000"]]},
+    {"op": "set", "cells": [[10 ** 6, "#FF0000"]]},
+    {"op": "frame", "rgb": "00"},
+    {"op": "tool", "tool": "pencil", "item": [3, 3], "radius": 6},
+    {"op": "tool", "tool": "pencil", "item": [3, 3], "radius": -1},
+    {"op": "tool", "tool": "pencil", "item": [3, 3], "radius": True},
+    {"op": "tool", "tool": "eraser", "item": [3, 3]},
+    {"op": "tool", "tool": "marker", "item": [3, 3], "strength": 2.5},
+    {"op": "tool", "tool": "marker", "item": [3, 3], "strength": 3},
+    {"op": "tool", "tool": "marker", "item": [3, 3], "strength": "half"},
+    {"op": "tool", "tool": "bucket", "item": [3, 3], "tolerance": -1},
+    {"op": "tool", "tool": "pencil", "item": [3, 3], "colour1": "#FFF"},
+    {"op": "tool", "tool": "pencil", "item": [3, 3], "colour1": "#FFFFFFFF"},
+    {"op": "tool", "tool": "pencil", "item": 0},
+    {"op": "tool", "tool": "pencil", "item": [0, 0]},
+    {"op": "tool", "tool": "pencil", "item": [3, 3], "sped": 1},
+    {"op": "set", "cells": [[1, "#FFF"]]},
+    {"op": "effect", "name": "plasma", "scael": 1},
+    {"op": "effect", "name": "plasma", "speed": "fast"},
+    {"op": "effect", "name": "ripple", "colour1": "blue"},
+])
+def test_invalid_ops_rejected(painting, client, op):
+    before = painting.nanolist.frame()
+    reply = client.request({"id": 7, "ops": [{"op": "set", "cells": [[1, "#FF0000"]]}, op]})
+    assert reply["id"] == 7 and not reply["ok"] and reply["error"]
+    assert painting.nanolist.frame() == before
+    assert painting.effects.name is None
+
+
+def broken_tool(item, **kwargs):
+    raise RuntimeError("tool failed")
+
+
+def test_invalid_op_is_named(client):
+    reply = client.request({"ops": [{"op": "set", "cells": [[1, "#FF0000"]]},
+                                    {"op": "tool", "tool": "pencil", "item": [4, 4], "colour1": "green"}]})
+    assert reply["error"].startswith("op 1 (tool)")
+
+
+def test_failed_batch_applies_nothing(painting, client):
+    painting.tool_functions["blend"] = broken_tool
+    before = painting.nanolist.frame()
+    reply = client.request({"id": 3, "ops": [
+        {"op": "set", "cells": [[1, "#FF0000"]]},
+        {"op": "tool", "tool": "pencil", "item": [3, 3], "radius": 2, "colour1": "#00FF00"},
+        {"op": "tool", "tool": "blend", "item": [4, 4]},
+    ]})
+    assert not reply["ok"]
+    assert reply["error"].startswith("op 2 (tool)")
+    assert painting.nanolist.frame() == before
+
+
+def test_failed_request_keeps_earlier_requests(painting, client):
+    painting.tool_functions["blend"] = broken_tool
+    assert client.request({"op": "set", "cells": [[1, "#FF0000"]]})["ok"]
+    assert not client.request({"ops": [{"op": "set", "cells": [[2, "#FF0000"]]},
+                                       {"op": "tool", "tool": "blend", "item": [4, 4]}]})["ok"]
+    assert colour(painting, 1) == "#FF0000"
+    assert colour(painting, 2) != "#FF0000"
+
+
+def test_remote_tools_run_on_the_tk_thread(painting, client):
+    painting.use_workers = True # A large layout: the toolbar would send blend and bucket to the workers
+    painting.background_tools = {"blend", "bucket"}
+    before = painting.nanolist.frame()
+    painting.tool_functions["blend"] = broken_tool
+    reply = client.request({"ops": [{"op": "tool", "tool": "bucket", "item": [3, 3], "colour1": "#00FF00", "tolerance": 0},
+                                    {"op": "tool", "tool": "blend", "item": [4, 4]}]})
+    assert not reply["ok"]
+    assert painting.nanolist.frame() == before
+    assert client.request({"op": "tool", "tool": "bucket", "item": [3, 3], "colour1": "#00FF00", "tolerance": 0})["ok"]
+    assert painting.nanolist[3, 3] == "#00FF00" # Applied by the time of the reply
+
+
+def test_effect(painting, client):
+    assert client.request({"op": "effect", "name": "ripple", "origin": [3, 3], "speed": 2, "colour1": "#FF0000"})["ok"]
+    assert painting.effects.name == "ripple"
+    assert painting.effects.params == {"speed": 2, "colour1": "#FF0000"}
+    assert client.request({"op": "effect", "name": None})["ok"]
+    assert painting.effects.name is None
+
+
+def test_subscribe_sends_diffs(painting, client):
+    assert client.request({"op": "subscribe"})["ok"]
+    client.server.poll()
+    assert client.read()["type"] == "diff" # Every cell first
+    client.request({"op": "set", "cells": [[1, "#FF0000"], [2, "#00FF00"]]})
+    diff = client.diffs[-1] if client.diffs else client.read()
+    assert diff["type"] == "diff"
+    assert diff["cells"] == [[1, "#FF0000"], [2, "#00FF00"]]
+
+
+def test_effect_stops_when_evaluation_fails(painting, monkeypatch):
+    def broken(xy, t, **_):
+        raise RuntimeError("broken effect")
+
+    monkeypatch.setitem(EFFECTS, "broken", broken)
+    runner = painting.effects
+    with pytest.raises(RuntimeError):
+        runner.start("broken")
+    assert runner.name is None
+    assert not painting.scheduled # No next frame scheduled
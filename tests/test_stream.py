@@ -0,0 +1,97 @@
+import socket
+import time
+import pytest
+from benchmarks.bench import StubCanvas
+import nanogui.nanolist as nl
+from nanogui.stream import PanelStream, decode_frame, encode_frame, panel_ids
+
+
+@pytest.fixture
+def receiver():
+    """
+    Local UDP socket standing in for the controller
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2)
+    yield sock
+    sock.close()
+
+
+def test_encode_decode_round_trip():
+    panels = [(7, 255, 0, 16), (300, 1, 2, 3)]
+    packet = encode_frame(panels, transition=2)
+    assert packet[:2] == b"\x00\x02"
+    assert len(packet) == 2 + 8 * len(panels)
+    assert decode_frame(packet) == {7: (255, 0, 16), 300: (1, 2, 3)}
+
+
+def test_stream_sends_only_changed_panels(receiver):
+    nanolist = nl.NanoList(StubCanvas())
+    ids = panel_ids(nanolist)
+    stream = PanelStream(nanolist, ids, *receiver.getsockname(), max_fps=1000)
+    nanolist.outputs.append(stream)
+    try:
+        nanolist.update()
+        first = decode_frame(receiver.recv(65536))
+        assert len(first) == len(ids) # Every panel the first time
+
+        nanolist[3, 4] = "#FF8000"
+        nanolist[5, 0] = "#0000FF"
+        nanolist.update()
+        packet = receiver.recv(65536)
+        assert len(packet) == 2 + 8 * 2
+        assert decode_frame(packet) == {ids[3, 4]: (255, 128, 0), ids[5, 0]: (0, 0, 255)}
+    finally:
+        stream.close()
+
+
+def test_panel_ids_from_file(tmp_path):
+    path = tmp_path / "panels.json"
+    path.write_text("[[1, 0, 101], [1, 1, 102]]")
+    assert panel_ids(None, str(path)) == {(1, 0): 101, (1, 1): 102}
+
+
+def wait_for(condition, timeout: float = 2) -> bool:
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class FlakySocket:
+    """
+    Refuses the first packet like a socket on a network that is down, then sends through sock
+    """
+    def __init__(self, sock) -> None:
+        self.sock = sock
+        self.failures = 1
+
+    def sendto(self, packet, address):
+        if self.failures:
+            self.failures -= 1
+            raise OSError(113, "No route to host")
+        return self.sock.sendto(packet, address)
+
+    def close(self):
+        self.sock.close()
+
+
+def test_stream_survives_send_errors(receiver):
+    nanolist = nl.NanoList(StubCanvas())
+    ids = panel_ids(nanolist)
+    stream = PanelStream(nanolist, ids, *receiver.getsockname(), max_fps=1000)
+    stream._socket = FlakySocket(stream._socket)
+    nanolist.outputs.append(stream)
+    try:
+        nanolist.update() # Refused
+        assert wait_for(lambda: stream.frames_failed == 1)
+        nanolist[3, 4] = "#FF8000"
+        nanolist.update()
+        assert len(decode_frame(receiver.recv(65536))) == len(ids) # The thread is still running and resends every panel
+        assert wait_for(lambda: stream.frames_sent == 1) # Counted after sendto returns
+        assert stream.frames_failed == 1
+    finally:
+        stream.close()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from benchmarks.bench import StubCanvas
+import nanogui.nanolist as nl
+from nanogui.geometry import BACKGROUND, TriangleGeometry
+from nanogui.stroke import Stroke
+
+
+def joined(*runs):
+    """
+    Cells of consecutive line_to calls, the cell a call starts in is repeated when the last one ended there
+    """
+    cells = []
+    for cell in (cell for run in runs for cell in run):
+        if not cells or cells[-1] != cell:
+            cells.append(cell)
+    return cells
+
+
+@pytest.fixture
+def canvas_grid():
+    nanolist = nl.NanoList(StubCanvas())
+    geometry = TriangleGeometry(nanolist.shape[1:])
+    geometry.fit(600, 600)
+    return nanolist, geometry
+
+
+def test_fast_drag_has_no_gaps(canvas_grid):
+    nanolist, geometry = canvas_grid
+    row = len(geometry.columns_per_row) // 2
+    y = geometry.y_margin + (row + 0.5) * geometry.triangle_height # Middle of the row
+    left = geometry.x_margins[row] + geometry.triangle_length * 0.6
+    right = geometry.x_margins[row] + geometry.columns_per_row[row] * geometry.triangle_length / 2 - geometry.triangle_length * 0.6
+
+    stroke = Stroke(nanolist, geometry, radius=0)
+    cells = joined(stroke.line_to(left, y), stroke.line_to(right, y)) # Two samples a whole row apart
+    assert cells == [(row + 1, col) for col in range(cells[0][1], cells[-1][1] + 1)]
+    assert len(cells) >= geometry.columns_per_row[row] - 2
+    assert stroke.footprint(cells) == sorted(nanolist._pos(cell) for cell in cells)
+
+
+def test_drag_matches_dense_sampling(canvas_grid):
+    nanolist, geometry = canvas_grid
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        x0, y0, x1, y1 = rng.uniform(-20, 620, 4)
+        stroke = Stroke(nanolist, geometry, radius=0)
+        cells = joined(stroke.line_to(x0, y0), stroke.line_to(x1, y1))
+        dense = {geometry.pick(x0 + (x1 - x0) * t, y0 + (y1 - y0) * t) for t in np.linspace(0, 1, 5000)}
+        assert dense - set(cells) == set() # Even panels the line only clips a corner of
+
+
+def test_stamp_once(canvas_grid):
+    nanolist, geometry = canvas_grid
+    centres = [(5, 5), (5, 6), (5, 5), (6, 6), (5, 5)] # Back and forth over the same panels
+    stroke = Stroke(nanolist, geometry, radius=1, once=True)
+    stamped = [pos for centre in centres for pos in stroke.footprint([centre])]
+    assert len(stamped) == len(set(stamped))
+    assert set(stamped) == {pos for centre in centres for pos in nanolist.neighbours(nanolist._pos(centre), 1)}
+    assert stroke.footprint(centres) == [] # Nothing left to stamp in this stroke
+
+    again = Stroke(nanolist, geometry, radius=1, once=False)
+    assert sum(len(again.footprint([centre])) for centre in centres) > len(stamped)
+    assert Stroke(nanolist, geometry, radius=1).footprint([BACKGROUND]) == []
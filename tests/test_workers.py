@@ -0,0 +1,139 @@
+import itertools
+import threading
+import time
+import pytest
+from nanogui.workers import WorkerPool
+
+
+class Widget:
+    """
+    after() without Tk: callbacks are kept, tests run poll() themselves
+    """
+    def __init__(self) -> None:
+        self.scheduled = {}
+        self.after_ids = itertools.count(1)
+
+    def after(self, ms, fn):
+        after_id = next(self.after_ids)
+        self.scheduled[after_id] = fn
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.scheduled.pop(after_id, None)
+
+
+@pytest.fixture
+def pool():
+    batches = []
+    pool = WorkerPool(Widget(), workers=2, max_pending=3, on_batch=lambda: batches.append(1))
+    pool.batches = batches
+    yield pool
+    pool.close()
+
+
+def settle(pool, condition=lambda: False, timeout: float = 2) -> None:
+    """
+    Poll until condition holds or nothing is pending
+    """
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        pool.poll()
+        if condition() or not pool.pending:
+            return
+        time.sleep(0.005)
+    raise AssertionError("Jobs did not finish")
+
+
+def blocked(gate: threading.Event, value):
+    gate.wait(2)
+    return value
+
+
+def test_results_applied_in_one_batch(pool):
+    results = []
+    gate = threading.Event()
+    for i in range(3):
+        pool.submit(blocked, gate, i, on_done=results.append)
+    gate.set()
+    settle(pool, lambda: len(results) == 3)
+    assert sorted(results) == [0, 1, 2]
+    assert len(pool.batches) <= len(results)
+
+
+def test_cancel(pool):
+    results = []
+    gate = threading.Event()
+    running = pool.submit(blocked, gate, "running", on_done=results.append)
+    pool.submit(blocked, gate, "other", on_done=results.append)
+    queued = pool.submit(blocked, gate, "queued", on_done=results.append) # Both workers are busy
+    pool.cancel(running)
+    pool.cancel(queued)
+    assert queued not in pool.pending # Never started, nothing will come back
+    gate.set()
+    settle(pool)
+    assert results == ["other"]
+    assert pool.cancelled == 2
+
+
+def test_key_supersedes(pool):
+    results = []
+    gate = threading.Event()
+    first = pool.submit(blocked, gate, "first", key="blend", on_done=results.append)
+    pool.submit(blocked, gate, "second", key="blend", on_done=results.append)
+    assert first.cancelled
+    gate.set()
+    settle(pool)
+    assert results == ["second"]
+
+
+def test_max_pending_cancels_oldest(pool):
+    results = []
+    gate = threading.Event()
+    jobs = [pool.submit(blocked, gate, i, on_done=results.append) for i in range(5)]
+    assert [job.cancelled for job in jobs] == [True, True, False, False, False]
+    gate.set()
+    settle(pool)
+    assert sorted(results) == [2, 3, 4]
+
+
+def test_errors(pool, capsys):
+    errors = []
+
+    def fail():
+        raise RuntimeError("job failed")
+
+    pool.submit(fail, on_error=errors.append)
+    pool.submit(fail)
+    settle(pool)
+    assert [str(e) for e in errors] == ["job failed"]
+    assert "job failed" in capsys.readouterr().out # Printed when there is no on_error
+
+
+def test_when_idle(pool):
+    calls = []
+    pool.when_idle(lambda: calls.append("now"))
+    assert calls == ["now"] # Nothing pending
+
+    gate = threading.Event()
+    pool.submit(blocked, gate, None)
+    pool.when_idle(lambda: calls.append("idle"))
+    pool.poll()
+    assert calls == ["now"]
+    gate.set()
+    settle(pool)
+    assert calls == ["now", "idle"]
+
+
+def test_when_idle_waits_only_for_its_jobs(pool):
+    calls = []
+    stroke_gate, effect_gate = threading.Event(), threading.Event()
+    stroke = pool.submit(blocked, stroke_gate, None)
+    pool.submit(blocked, effect_gate, None, key="effect") # Keeps the pool busy, like an effect's frames
+    pool.when_idle(lambda: calls.append("stroke"), [stroke])
+    pool.poll()
+    assert calls == []
+    stroke_gate.set()
+    settle(pool, lambda: calls)
+    assert calls == ["stroke"]
+    assert pool.pending # The effect's job is still running
+    effect_gate.set()